@@ -14,3 +14,10 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'aiedu.settings')
 
 application = get_asgi_application()
+
+# 可选:worker 启动后在后台预加载 openai SDK,首个 LLM 请求不再承担导入开销
+from django.conf import settings  # noqa: E402
+
+if settings.OPENAI_WARMUP_ON_START:
+    from core.openai_utils import warm_up  # noqa: E402
+    warm_up()
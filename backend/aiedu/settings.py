@@ -58,6 +58,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.PerformanceProfilingMiddleware',
+    'core.middleware.ReplicaPinningMiddleware',
 ]
 
 ROOT_URLCONF = 'aiedu.urls'
@@ -87,9 +89,31 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            'timeout': 20,  # 秒,等待写锁而不是立即报 database is locked
+        },
     }
 }
 
+# 分析查询只读副本:设置 DATABASE_REPLICA_NAME 后启用,路由规则见 core.db_router
+DATABASE_REPLICA_ALIAS = 'replica'
+DATABASE_REPLICA_NAME = os.getenv('DATABASE_REPLICA_NAME', '')
+if DATABASE_REPLICA_NAME:
+    DATABASES[DATABASE_REPLICA_ALIAS] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': DATABASE_REPLICA_NAME,
+        'OPTIONS': {
+            'timeout': 20,
+        },
+    }
+DATABASE_ROUTERS = ['core.db_router.AnalyticsReplicaRouter']
+# 写入后该客户端的分析读取固定到主库的秒数(0 关闭跨请求固定)
+DATABASE_REPLICA_PIN_SEC = int(os.getenv('DATABASE_REPLICA_PIN_SEC', '5'))
+
+# SQLite 连接调优(WAL、synchronous=NORMAL、busy_timeout),见 core.signals
+SQLITE_TUNE_CONNECTIONS = os.getenv('SQLITE_TUNE_CONNECTIONS', 'True') == 'True'
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '20000'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -145,6 +169,138 @@ REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'core.renderers.FastJSONRenderer',  # orjson 加速,未安装时回退标准 JSONRenderer
     ],
 }
+
+# Live classroom dashboard (SSE, requires ASGI)
+LIVE_MIN_INTERVAL_SEC = float(os.getenv('LIVE_MIN_INTERVAL_SEC', '1.0'))  # 最大推送频率
+LIVE_HEARTBEAT_SEC = float(os.getenv('LIVE_HEARTBEAT_SEC', '15'))
+LIVE_RESEED_SEC = float(os.getenv('LIVE_RESEED_SEC', '30'))  # 多进程部署时从数据库校正
+
+# Per-request performance profiling (Server-Timing + slow request log)
+PERF_PROFILING_ENABLED = os.getenv('PERF_PROFILING_ENABLED', 'True') == 'True'
+PERF_PATH_PREFIX = '/api/'
+PERF_SAMPLE_RATE = float(os.getenv('PERF_SAMPLE_RATE', '1.0'))  # 0~1, 生产环境可调低
+PERF_SLOW_REQUEST_MS = float(os.getenv('PERF_SLOW_REQUEST_MS', '1000'))
+PERF_SLOW_DB_MS = float(os.getenv('PERF_SLOW_DB_MS', '300'))
+PERF_SLOW_DB_QUERIES = int(os.getenv('PERF_SLOW_DB_QUERIES', '50'))
+
+# Idempotency-Key support for submit / generation endpoints
+IDEMPOTENCY_TTL_SEC = int(os.getenv('IDEMPOTENCY_TTL_SEC', str(24 * 3600)))
+# 处理中的记录超过该时长仍无响应时视为已放弃(进程崩溃等),允许重试重新占用
+IDEMPOTENCY_CLAIM_TIMEOUT_SEC = int(os.getenv('IDEMPOTENCY_CLAIM_TIMEOUT_SEC', '300'))
+
+# 在 WSGI/ASGI worker 启动时后台预加载 openai SDK 与客户端(manage.py 命令不受影响)
+OPENAI_WARMUP_ON_START = os.getenv('OPENAI_WARMUP_ON_START', 'False') == 'True'
+
+# 大纲上线流水线(core.services.pipeline)的并发步骤数,1 表示在请求线程中顺序执行
+PIPELINE_MAX_WORKERS = int(os.getenv('PIPELINE_MAX_WORKERS', '4'))
+
+# 相似大纲检索(core.outline_index):text-embedding-3 系列可截短维度,
+# 128 维在 10 万个大纲上单次检索约 4ms,足以区分近似重复的大纲
+OUTLINE_EMBEDDING_MODEL = os.getenv('OUTLINE_EMBEDDING_MODEL', 'text-embedding-3-small')
+OUTLINE_EMBEDDING_DIM = int(os.getenv('OUTLINE_EMBEDDING_DIM', '128'))
+OUTLINE_EMBEDDING_MAX_CHARS = int(os.getenv('OUTLINE_EMBEDDING_MAX_CHARS', '6000'))
+OUTLINE_REUSE_MIN_SIMILARITY = float(os.getenv('OUTLINE_REUSE_MIN_SIMILARITY', '0.92'))
+
+# 题库嵌入向量存储(core.question_store,内存映射文件,多进程共享)。
+# 开启后新题目自动写入向量,出题时优先复用其他大纲中相似度不低于阈值的题目
+QUESTION_EMBEDDINGS_ENABLED = os.getenv('QUESTION_EMBEDDINGS_ENABLED', 'False') == 'True'
+QUESTION_EMBEDDING_DIR = os.getenv('QUESTION_EMBEDDING_DIR', str(BASE_DIR / 'embeddings' / 'questions'))
+QUESTION_EMBEDDING_MODEL = os.getenv('QUESTION_EMBEDDING_MODEL', 'text-embedding-3-small')
+QUESTION_EMBEDDING_DIM = int(os.getenv('QUESTION_EMBEDDING_DIM', '128'))
+QUESTION_REUSE_MIN_SIMILARITY = float(os.getenv('QUESTION_REUSE_MIN_SIMILARITY', '0.9'))
+
+# 出题去重:与本大纲已有题目(或同批题目)MinHash 估计相似度不低于阈值的新题被丢弃,
+# 并重新生成缺少的题目,最多 QUESTION_DEDUP_MAX_ROUNDS 轮
+QUESTION_DEDUP_ENABLED = os.getenv('QUESTION_DEDUP_ENABLED', 'True') == 'True'
+QUESTION_DEDUP_THRESHOLD = float(os.getenv('QUESTION_DEDUP_THRESHOLD', '0.7'))
+QUESTION_DEDUP_MAX_ROUNDS = int(os.getenv('QUESTION_DEDUP_MAX_ROUNDS', '2'))
+QUESTION_DEDUP_INDEX_TTL_SEC = int(os.getenv('QUESTION_DEDUP_INDEX_TTL_SEC', '600'))  # 其他进程的改动最迟在此后可见
+
+# 知识追踪(BKT):每条作答记录更新对应知识点的掌握度,见 core/knowledge.py
+KNOWLEDGE_TRACING_ENABLED = os.getenv('KNOWLEDGE_TRACING_ENABLED', 'True') == 'True'
+KNOWLEDGE_BKT_PARAMS = {
+    'p_init': float(os.getenv('KNOWLEDGE_BKT_P_INIT', '0.3')),        # 先验掌握概率
+    'p_transit': float(os.getenv('KNOWLEDGE_BKT_P_TRANSIT', '0.1')),  # 每次作答后学会的概率
+    'p_slip': float(os.getenv('KNOWLEDGE_BKT_P_SLIP', '0.1')),        # 已掌握但答错
+    'p_guess': float(os.getenv('KNOWLEDGE_BKT_P_GUESS', '0.2')),      # 未掌握但猜对
+}
+# 掌握度低于该值的已作答知识点列为薄弱点
+KNOWLEDGE_MASTERY_THRESHOLD = float(os.getenv('KNOWLEDGE_MASTERY_THRESHOLD', '0.6'))
+
+# 自适应选题(Rasch/Elo):能力与题目难度随作答更新,见 core/item_bank.py
+ADAPTIVE_ELO_K = float(os.getenv('ADAPTIVE_ELO_K', '0.4'))              # 初始步长
+ADAPTIVE_ELO_DECAY = float(os.getenv('ADAPTIVE_ELO_DECAY', '0.05'))     # 步长随作答次数衰减
+ADAPTIVE_PRIOR_INFORMATION = float(os.getenv('ADAPTIVE_PRIOR_INFORMATION', '1.0'))
+ADAPTIVE_TARGET_SE = float(os.getenv('ADAPTIVE_TARGET_SE', '0.6'))      # 标准误低于该值时结束
+ADAPTIVE_MIN_QUESTIONS = int(os.getenv('ADAPTIVE_MIN_QUESTIONS', '3'))
+ADAPTIVE_MAX_QUESTIONS = int(os.getenv('ADAPTIVE_MAX_QUESTIONS', '15'))
+# 进程内难度索引的有效期:其他进程的校准结果最迟在该时间后可见
+ADAPTIVE_INDEX_TTL_SEC = float(os.getenv('ADAPTIVE_INDEX_TTL_SEC', '30'))
+
+# 大纲正文估算超过该 token 数时按章节分块,各块并发生成计划片段后合并
+OUTLINE_CHUNK_TOKENS = int(os.getenv('OUTLINE_CHUNK_TOKENS', '3000'))
+OUTLINE_CHUNK_MAX_WORKERS = int(os.getenv('OUTLINE_CHUNK_MAX_WORKERS', '4'))
+
+# 大纲保存后在后台预生成教学计划与题目(core.speculative),之后的生成请求直接认领
+SPECULATIVE_GENERATION = os.getenv('SPECULATIVE_GENERATION', 'False') == 'True'
+SPECULATIVE_NUM_QUESTIONS = int(os.getenv('SPECULATIVE_NUM_QUESTIONS', '5'))
+SPECULATIVE_MAX_WORKERS = int(os.getenv('SPECULATIVE_MAX_WORKERS', '2'))
+SPECULATIVE_ATTACH_TIMEOUT_SEC = float(os.getenv('SPECULATIVE_ATTACH_TIMEOUT_SEC', '60'))
+SPECULATIVE_TTL_SEC = int(os.getenv('SPECULATIVE_TTL_SEC', '3600'))
+
+# LLM admission control (per-user concurrency + weighted fair queuing)
+LLM_ADMISSION_ENABLED = os.getenv('LLM_ADMISSION_ENABLED', 'True') == 'True'
+LLM_MAX_CONCURRENT = int(os.getenv('LLM_MAX_CONCURRENT', '8'))
+LLM_PER_USER_CONCURRENT = int(os.getenv('LLM_PER_USER_CONCURRENT', '2'))
+# 排队的请求占用 Web 工作线程:限制单用户与全局排队数,等待时间较短,超出即返回 429
+LLM_MAX_QUEUED_PER_USER = int(os.getenv('LLM_MAX_QUEUED_PER_USER', '4'))
+LLM_MAX_QUEUED_TOTAL = int(os.getenv('LLM_MAX_QUEUED_TOTAL', '16'))
+LLM_QUEUE_TIMEOUT_SEC = float(os.getenv('LLM_QUEUE_TIMEOUT_SEC', '5'))
+LLM_PRIORITY_WEIGHTS = {'interactive': 4.0, 'bulk': 1.0}  # 请求头 X-Request-Priority
+
+# 按任务类型选择模型(core.openai_utils.ModelRouter):models 按成本从低到高排列,
+# 输出不符合 Schema 时依次升级;环境变量 LLM_ROUTE_<TASK> 以逗号分隔覆盖模型列表
+LLM_ROUTES = {
+    'plan': {
+        'models': os.getenv('LLM_ROUTE_PLAN', 'gpt-4o-mini,gpt-4o').split(','),
+        'temperature': 0.7,
+        'max_tokens': 2000,
+    },
+    'quiz': {
+        'models': os.getenv('LLM_ROUTE_QUIZ', 'gpt-4o-mini,gpt-4o').split(','),
+        'temperature': 0.7,
+        'max_tokens': 2000,
+    },
+    'grading': {
+        'models': os.getenv('LLM_ROUTE_GRADING', 'gpt-4o-mini').split(','),
+        'temperature': 0.0,
+        'max_tokens': 2000,  # 一次批改 SHORT_ANSWER_GRADING_BATCH_SIZE 条答案
+    },
+    'report': {
+        'models': os.getenv('LLM_ROUTE_REPORT', 'gpt-4o-mini,gpt-4o').split(','),
+        'temperature': 0.3,
+        'max_tokens': 1500,
+    },
+}
+
+# Write-behind buffer for AttemptAnswer inserts (opt-in)
+ANSWER_WRITE_BEHIND = os.getenv('ANSWER_WRITE_BEHIND', 'False') == 'True'
+ANSWER_WRITE_BEHIND_MAX_BATCH = int(os.getenv('ANSWER_WRITE_BEHIND_MAX_BATCH', '200'))
+ANSWER_WRITE_BEHIND_MAX_AGE_MS = int(os.getenv('ANSWER_WRITE_BEHIND_MAX_AGE_MS', '200'))  # 持久化延迟上界
+
+# 简答题批量批改(opt-in,core.grading):未与参考答案完全一致的答案先记为待批改,
+# 同一题目全班的答案去重后每次 LLM 调用批改 BATCH_SIZE 条;
+# 首个答案提交 WINDOW_MS 毫秒后批改一次(0 表示只在完成答题时批改)
+SHORT_ANSWER_BATCH_GRADING = os.getenv('SHORT_ANSWER_BATCH_GRADING', 'False') == 'True'
+SHORT_ANSWER_GRADING_WINDOW_MS = int(os.getenv('SHORT_ANSWER_GRADING_WINDOW_MS', '2000'))
+SHORT_ANSWER_GRADING_BATCH_SIZE = int(os.getenv('SHORT_ANSWER_GRADING_BATCH_SIZE', '20'))
+
+# 已完成答题数据的派生缓存(键含 TeacherOutline.aggregate_version,新数据到达时自动失效)
+AGGREGATE_CACHE_TTL_SEC = int(os.getenv('AGGREGATE_CACHE_TTL_SEC', '3600'))
+
+# Cold-storage archive of completed attempts (python manage.py archive_attempts)
+ARCHIVE_DIR = os.getenv('ARCHIVE_DIR', str(BASE_DIR / 'archive'))
+ARCHIVE_RETENTION_DAYS = int(os.getenv('ARCHIVE_RETENTION_DAYS', '365'))
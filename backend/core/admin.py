@@ -9,7 +9,8 @@ from .models import (
     Student,
     Attempt,
     AttemptAnswer,
-    PersonalizationDelta
+    PersonalizationDelta,
+    IdempotencyRecord
 )
 
 
@@ -62,3 +63,10 @@ class PersonalizationDeltaAdmin(admin.ModelAdmin):
     list_filter = ['is_published', 'created_at']
     search_fields = ['outline__title']
 
+
+
+@admin.register(IdempotencyRecord)
+class IdempotencyRecordAdmin(admin.ModelAdmin):
+    list_display = ['id', 'key', 'request_path', 'response_status', 'created_at', 'expires_at']
+    list_filter = ['response_status', 'created_at']
+    search_fields = ['key', 'request_path']
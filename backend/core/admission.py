@@ -0,0 +1,264 @@
+"""
+LLM 接口准入控制
+Per-user admission control and weighted fair queuing for agent execution
+
+- 全局并发上限 LLM_MAX_CONCURRENT,单用户并发上限 LLM_PER_USER_CONCURRENT
+- 等待中的请求按加权公平队列(WFQ)的虚拟完成时间出队;
+  interactive 请求权重高于 bulk,批量任务无法挤占交互请求
+- 等待的请求会占用 Web 工作线程:单用户或全局排队数超限、预计等待超过超时时间
+  时立即拒绝,等待超时也拒绝,均返回 429 + Retry-After
+- 调度用的用户标识取自登录用户或会话,不信任客户端请求头
+- 请求内并发发起的子调用(如长大纲分块)通过 fan_out_slot 各占一个槽位
+"""
+import contextvars
+import itertools
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass
+from functools import wraps
+from typing import ContextManager, Dict, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from rest_framework import status
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_HEADER = 'X-Request-Priority'
+INTERACTIVE = 'interactive'
+BULK = 'bulk'
+
+# 当前上下文持有的槽位 (用户, 优先级);run_steps 复制上下文,工作线程中同样可见
+_current_slot: contextvars.ContextVar[Optional[Tuple[str, str]]] = contextvars.ContextVar(
+    'admission_slot', default=None
+)
+
+
+class AdmissionRejected(Exception):
+    """请求未获准入(排队已满或等待超时)"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+@dataclass
+class _Waiter:
+    user: str
+    finish_tag: float
+    seq: int
+
+
+class FairScheduler:
+    """
+    加权公平调度器
+
+    每个请求进入时按 finish = max(虚拟时间, 该用户上次 finish) + 1/weight
+    计算虚拟完成时间;有空闲槽位时,放行 finish 最小且用户未达并发上限的请求。
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int,
+        per_user_limit: int,
+        max_queued_per_user: int,
+        weights: Dict[str, float],
+        max_queued_total: Optional[int] = None
+    ):
+        self.max_concurrent = max_concurrent
+        self.per_user_limit = per_user_limit
+        self.max_queued_per_user = max_queued_per_user
+        self.max_queued_total = max_queued_total
+        self.weights = weights
+
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._virtual_time = 0.0
+        self._last_finish: Dict[str, float] = {}
+        self._running: Dict[str, int] = {}
+        self._running_total = 0
+        self._waiters: List[_Waiter] = []
+        # 平均服务时长(秒),用于估算 Retry-After
+        self._avg_service_sec = 5.0
+
+    def acquire(self, user: str, priority: str = INTERACTIVE, timeout: Optional[float] = None) -> None:
+        """
+        阻塞直到获得执行槽位;失败时抛出 AdmissionRejected
+
+        没有空闲槽位且预计等待超过 timeout 时立即拒绝,不占用调用线程空等。
+        """
+        weight = self.weights.get(priority, self.weights[INTERACTIVE])
+        deadline = time.monotonic() + timeout if timeout is not None else None
+
+        with self._cond:
+            queued = sum(1 for w in self._waiters if w.user == user)
+            if queued >= self.max_queued_per_user:
+                raise AdmissionRejected('Too many queued requests for this user', self._retry_after(queued))
+
+            start = max(self._virtual_time, self._last_finish.get(user, 0.0))
+            waiter = _Waiter(user=user, finish_tag=start + 1.0 / weight, seq=next(self._seq))
+            self._waiters.append(waiter)
+            if self._next_eligible() is not waiter:
+                others = len(self._waiters) - 1
+                reason = None
+                if self.max_queued_total is not None and others >= self.max_queued_total:
+                    reason = 'Too many queued requests'
+                elif timeout is not None and self._retry_after(others) > timeout:
+                    reason = 'No LLM execution slot available soon'
+                if reason is not None:
+                    self._waiters.remove(waiter)
+                    raise AdmissionRejected(reason, self._retry_after(others))
+            self._last_finish[user] = waiter.finish_tag
+
+            try:
+                while self._next_eligible() is not waiter:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise AdmissionRejected(
+                            'Timed out waiting for an LLM execution slot',
+                            self._retry_after(len(self._waiters))
+                        )
+                    self._cond.wait(remaining)
+            except BaseException:
+                self._waiters.remove(waiter)
+                self._cond.notify_all()
+                raise
+
+            self._waiters.remove(waiter)
+            self._virtual_time = max(self._virtual_time, waiter.finish_tag - 1.0 / weight)
+            self._running[user] = self._running.get(user, 0) + 1
+            self._running_total += 1
+            # 可能还有其他请求可以放行
+            self._cond.notify_all()
+
+    def release(self, user: str, service_sec: Optional[float] = None) -> None:
+        with self._cond:
+            self._running[user] -= 1
+            if self._running[user] <= 0:
+                del self._running[user]
+                if not any(w.user == user for w in self._waiters):
+                    self._last_finish.pop(user, None)
+            self._running_total -= 1
+            if service_sec is not None:
+                self._avg_service_sec = 0.9 * self._avg_service_sec + 0.1 * service_sec
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, user: str, priority: str = INTERACTIVE, timeout: Optional[float] = None) -> Iterator[None]:
+        """在准入槽位内执行代码块"""
+        self.acquire(user, priority, timeout)
+        token = _current_slot.set((user, priority))
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            _current_slot.reset(token)
+            self.release(user, time.monotonic() - started)
+
+    def stats(self) -> Dict[str, object]:
+        with self._cond:
+            return {
+                'running': self._running_total,
+                'queued': len(self._waiters),
+                'running_by_user': dict(self._running),
+            }
+
+    def _next_eligible(self) -> Optional[_Waiter]:
+        """有空闲槽位时,返回下一个应放行的等待者"""
+        if self._running_total >= self.max_concurrent:
+            return None
+        best = None
+        for waiter in self._waiters:
+            if self._running.get(waiter.user, 0) >= self.per_user_limit:
+                continue
+            if best is None or (waiter.finish_tag, waiter.seq) < (best.finish_tag, best.seq):
+                best = waiter
+        return best
+
+    def _retry_after(self, queued: int) -> int:
+        waves = (queued + 1) / max(self.max_concurrent, 1)
+        return max(1, math.ceil(waves * self._avg_service_sec))
+
+
+_scheduler: Optional[FairScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> FairScheduler:
+    """获取全局调度器(按 settings 懒加载)"""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = FairScheduler(
+                    max_concurrent=settings.LLM_MAX_CONCURRENT,
+                    per_user_limit=settings.LLM_PER_USER_CONCURRENT,
+                    max_queued_per_user=settings.LLM_MAX_QUEUED_PER_USER,
+                    weights=settings.LLM_PRIORITY_WEIGHTS,
+                    max_queued_total=settings.LLM_MAX_QUEUED_TOTAL
+                )
+    return _scheduler
+
+
+def fan_out_slot(timeout: Optional[float] = None) -> ContextManager[None]:
+    """
+    请求内并发发起的一次子调用占用的槽位(未启用准入控制时不限制)
+
+    子调用以 "<用户>/fan-out" 为标识排队:计入全局并发上限与公平调度,
+    但不与外层请求争用该用户自身的并发额度,避免互相等待。
+    """
+    if not settings.LLM_ADMISSION_ENABLED:
+        return nullcontext()
+    user, priority = _current_slot.get() or ('anonymous', BULK)
+    return get_scheduler().slot(f"{user}/fan-out", priority, timeout)
+
+
+def request_user_key(request) -> str:
+    """
+    调度用的用户标识:登录用户 > 会话 > 客户端 IP
+
+    不使用客户端可任意设置的请求头,否则换一个值即可绕过单用户限额。
+    """
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f"user:{user.pk}"
+    session = getattr(request, 'session', None)
+    if session is not None and session.session_key:
+        return f"session:{session.session_key}"
+    return f"ip:{request.META.get('REMOTE_ADDR', 'unknown')}"
+
+
+def request_priority(request) -> str:
+    priority = request.headers.get(PRIORITY_HEADER, INTERACTIVE).lower()
+    return priority if priority in (INTERACTIVE, BULK) else INTERACTIVE
+
+
+def admission_controlled(view_func):
+    """
+    准入控制装饰器,置于 @api_view(以及 @idempotent)之下:
+
+        @api_view(['POST'])
+        @idempotent
+        @admission_controlled
+        def generate_lesson_plan(request, outline_id): ...
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if not settings.LLM_ADMISSION_ENABLED:
+            return view_func(request, *args, **kwargs)
+
+        user = request_user_key(request)
+        priority = request_priority(request)
+        try:
+            with get_scheduler().slot(user, priority, timeout=settings.LLM_QUEUE_TIMEOUT_SEC):
+                return view_func(request, *args, **kwargs)
+        except AdmissionRejected as e:
+            logger.warning(f"🚦 Admission rejected for {user} ({priority}): {e}")
+            response = Response({'error': str(e)}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+            response['Retry-After'] = str(e.retry_after)
+            return response
+
+    return wrapper
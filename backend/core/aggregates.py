@@ -0,0 +1,106 @@
+"""
+答题会话完成与聚合数据版本
+Attempt completion and per-outline aggregate versioning
+
+TeacherOutline.aggregate_version 在每次会话完成时原子地 +1。
+依赖已完成会话的派生数据(个体反馈、班级统计)以
+(outline_id, aggregate_version) 为缓存键,某个大纲有新数据时只有该大纲的缓存失效。
+"""
+import logging
+from typing import Any, Callable, Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, FloatField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Cast, Coalesce
+from django.utils import timezone
+
+from .grading import grade_pending
+from .live import live_hub
+from .models import Attempt, AttemptAnswer, TeacherOutline
+from .write_behind import flush_pending_answers
+
+logger = logging.getLogger(__name__)
+
+
+def complete_attempt(attempt_id: int) -> Optional[Attempt]:
+    """
+    完成答题会话
+
+    得分(正确率百分比)由子查询聚合,并在同一条带条件的 UPDATE 中写入:
+    只有未完成的会话会被更新,重复调用不会重复计分或重复增加版本号。
+
+    Returns:
+        更新后的会话;会话不存在时返回 None
+    """
+    # 写后模式下先确保该会话的作答记录已落库
+    flush_pending_answers(attempt_id)
+    if settings.SHORT_ANSWER_BATCH_GRADING:
+        # 计分前批改该会话仍待批改的简答题(同题全班的待批改答案一起批改)
+        grade_pending(attempt_id=attempt_id, fallback=True)
+
+    with transaction.atomic():
+        updated = Attempt.objects.filter(id=attempt_id, is_completed=False).update(
+            is_completed=True,
+            completed_at=timezone.now(),
+            total_score=_score_expression()
+        )
+        attempt = Attempt.objects.select_related('student').filter(id=attempt_id).first()
+        if attempt is None:
+            return None
+        if updated:
+            bump_aggregate_version(attempt.outline_id)
+
+    if updated:
+        live_hub.record_finished(attempt.outline_id)
+        logger.info(f"🏁 Attempt {attempt_id} completed with score {attempt.total_score:.2f}")
+    return attempt
+
+
+def _score_expression():
+    """会话得分(正确率百分比)的子查询表达式,用于 UPDATE"""
+    answers = AttemptAnswer.objects.filter(attempt_id=OuterRef('pk')).order_by().values('attempt_id')
+    score = answers.annotate(
+        score=Cast(Count('id', filter=Q(is_correct=True)), FloatField()) * 100.0 / Count('id')
+    ).values('score')
+    return Coalesce(Subquery(score, output_field=FloatField()), Value(0.0))
+
+
+def rescore_completed_attempts(attempt_ids: Iterable[int]) -> int:
+    """
+    重新计算已完成会话的得分,并使相关大纲的派生数据缓存失效
+
+    完成答题后才写回批改结果的答案(如完成时仍待批改)需要调用,应在写回批改结果的事务内执行。
+
+    Returns:
+        重新计分的会话数
+    """
+    completed = Attempt.objects.filter(id__in=list(attempt_ids), is_completed=True)
+    outline_ids = set(completed.values_list('outline_id', flat=True))
+    if not outline_ids:
+        return 0
+    rescored = completed.update(total_score=_score_expression())
+    for outline_id in sorted(outline_ids):
+        bump_aggregate_version(outline_id)
+    logger.info(f"🧮 Rescored {rescored} completed attempts after late grading")
+    return rescored
+
+
+def bump_aggregate_version(outline_id: int) -> None:
+    """使该大纲的派生数据缓存失效"""
+    TeacherOutline.objects.filter(id=outline_id).update(
+        aggregate_version=F('aggregate_version') + 1
+    )
+
+
+def outline_cache_key(outline: TeacherOutline, name: str, *parts: Any) -> str:
+    """以大纲聚合版本为前缀的缓存键"""
+    suffix = ':'.join(str(part) for part in parts)
+    return f"outline:{outline.id}:v{outline.aggregate_version}:{name}:{suffix}"
+
+
+def cached_for_outline(outline: TeacherOutline, name: str, compute: Callable[[], Any], *parts: Any) -> Any:
+    """按大纲聚合版本缓存计算结果"""
+    key = outline_cache_key(outline, name, *parts)
+    return cache.get_or_set(key, compute, settings.AGGREGATE_CACHE_TTL_SEC)
@@ -4,3 +4,50 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_delete, post_save
+        from .middleware import install_query_timer
+        from .models import AttemptAnswer, QuizQuestion, TeacherOutline
+        from .signals import (
+            cancel_speculative_generation,
+            configure_sqlite_connection,
+            index_question_embedding,
+            invalidate_item_index,
+            invalidate_outline_embedding,
+            record_answer_knowledge,
+            remove_dedup_index,
+            remove_outline_embedding,
+            remove_question_embedding,
+            schedule_speculative_generation,
+            update_dedup_index,
+        )
+
+        connection_created.connect(install_query_timer, dispatch_uid='core_install_query_timer')
+        connection_created.connect(configure_sqlite_connection, dispatch_uid='core_configure_sqlite')
+        post_save.connect(
+            schedule_speculative_generation, sender=TeacherOutline, dispatch_uid='core_speculative_schedule'
+        )
+        post_delete.connect(
+            cancel_speculative_generation, sender=TeacherOutline, dispatch_uid='core_speculative_cancel'
+        )
+        post_save.connect(
+            invalidate_outline_embedding, sender=TeacherOutline, dispatch_uid='core_outline_embedding_invalidate'
+        )
+        post_delete.connect(
+            remove_outline_embedding, sender=TeacherOutline, dispatch_uid='core_outline_embedding_remove'
+        )
+        post_save.connect(
+            index_question_embedding, sender=QuizQuestion, dispatch_uid='core_question_embedding_index'
+        )
+        post_delete.connect(
+            remove_question_embedding, sender=QuizQuestion, dispatch_uid='core_question_embedding_remove'
+        )
+        post_save.connect(
+            record_answer_knowledge, sender=AttemptAnswer, dispatch_uid='core_answer_knowledge'
+        )
+        post_save.connect(invalidate_item_index, sender=QuizQuestion, dispatch_uid='core_item_index_save')
+        post_delete.connect(invalidate_item_index, sender=QuizQuestion, dispatch_uid='core_item_index_delete')
+        post_save.connect(update_dedup_index, sender=QuizQuestion, dispatch_uid='core_dedup_index_save')
+        post_delete.connect(remove_dedup_index, sender=QuizQuestion, dispatch_uid='core_dedup_index_delete')
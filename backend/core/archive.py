@@ -0,0 +1,214 @@
+"""
+答题数据冷存储归档
+Cold-storage archival of completed attempts
+
+超过保留期的已完成会话按 (大纲, 学期) 写入压缩归档文件后从热表删除。
+归档文件为按列组织的 NDJSON 块:每行一个块,包含最多 ARCHIVE_BLOCK_ROWS 行,
+各列以数组存储;行格式与 core.exports 的导出行一致。
+安装 zstandard 时使用 .ndjson.zst,否则退回标准库 gzip(.ndjson.gz)。
+
+目录结构:
+    ARCHIVE_DIR/outline_<id>/<term>/part-a<首个会话 ID>-a<末个会话 ID>-<会话集合摘要>.ndjson.zst
+
+分片名由该批会话 ID 决定:写入分片后、删除热数据前中断时,重跑同一批会话不会再写一份;
+批次划分变化导致同一作答行出现在多个分片时,读取按 answer_id 去重。
+"""
+import gzip
+import hashlib
+import io
+import json
+import logging
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from django.conf import settings
+from django.db import transaction
+
+from . import exports
+from .aggregates import bump_aggregate_version
+from .models import Attempt, AttemptAnswer
+
+try:
+    import zstandard
+except ImportError:  # zstandard 为可选依赖
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_BLOCK_ROWS = 5000
+
+
+def term_for(value: datetime) -> str:
+    """学期标识:2-7 月为春季学期,8-12 月及次年 1 月为秋季学期"""
+    if 2 <= value.month <= 7:
+        return f"{value.year}-spring"
+    year = value.year if value.month >= 8 else value.year - 1
+    return f"{year}-fall"
+
+
+def archive_root() -> Path:
+    return Path(settings.ARCHIVE_DIR)
+
+
+def outline_archive_dir(outline_id: int) -> Path:
+    return archive_root() / f"outline_{outline_id}"
+
+
+def _open_writer(path: Path):
+    if zstandard is not None:
+        raw = open(path, 'wb')
+        return io.TextIOWrapper(zstandard.ZstdCompressor(level=10).stream_writer(raw), encoding='utf-8')
+    return gzip.open(path, 'wt', encoding='utf-8')
+
+
+def _open_reader(path: Path):
+    if path.name.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError(f"zstandard is required to read {path}")
+        raw = open(path, 'rb')
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(raw), encoding='utf-8')
+    return gzip.open(path, 'rt', encoding='utf-8')
+
+
+def part_stem(attempt_ids: List[int]) -> str:
+    """一批会话对应的分片名(不含扩展名),同一批会话总是得到同一个名字"""
+    ids = sorted(attempt_ids)
+    digest = hashlib.sha1(','.join(map(str, ids)).encode('ascii')).hexdigest()[:12]
+    return f"part-a{ids[0]:012d}-a{ids[-1]:012d}-{digest}"
+
+
+def _existing_part(directory: Path, stem: str) -> Optional[Path]:
+    return next(iter(directory.glob(f"{stem}.ndjson.*")), None) if directory.exists() else None
+
+
+def _write_part(directory: Path, stem: str, rows: Iterable[Dict[str, Any]]) -> int:
+    """把行数据按列式块写入归档分片,返回写入行数;失败时删除临时文件"""
+    directory.mkdir(parents=True, exist_ok=True)
+    suffix = '.ndjson.zst' if zstandard is not None else '.ndjson.gz'
+    name = f"{stem}{suffix}"
+    tmp_path = directory / f".{name}.tmp"
+
+    written = 0
+    try:
+        with _open_writer(tmp_path) as f:
+            block: List[Dict[str, Any]] = []
+            for row in rows:
+                block.append(row)
+                if len(block) >= ARCHIVE_BLOCK_ROWS:
+                    f.write(_encode_block(block))
+                    written += len(block)
+                    block = []
+            if block:
+                f.write(_encode_block(block))
+                written += len(block)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+    if written:
+        os.replace(tmp_path, directory / name)
+    else:
+        tmp_path.unlink()
+    return written
+
+
+def _encode_block(rows: List[Dict[str, Any]]) -> str:
+    columns = {field: [row[field] for row in rows] for field in exports.EXPORT_FIELDS}
+    return json.dumps({'rows': len(rows), 'columns': columns}, ensure_ascii=False) + '\n'
+
+
+def _decode_block(line: str) -> Iterator[Dict[str, Any]]:
+    block = json.loads(line)
+    columns = block['columns']
+    names = list(columns)
+    for values in zip(*(columns[name] for name in names)):
+        yield dict(zip(names, values))
+
+
+def archive_outline(outline_id: int, before: datetime, batch_size: int = 1000, dry_run: bool = False) -> Dict[str, int]:
+    """
+    归档某大纲在 before 之前完成的会话
+
+    每批会话先写入归档分片,写入成功后再删除热表数据,中途失败不会丢失数据。
+    最后一批同时存在于归档与热表时,重跑发现同名分片已存在,只删除热表数据。
+
+    Returns:
+        {term: 归档的作答行数}
+    """
+    candidates = Attempt.objects.filter(
+        outline_id=outline_id,
+        is_completed=True,
+        completed_at__lt=before
+    ).order_by('completed_at').values_list('id', 'completed_at')
+
+    by_term: Dict[str, List[int]] = {}
+    for attempt_id, completed_at in candidates.iterator(chunk_size=batch_size):
+        by_term.setdefault(term_for(completed_at), []).append(attempt_id)
+
+    archived: Dict[str, int] = {}
+    for term, attempt_ids in by_term.items():
+        archived[term] = 0
+        # 按会话 ID 分批,重跑时同一批会话得到同一个分片名
+        attempt_ids.sort()
+        for start in range(0, len(attempt_ids), batch_size):
+            chunk = attempt_ids[start:start + batch_size]
+            queryset = exports.answers_for_outline(outline_id).filter(attempt_id__in=chunk)
+            if dry_run:
+                archived[term] += queryset.count()
+                continue
+            directory = outline_archive_dir(outline_id) / term
+            stem = part_stem(chunk)
+            existing = _existing_part(directory, stem)
+            if existing is not None:
+                logger.info(f"↩️ {existing} already written, deleting its hot rows only")
+                archived[term] += queryset.count()
+            else:
+                archived[term] += _write_part(directory, stem, exports.iter_rows(queryset))
+            with transaction.atomic():
+                AttemptAnswer.objects.filter(attempt_id__in=chunk).delete()
+                Attempt.objects.filter(id__in=chunk).delete()
+
+    if archived and not dry_run:
+        bump_aggregate_version(outline_id)
+        logger.info(f"🧊 Archived outline {outline_id}: {archived}")
+    return archived
+
+
+def archived_terms(outline_id: int) -> List[str]:
+    directory = outline_archive_dir(outline_id)
+    if not directory.exists():
+        return []
+    return sorted(p.name for p in directory.iterdir() if p.is_dir())
+
+
+def iter_archived_rows(
+    outline_id: int,
+    terms: Optional[Iterable[str]] = None,
+    student_id: Optional[str] = None
+) -> Iterator[Dict[str, Any]]:
+    """
+    按需读取归档的作答行(与 core.exports 导出行格式相同)
+
+    Args:
+        outline_id: 大纲 ID
+        terms: 只读取这些学期,默认全部
+        student_id: 只返回该学号的行
+    """
+    # 中断后重跑且批次划分变化时,同一作答行可能出现在两个分片中
+    seen = set()
+    for term in (terms if terms is not None else archived_terms(outline_id)):
+        directory = outline_archive_dir(outline_id) / term
+        if not directory.exists():
+            continue
+        for path in sorted(directory.glob('part-*.ndjson.*')):
+            with _open_reader(path) as f:
+                for line in f:
+                    for row in _decode_block(line):
+                        if student_id is not None and row['student_id'] != student_id:
+                            continue
+                        if row['answer_id'] in seen:
+                            continue
+                        seen.add(row['answer_id'])
+                        yield row
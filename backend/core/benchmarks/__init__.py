@@ -0,0 +1,52 @@
+"""
+性能基准
+Benchmarks, run with ``python manage.py benchmark <name>``
+
+每个基准模块提供 ``add_arguments(parser)`` 和 ``run(**options) -> dict``,
+结果以 JSON 输出,便于跨版本对比。
+"""
+import math
+import statistics
+import time
+from typing import Callable, Dict, Optional
+
+from . import e2e, serialization, submit, vector_index
+
+BENCHMARKS = {
+    'e2e': e2e,
+    'serialization': serialization,
+    'submit': submit,
+    'vector_index': vector_index,
+}
+
+
+def measure(
+    fn: Callable[[], object],
+    repeat: int = 5,
+    setup: Optional[Callable[[], object]] = None
+) -> Dict[str, float]:
+    """多次执行 fn,返回耗时统计(毫秒);setup 在每次执行前调用,不计入耗时"""
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return {
+        'median_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(sorted(timings)[max(math.ceil(len(timings) * 0.95) - 1, 0)], 3),
+        'min_ms': round(min(timings), 3),
+        'max_ms': round(max(timings), 3),
+    }
+
+
+def compare(baseline: Callable[[], object], candidate: Callable[[], object], repeat: int = 5) -> Dict:
+    """对比两种实现的耗时"""
+    base = measure(baseline, repeat)
+    fast = measure(candidate, repeat)
+    return {
+        'baseline': base,
+        'candidate': fast,
+        'speedup': round(base['median_ms'] / fast['median_ms'], 2) if fast['median_ms'] else None,
+    }
@@ -0,0 +1,138 @@
+"""
+端到端基准:主要接口经完整请求链路(中间件、DRF、ORM)的延迟与吞吐
+
+覆盖 get_outline、get_feedback、aggregate_class_data 与 submit_answer,
+LLM 由固定延迟的桩替代。默认先生成一份临时合成数据并在结束后删除;
+指定 --outline 时直接使用已有数据(如 seed_classroom 生成的大规模数据)。
+feedback / aggregate 分别测量缓存未命中(cold)与命中(warm)的情况。
+"""
+import random
+import uuid
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+
+from ..models import Attempt, PersonalizationDelta, QuizQuestion, Student, TeacherOutline
+from ..openai_utils import track_llm_calls
+from .seed import completed_students, delete_seeded, seed_classroom
+from .stub_llm import stub_llm
+from .submit import run_submits
+
+
+def add_arguments(parser):
+    parser.add_argument('--outline', type=int, help='使用已有大纲(不生成临时数据)')
+    parser.add_argument('--students', type=int, default=500, help='临时数据的学生数')
+    parser.add_argument('--questions', type=int, default=20, help='临时数据每个大纲的题目数')
+    parser.add_argument('--llm-latency-ms', type=float, default=0.0, help='LLM 桩的固定延迟')
+    parser.add_argument('--feedback-samples', type=int, default=20, help='反馈请求采样的学生数')
+    parser.add_argument('--submit-students', type=int, default=50, help='提交基准新建的会话数')
+    parser.add_argument('--submit-threads', type=int, default=8, help='提交基准的并发线程数')
+
+
+def run(
+    repeat=5,
+    outline=None,
+    students=500,
+    questions=20,
+    llm_latency_ms=0.0,
+    feedback_samples=20,
+    submit_students=50,
+    submit_threads=8,
+    **options
+):
+    prefix = None
+    if outline is None:
+        prefix = f"bench-{uuid.uuid4().hex[:8]}"
+        seeded = seed_classroom(outlines=1, questions=questions, students=students, prefix=prefix)
+        outline = seeded['outline_ids'][0]
+
+    try:
+        with stub_llm(llm_latency_ms) as stub, track_llm_calls() as llm_stats:
+            results = _run_operations(
+                TeacherOutline.objects.get(id=outline), repeat,
+                feedback_samples, submit_students, submit_threads
+            )
+        results['llm'] = {
+            'latency_ms': llm_latency_ms,
+            'calls': stub.calls,
+            'tracked_ms': round(llm_stats.total_ms, 1),
+            'cached_tokens': llm_stats.cached_tokens,
+        }
+    finally:
+        if prefix is not None:
+            delete_seeded(prefix)
+    return results
+
+
+def _run_operations(outline, repeat, feedback_samples, submit_students, submit_threads):
+    from . import measure
+
+    client = Client(SERVER_NAME='localhost')
+    sampled = completed_students(outline.id, feedback_samples)
+    if not sampled:
+        raise RuntimeError(f'Outline {outline.id} has no completed attempts to benchmark')
+    rng = random.Random(0)
+
+    def request(method, url, expected=200):
+        response = getattr(client, method)(url, content_type='application/json')
+        if response.status_code != expected:
+            raise RuntimeError(f'{method.upper()} {url} returned {response.status_code}')
+        return response
+
+    def feedback():
+        request('get', f'/api/feedback/{outline.id}/{rng.choice(sampled)}/')
+
+    def aggregate():
+        request('post', f'/api/classroom/aggregate/{outline.id}/', expected=201)
+
+    existing_deltas = set(PersonalizationDelta.objects.filter(outline=outline).values_list('id', flat=True))
+    try:
+        operations = {
+            'get_outline': measure(lambda: request('get', f'/api/outline/{outline.id}/'), repeat),
+            'get_feedback': {
+                'cold': measure(feedback, repeat, setup=cache.clear),
+                'warm': measure(feedback, repeat),
+            },
+            'aggregate_class_data': {
+                'cold': measure(aggregate, repeat, setup=cache.clear),
+                'warm': measure(aggregate, repeat),
+            },
+            'submit_answer': _run_submit(outline, submit_students, submit_threads),
+        }
+    finally:
+        PersonalizationDelta.objects.filter(outline=outline).exclude(id__in=existing_deltas).delete()
+
+    return {
+        'database': connection.vendor,
+        'dataset': {
+            'outline_id': outline.id,
+            'questions': QuizQuestion.objects.filter(outline=outline).count(),
+            'completed_attempts': Attempt.objects.filter(outline=outline, is_completed=True).count(),
+        },
+        'operations': operations,
+    }
+
+
+def _run_submit(outline, submit_students, submit_threads):
+    """为部分学生新建会话并并发提交整套题目,结束后删除这些会话"""
+    questions = list(QuizQuestion.objects.filter(outline=outline).order_by('order'))
+    students = Student.objects.filter(attempts__outline=outline).distinct().order_by('id')[:submit_students]
+    attempts = Attempt.objects.bulk_create([Attempt(student=student, outline=outline) for student in students])
+    payloads = [
+        {
+            'attempt_id': attempt.id,
+            'question_id': question.id,
+            'student_answer': question.correct_answer if (attempt.id + question.id) % 3 else '不知道',
+            'time_spent_sec': 20.0,
+        }
+        for attempt in attempts
+        for question in questions
+    ]
+    try:
+        stats = run_submits({'outline': outline, 'payloads': payloads}, submit_threads)
+    finally:
+        Attempt.objects.filter(id__in=[attempt.id for attempt in attempts]).delete()
+    stats.pop('stored_answers', None)
+    stats['answers'] = len(payloads)
+    return stats
@@ -0,0 +1,207 @@
+"""
+合成课堂数据生成
+Synthetic classroom data for benchmarks and local load testing
+
+学生能力与题目难度服从简单的 Rasch 模型:P(答对) = sigmoid(能力 - 难度 + 1),
+全班平均正确率约 70%;用时服从对数正态分布。
+数据分批写入(每批一个事务),可生成千万级作答记录而不占用大量内存。
+所有对象都带有 prefix,便于 delete_seeded 清理。
+"""
+import math
+import random
+import time
+from typing import Callable, Dict, List, Optional
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from ..models import Attempt, AttemptAnswer, QuizQuestion, Student, TeacherOutline
+
+DIFFICULTY_OFFSETS = {'easy': -1.0, 'medium': 0.0, 'hard': 1.0}
+QUESTION_TYPES = ['multiple_choice'] * 3 + ['true_false', 'fill_blank']
+CHOICES = ['A', 'B', 'C', 'D']
+
+
+def seed_classroom(
+    outlines: int = 5,
+    questions: int = 20,
+    students: int = 1000,
+    attempts_per_student: int = 1,
+    completed_ratio: float = 0.9,
+    class_size: int = 40,
+    batch_size: int = 2000,
+    prefix: str = 'seed',
+    seed: int = 0,
+    progress: Optional[Callable[[int, int], None]] = None
+) -> Dict[str, object]:
+    """
+    生成大纲、题库、学生、答题会话与作答记录
+
+    Args:
+        outlines: 大纲数量
+        questions: 每个大纲的题目数
+        students: 学生数量
+        attempts_per_student: 每个学生的答题会话数(大纲随机)
+        completed_ratio: 已完成会话的比例(未完成的会话只答了部分题目)
+        class_size: 每个班级的学生数
+        batch_size: 每批写入的学生数
+        prefix: 学号、班级和大纲标题的前缀
+        seed: 随机种子
+        progress: 每批写入后回调 progress(已写入学生数, 学生总数)
+
+    Returns:
+        生成的数据规模与耗时
+    """
+    rng = random.Random(seed)
+    started = time.perf_counter()
+
+    outline_objs = TeacherOutline.objects.bulk_create([
+        TeacherOutline(
+            title=f"[{prefix}] 大纲 {i + 1}",
+            content=f"合成大纲 {i + 1}",
+            difficulty=rng.choice(list(DIFFICULTY_OFFSETS))
+        )
+        for i in range(outlines)
+    ])
+    question_objs = QuizQuestion.objects.bulk_create([
+        _make_question(rng, outline, order)
+        for outline in outline_objs
+        for order in range(1, questions + 1)
+    ])
+    bank: Dict[int, List[QuizQuestion]] = {}
+    for question in question_objs:
+        bank.setdefault(question.outline_id, []).append(question)
+
+    totals = {'attempts': 0, 'answers': 0}
+    for start in range(0, students, batch_size):
+        count = min(batch_size, students - start)
+        with transaction.atomic():
+            _seed_student_batch(
+                rng, start, count, outline_objs, bank, attempts_per_student,
+                completed_ratio, class_size, prefix, totals
+            )
+        if progress is not None:
+            progress(start + count, students)
+
+    # 与真实完成流程一致:每个完成的会话使大纲聚合版本 +1
+    for outline in outline_objs:
+        completed = Attempt.objects.filter(outline=outline, is_completed=True).count()
+        TeacherOutline.objects.filter(id=outline.id).update(aggregate_version=F('aggregate_version') + completed)
+
+    return {
+        'prefix': prefix,
+        'outline_ids': [outline.id for outline in outline_objs],
+        'outlines': outlines,
+        'questions': len(question_objs),
+        'students': students,
+        'attempts': totals['attempts'],
+        'answers': totals['answers'],
+        'seconds': round(time.perf_counter() - started, 2),
+    }
+
+
+def _make_question(rng: random.Random, outline: TeacherOutline, order: int) -> QuizQuestion:
+    question_type = rng.choice(QUESTION_TYPES)
+    if question_type == 'true_false':
+        options, answer = ['对', '错'], rng.choice(['对', '错'])
+    elif question_type == 'fill_blank':
+        options, answer = [], f"答案{order}"
+    else:
+        options, answer = CHOICES, rng.choice(CHOICES)
+    return QuizQuestion(
+        outline=outline,
+        question_text=f"{outline.title} 第 {order} 题",
+        question_type=question_type,
+        options=options,
+        correct_answer=answer,
+        explanation='合成数据',
+        difficulty=rng.choice(list(DIFFICULTY_OFFSETS)),
+        order=order
+    )
+
+
+def _wrong_answer(rng: random.Random, question: QuizQuestion) -> str:
+    wrong = [option for option in question.options if option != question.correct_answer]
+    return rng.choice(wrong) if wrong else '不知道'
+
+
+def _seed_student_batch(
+    rng, start, count, outline_objs, bank, attempts_per_student,
+    completed_ratio, class_size, prefix, totals
+) -> None:
+    student_objs = Student.objects.bulk_create([
+        Student(
+            student_id=f"{prefix}-{i:07d}",
+            name=f"学生{i}",
+            grade='高一',
+            class_name=f"{prefix}-{i // class_size + 1:04d}班"
+        )
+        for i in range(start, start + count)
+    ])
+
+    now = timezone.now()
+    attempt_objs, answered = [], []
+    for student in student_objs:
+        ability = rng.gauss(0.0, 1.0)
+        for _ in range(attempts_per_student):
+            outline = rng.choice(outline_objs)
+            questions = bank[outline.id]
+            completed = rng.random() < completed_ratio
+            taken = questions if completed else questions[:rng.randrange(len(questions))]
+            results = [
+                rng.random() < 1.0 / (1.0 + math.exp(DIFFICULTY_OFFSETS[q.difficulty] - ability - 1.0))
+                for q in taken
+            ]
+            attempt_objs.append(Attempt(
+                student=student,
+                outline=outline,
+                is_completed=completed,
+                completed_at=now if completed else None,
+                total_score=100.0 * sum(results) / len(results) if completed and results else 0.0
+            ))
+            answered.append(list(zip(taken, results)))
+
+    attempt_objs = Attempt.objects.bulk_create(attempt_objs)
+    answer_objs = [
+        AttemptAnswer(
+            attempt=attempt,
+            question=question,
+            student_answer=question.correct_answer if correct else _wrong_answer(rng, question),
+            is_correct=correct,
+            time_spent_sec=round(rng.lognormvariate(math.log(30), 0.5), 1),
+            feedback=''
+        )
+        for attempt, results in zip(attempt_objs, answered)
+        for question, correct in results
+    ]
+    AttemptAnswer.objects.bulk_create(answer_objs)
+
+    totals['attempts'] += len(attempt_objs)
+    totals['answers'] += len(answer_objs)
+
+
+def delete_seeded(prefix: str = 'seed') -> Dict[str, int]:
+    """删除 seed_classroom 生成的数据"""
+    outlines = TeacherOutline.objects.filter(title__startswith=f"[{prefix}] ")
+    students = Student.objects.filter(student_id__startswith=f"{prefix}-")
+    counts = {
+        'outlines': outlines.count(),
+        'students': students.count(),
+    }
+    with transaction.atomic():
+        AttemptAnswer.objects.filter(Q(attempt__outline__in=outlines) | Q(attempt__student__in=students)).delete()
+        Attempt.objects.filter(Q(outline__in=outlines) | Q(student__in=students)).delete()
+        students.delete()
+        outlines.delete()
+    return counts
+
+
+def completed_students(outline_id: int, limit: int) -> List[str]:
+    """某大纲下已完成答题的学号(用于采样反馈请求)"""
+    return list(
+        Student.objects.filter(attempts__outline_id=outline_id, attempts__is_completed=True)
+        .order_by('id')
+        .distinct()
+        .values_list('student_id', flat=True)[:limit]
+    )
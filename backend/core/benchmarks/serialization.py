@@ -0,0 +1,75 @@
+"""
+序列化基准:ModelSerializer + JSONRenderer 对比 .values() + FastJSONRenderer
+
+数据在事务内生成,结束后回滚,不污染数据库。
+"""
+import json
+
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from ..fast_serializers import question_rows
+from ..models import QuizQuestion, TeacherOutline
+from ..renderers import FastJSONRenderer, orjson
+from ..serializers import QuizQuestionSerializer
+
+
+def add_arguments(parser):
+    parser.add_argument('--questions', type=int, default=1000, help='题目数量')
+    parser.add_argument('--students', type=int, default=5000, help='学生报告数量')
+
+
+def run(questions=1000, students=5000, repeat=5, **options):
+    from . import compare
+
+    results = {'orjson': orjson is not None}
+    with transaction.atomic():
+        outline = TeacherOutline.objects.create(title='benchmark', content='benchmark')
+        QuizQuestion.objects.bulk_create([
+            QuizQuestion(
+                outline=outline,
+                question_text=f'第 {i} 题:下列说法正确的是?',
+                options=['A. 选项一', 'B. 选项二', 'C. 选项三', 'D. 选项四'],
+                correct_answer='A',
+                explanation='解析内容' * 10,
+                order=i,
+            )
+            for i in range(questions)
+        ])
+
+        def baseline_questions():
+            data = QuizQuestionSerializer(
+                QuizQuestion.objects.filter(outline=outline), many=True
+            ).data
+            return JSONRenderer().render({'questions': data})
+
+        def fast_questions():
+            return FastJSONRenderer().render({'questions': question_rows(outline.id)})
+
+        _assert_same_shape(baseline_questions(), fast_questions())
+        results[f'outline_questions_{questions}'] = compare(baseline_questions, fast_questions, repeat)
+
+        transaction.set_rollback(True)
+
+    # 班级聚合响应中的学生报告数组
+    payload = {
+        'personalization_id': 1,
+        'class_summary': {'total_students': students, 'accuracy_avg': 0.72},
+        'plan_delta': {'group_overrides': [], 'additional_activities': []},
+        'student_reports': [
+            {'student_id': f'S{i:06d}', 'name': f'学生{i}', 'accuracy': 0.72, 'status': 'medium'}
+            for i in range(students)
+        ],
+    }
+    _assert_same_shape(JSONRenderer().render(payload), FastJSONRenderer().render(payload))
+    results[f'classroom_reports_{students}'] = compare(
+        lambda: JSONRenderer().render(payload),
+        lambda: FastJSONRenderer().render(payload),
+        repeat
+    )
+    return results
+
+
+def _assert_same_shape(baseline: bytes, candidate: bytes) -> None:
+    if json.loads(baseline) != json.loads(candidate):
+        raise AssertionError('Fast serialization path changed the response shape')
@@ -0,0 +1,120 @@
+"""
+基准测试用的 LLM 桩
+Deterministic stand-in for OpenAIClient with a fixed latency
+
+不发起网络请求,调用耗时与返回内容固定,使基准结果只反映本系统的开销。
+"""
+import hashlib
+import json
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Union
+
+from .. import openai_utils
+from ..openai_utils import _record_llm_call
+
+STUB_EMBEDDING_DIM = 256
+
+# 默认返回一份结构完整的教学计划,Teacher Agent 可直接解析
+STUB_CHAT_CONTENT = json.dumps({
+    'objectives': ['理解核心概念', '掌握基本方法', '完成综合练习'],
+    'sequence': ['引入', '讲解', '练习', '总结'],
+    'activities': [
+        {'id': 'A1', 'title': '情境引入', 'minutes': 5},
+        {'id': 'A2', 'title': '核心讲解', 'minutes': 20},
+        {'id': 'A3', 'title': '分组练习', 'minutes': 15},
+    ],
+    'checks': [],
+}, ensure_ascii=False)
+
+
+class StubOpenAIClient:
+    """与 OpenAIClient 接口一致的桩实现"""
+
+    def __init__(self, latency_ms: float = 0.0, content: Union[str, Callable[[str], str]] = STUB_CHAT_CONTENT):
+        self.latency_sec = latency_ms / 1000
+        self.content = content
+        self.default_model = 'stub'
+        self.calls = 0
+        # 模拟服务商前缀缓存:system 消息与之前的请求完全相同时计为命中
+        self._seen_prefixes = set()
+
+    def chat_completion(
+        self,
+        messages: List[Dict[str, str]],
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None,
+        **kwargs
+    ) -> Dict[str, Any]:
+        started = time.perf_counter()
+        self.calls += 1
+        time.sleep(self.latency_sec)
+        prompt_tokens = sum(len(m.get('content', '')) for m in messages) // 4
+        prefix = messages[0].get('content', '') if messages and messages[0].get('role') == 'system' else ''
+        cached_tokens = len(prefix) // 4 if prefix in self._seen_prefixes else 0
+        self._seen_prefixes.add(prefix)
+        _record_llm_call(started, prompt_tokens + 16, prompt_tokens, cached_tokens)
+        model = model or self.default_model
+        return {
+            # content 可以是按模型返回不同输出的函数(用于测试模型升级)
+            'content': self.content(model) if callable(self.content) else self.content,
+            'model': model,
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': 16,
+                'total_tokens': prompt_tokens + 16,
+                'cached_tokens': cached_tokens
+            },
+            'finish_reason': 'stop'
+        }
+
+    def create_embedding(
+        self,
+        text: str,
+        model: str = 'stub-embedding',
+        dimensions: Optional[int] = None
+    ) -> List[float]:
+        """按文本哈希生成确定性的伪嵌入向量(相同文本得到相同向量)"""
+        started = time.perf_counter()
+        self.calls += 1
+        time.sleep(self.latency_sec)
+        vector = _stub_vector(text, dimensions)
+        _record_llm_call(started)
+        return vector
+
+    def create_embeddings(
+        self,
+        texts: List[str],
+        model: str = 'stub-embedding',
+        dimensions: Optional[int] = None
+    ) -> List[List[float]]:
+        """批量版本:一次调用返回全部文本的伪嵌入向量"""
+        if not texts:
+            return []
+        started = time.perf_counter()
+        self.calls += 1
+        time.sleep(self.latency_sec)
+        vectors = [_stub_vector(text, dimensions) for text in texts]
+        _record_llm_call(started)
+        return vectors
+
+
+def _stub_vector(text: str, dimensions: Optional[int]) -> List[float]:
+    digest = hashlib.sha256(text.encode('utf-8')).digest()
+    return [(digest[i % len(digest)] - 127.5) / 127.5 for i in range(dimensions or STUB_EMBEDDING_DIM)]
+
+
+@contextmanager
+def stub_llm(
+    latency_ms: float = 0.0,
+    content: Union[str, Callable[[str], str]] = STUB_CHAT_CONTENT
+) -> Iterator[StubOpenAIClient]:
+    """在上下文内用桩替换全局 OpenAI 客户端(get_openai_client 返回桩)"""
+    stub = StubOpenAIClient(latency_ms, content)
+    previous = openai_utils._client_instance
+    openai_utils._client_instance = stub
+    try:
+        yield stub
+    finally:
+        openai_utils._client_instance = previous
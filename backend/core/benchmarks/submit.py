@@ -0,0 +1,123 @@
+"""
+作答提交基准:持续并发 submit_answer 的吞吐(逐条写入 vs 写后缓冲)
+
+在当前配置的数据库上创建临时大纲/学生/会话,结束后删除。
+使用文件型 SQLite 时才能反映真实的写锁竞争。
+"""
+import threading
+import time
+import uuid
+
+from django.db import close_old_connections, connection
+from django.test import Client
+from django.test.utils import override_settings
+
+from ..models import Attempt, AttemptAnswer, QuizQuestion, Student, TeacherOutline
+from ..write_behind import flush_pending_answers
+
+
+def add_arguments(parser):
+    parser.add_argument('--threads', type=int, default=16, help='并发提交线程数')
+    parser.add_argument('--students', type=int, default=64, help='学生(会话)数量')
+    parser.add_argument('--questions', type=int, default=20, help='每个会话的题目数')
+    parser.add_argument(
+        '--mode', choices=['direct', 'write_behind', 'both'], default='both',
+        help='direct: 每次请求单独写入; write_behind: 写后缓冲'
+    )
+
+
+def run(threads=16, students=64, questions=20, mode='both', **options):
+    modes = ['direct', 'write_behind'] if mode == 'both' else [mode]
+    results = {
+        'database': connection.vendor,
+        'threads': threads,
+        'answers_per_run': students * questions,
+    }
+    for name in modes:
+        fixture = _create_fixture(students, questions)
+        try:
+            with override_settings(ANSWER_WRITE_BEHIND=(name == 'write_behind')):
+                results[name] = run_submits(fixture, threads)
+        finally:
+            fixture['outline'].delete()
+            Student.objects.filter(student_id__startswith=fixture['prefix']).delete()
+    return results
+
+
+def _create_fixture(students, questions):
+    prefix = f"bench-{uuid.uuid4().hex[:8]}-"
+    outline = TeacherOutline.objects.create(title='submit benchmark', content='benchmark')
+    question_objs = QuizQuestion.objects.bulk_create([
+        QuizQuestion(outline=outline, question_text=f'Q{i}', correct_answer='A', order=i)
+        for i in range(questions)
+    ])
+    student_objs = Student.objects.bulk_create([
+        Student(student_id=f"{prefix}{i}", name=f"student {i}")
+        for i in range(students)
+    ])
+    attempts = Attempt.objects.bulk_create([
+        Attempt(student=student, outline=outline) for student in student_objs
+    ])
+    payloads = [
+        {
+            'attempt_id': attempt.id,
+            'question_id': question.id,
+            'student_answer': 'A' if (attempt.id + question.id) % 3 else 'B',
+            'time_spent_sec': 5.0,
+        }
+        for attempt in attempts
+        for question in question_objs
+    ]
+    return {'outline': outline, 'prefix': prefix, 'payloads': payloads}
+
+
+def run_submits(fixture, threads):
+    """多线程提交 fixture['payloads'],返回吞吐与延迟统计"""
+    payloads = fixture['payloads']
+    lock = threading.Lock()
+    cursor = {'next': 0}
+    statuses = {}
+    latencies = []
+
+    def worker():
+        client = Client(SERVER_NAME='localhost')
+        local_latencies = []
+        while True:
+            with lock:
+                index = cursor['next']
+                cursor['next'] += 1
+            if index >= len(payloads):
+                break
+            started = time.perf_counter()
+            try:
+                response = client.post('/api/submit_answer/', payloads[index], content_type='application/json')
+                code = response.status_code
+            except Exception as e:  # database is locked 等
+                code = type(e).__name__
+            local_latencies.append((time.perf_counter() - started) * 1000)
+            with lock:
+                statuses[code] = statuses.get(code, 0) + 1
+        with lock:
+            latencies.extend(local_latencies)
+        close_old_connections()
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    acknowledged = time.perf_counter() - started
+    flush_pending_answers()
+    durable = time.perf_counter() - started
+
+    latencies.sort()
+    stored = AttemptAnswer.objects.filter(attempt__outline=fixture['outline']).count()
+    return {
+        'statuses': {str(k): v for k, v in statuses.items()},
+        'submits_per_sec': round(len(payloads) / acknowledged, 1),
+        'durable_submits_per_sec': round(len(payloads) / durable, 1),
+        'p50_ms': round(latencies[len(latencies) // 2], 2),
+        'p95_ms': round(latencies[int(len(latencies) * 0.95) - 1], 2),
+        'stored_answers': stored,
+    }
@@ -0,0 +1,35 @@
+"""
+向量索引基准:在 N 个随机向量上的 top-k 余弦检索延迟
+
+    python manage.py benchmark vector_index --rows 100000 --dim 128
+"""
+import time
+
+import numpy as np
+
+from ..vector_index import VectorIndex
+
+
+def add_arguments(parser):
+    parser.add_argument('--rows', type=int, default=100000, help='索引中的向量数')
+    parser.add_argument('--dim', type=int, default=128, help='向量维度')
+    parser.add_argument('--k', type=int, default=5, help='每次检索返回的结果数')
+
+
+def run(repeat=5, rows=100000, dim=128, k=5, **options):
+    from . import measure
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((rows, dim)).astype(np.float32)
+    index = VectorIndex(dim, capacity=rows)
+    started = time.perf_counter()
+    index.add_many(range(rows), vectors)
+    build_ms = (time.perf_counter() - started) * 1000
+
+    queries = iter(vectors[rng.integers(0, rows, size=max(repeat, 1) * 3)] + 0.01)
+    return {
+        'rows': rows,
+        'dim': dim,
+        'build_ms': round(build_ms, 1),
+        'search': measure(lambda: index.search(next(queries), k=k), max(repeat, 1) * 3),
+    }
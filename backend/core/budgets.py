@@ -0,0 +1,195 @@
+"""
+接口查询数与延迟预算
+Per-endpoint database query and latency budgets
+
+core/urls.py 中的每个 URL 在 ENDPOINT_BUDGETS 中声明:
+- max_queries: 单次请求允许的最大查询数(与数据规模无关,N+1 会直接超出)
+- max_ms: 单次请求的延迟上限(在测试用的合成数据集上,缓存未命中)
+以及构造请求所需的参数。core.tests.EndpointBudgetTests 逐个请求并断言不超预算;
+新增接口时必须同时声明预算,否则测试失败。
+
+延迟预算可用环境变量 PERF_BUDGET_LATENCY_SCALE 整体放宽(较慢的 CI 机器)。
+"""
+import gc
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+LATENCY_SCALE = float(os.getenv('PERF_BUDGET_LATENCY_SCALE', '1.0'))
+
+Fixture = Dict[str, Any]
+
+
+@dataclass(frozen=True)
+class EndpointBudget:
+    """单个接口的预算与请求构造方式"""
+    max_queries: int
+    max_ms: float
+    method: str = 'get'
+    url_kwargs: Callable[[Fixture], Dict[str, Any]] = field(default=lambda fixture: {})
+    body: Optional[Callable[[Fixture], Dict[str, Any]]] = None
+    expected_status: int = 200
+    # 请求期间覆盖的 settings
+    settings: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class BudgetResult:
+    name: str
+    path: str
+    status: int
+    queries: int
+    elapsed_ms: float
+    sql: List[str]
+
+    def violations(self, budget: EndpointBudget) -> List[str]:
+        problems = []
+        if self.status != budget.expected_status:
+            problems.append(f"status {self.status} != {budget.expected_status}")
+        if self.queries > budget.max_queries:
+            problems.append(f"{self.queries} queries > budget {budget.max_queries}")
+        max_ms = budget.max_ms * LATENCY_SCALE
+        if self.elapsed_ms > max_ms:
+            problems.append(f"{self.elapsed_ms:.1f} ms > budget {max_ms:.0f} ms")
+        return problems
+
+    def report(self, max_statements: int = 20, width: int = 200) -> str:
+        """失败信息:执行过的 SQL(截断)"""
+        lines = [f"{self.queries} queries in {self.elapsed_ms:.1f} ms for {self.path}:"]
+        lines += [f"  {sql[:width]}" for sql in self.sql[:max_statements]]
+        if len(self.sql) > max_statements:
+            lines.append(f"  ... {len(self.sql) - max_statements} more")
+        return '\n'.join(lines)
+
+
+ENDPOINT_BUDGETS: Dict[str, EndpointBudget] = {
+    'health_check': EndpointBudget(max_queries=0, max_ms=50),
+    'llm_route_stats': EndpointBudget(max_queries=0, max_ms=50),
+    'create_outline': EndpointBudget(
+        max_queries=1, max_ms=100, method='post', expected_status=201,
+        body=lambda f: {'title': 'budget outline', 'content': 'budget'}
+    ),
+    'get_outline': EndpointBudget(
+        max_queries=2, max_ms=100,
+        url_kwargs=lambda f: {'outline_id': f['outline_id']}
+    ),
+    'list_outlines': EndpointBudget(max_queries=1, max_ms=100),
+    'generate_lesson_plan': EndpointBudget(
+        max_queries=2, max_ms=200, method='post', expected_status=201,
+        url_kwargs=lambda f: {'outline_id': f['outline_id']}
+    ),
+    # 首次请求生成并保存大纲向量(嵌入调用由桩替代)
+    'similar_lesson_plans': EndpointBudget(
+        max_queries=6, max_ms=100,
+        url_kwargs=lambda f: {'outline_id': f['outline_id']}
+    ),
+    # 测试事务中的数据对工作线程不可见,流水线在请求线程中顺序执行
+    'onboard_outline': EndpointBudget(
+        max_queries=6, max_ms=200, method='post', expected_status=201,
+        url_kwargs=lambda f: {'outline_id': f['outline_id']},
+        body=lambda f: {'num_questions': 6},
+        settings={'PIPELINE_MAX_WORKERS': 1}
+    ),
+    # 出题去重读取本大纲已有题目的文本:1 次查询
+    'generate_quiz': EndpointBudget(
+        max_queries=3, max_ms=200, method='post', expected_status=201,
+        url_kwargs=lambda f: {'outline_id': f['outline_id']},
+        body=lambda f: {'num_questions': 10}
+    ),
+    'similar_questions': EndpointBudget(
+        max_queries=1, max_ms=100,
+        url_kwargs=lambda f: {'question_id': f['question_id']}
+    ),
+    # 知识追踪在作答事务内读-改-写知识状态与题目难度:最新计划、状态、题目、两次写回共 5 次查询
+    'submit_answer': EndpointBudget(
+        max_queries=10, max_ms=100, method='post', expected_status=201,
+        body=lambda f: {
+            'attempt_id': f['open_attempt_id'],
+            'question_id': f['question_id'],
+            'student_answer': 'A',
+            'time_spent_sec': 12.0,
+        }
+    ),
+    # 知识点掌握度:读取 1 行知识状态;学生尚无状态时另查最新计划
+    'get_feedback': EndpointBudget(
+        max_queries=6, max_ms=100,
+        url_kwargs=lambda f: {'outline_id': f['outline_id'], 'student_id': f['student_id']}
+    ),
+    # 全班掌握度:最新计划 + 每个学生一行知识状态
+    'aggregate_class_data': EndpointBudget(
+        max_queries=8, max_ms=200, method='post', expected_status=201,
+        url_kwargs=lambda f: {'outline_id': f['outline_id']}
+    ),
+    # 测试客户端走 WSGI,SSE 接口直接返回 501,不访问数据库
+    'classroom_live': EndpointBudget(
+        max_queries=0, max_ms=100, expected_status=501,
+        url_kwargs=lambda f: {'outline_id': f['outline_id']}
+    ),
+    'publish_plan': EndpointBudget(
+        max_queries=2, max_ms=100, method='post',
+        url_kwargs=lambda f: {'outline_id': f['outline_id']},
+        body=lambda f: {'personalization_id': f['personalization_id']}
+    ),
+    'create_student': EndpointBudget(
+        max_queries=2, max_ms=100, method='post', expected_status=201,
+        body=lambda f: {'student_id': 'budget-student', 'name': 'budget'}
+    ),
+    'create_attempt': EndpointBudget(
+        max_queries=3, max_ms=100, method='post', expected_status=201,
+        body=lambda f: {'student_id': f['student_id'], 'outline_id': f['outline_id']}
+    ),
+    'complete_attempt': EndpointBudget(
+        max_queries=5, max_ms=100, method='post',
+        url_kwargs=lambda f: {'attempt_id': f['complete_attempt_id']}
+    ),
+    # 会话、已答题目、能力、选中的题目;难度索引首次加载另有 1 次查询,之后选题不访问数据库
+    'next_question': EndpointBudget(
+        max_queries=5, max_ms=50,
+        url_kwargs=lambda f: {'attempt_id': f['adaptive_attempt_id']}
+    ),
+    # 导出为流式响应,计时包含读完全部内容(约 8000 行 / 约 800 行)
+    'export_outline_answers': EndpointBudget(
+        max_queries=2, max_ms=2000,
+        url_kwargs=lambda f: {'outline_id': f['outline_id'], 'fmt': 'ndjson'}
+    ),
+    'export_class_answers': EndpointBudget(
+        max_queries=2, max_ms=400,
+        url_kwargs=lambda f: {'class_name': f['class_name'], 'fmt': 'csv'}
+    ),
+}
+
+
+def measure_endpoint(client, name: str, budget: EndpointBudget, fixture: Fixture) -> BudgetResult:
+    """按预算声明发起一次请求(缓存未命中),记录状态码、查询数与耗时"""
+    path = reverse(f'core:{name}', kwargs=budget.url_kwargs(fixture))
+    body = json.dumps(budget.body(fixture)) if budget.body is not None else None
+    request = getattr(client, budget.method)
+    cache.clear()
+    # 避免把前面生成数据留下的垃圾回收计入本次请求
+    gc.collect()
+
+    with override_settings(**budget.settings), CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        if body is None:
+            response = request(path)
+        else:
+            response = request(path, data=body, content_type='application/json')
+        if response.streaming:
+            b''.join(response.streaming_content)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+    return BudgetResult(
+        name=name,
+        path=path,
+        status=response.status_code,
+        queries=len(queries),
+        elapsed_ms=elapsed_ms,
+        sql=[query['sql'] for query in queries.captured_queries]
+    )
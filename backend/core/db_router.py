@@ -0,0 +1,120 @@
+"""
+读写分离数据库路由
+Read/write database routing for analytics queries
+
+设置 DATABASE_REPLICA_NAME 后启用只读副本(别名 DATABASE_REPLICA_ALIAS):
+- 只有显式标记的分析类读取(班级聚合统计、个体反馈、数据导出)走副本,
+  其余读取与全部写入都走主库
+- 同一上下文内发生写入后,后续分析读取固定到主库(读自己的写);
+  ReplicaPinningMiddleware 再用短期 cookie 把该客户端之后
+  DATABASE_REPLICA_PIN_SEC 秒内的请求固定到主库
+- 传入大纲时先比较副本与主库的 aggregate_version,副本落后则退回主库,
+  避免把过期统计缓存到新版本的缓存键下
+
+本地可用两个 SQLite 文件验证:
+    DATABASE_REPLICA_NAME=replica.sqlite3 python manage.py sync_replica
+"""
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from .models import TeacherOutline
+
+logger = logging.getLogger(__name__)
+
+PIN_COOKIE = 'db_primary_pin'
+
+# 当前上下文中分析类读取使用的数据库别名(None 表示不是分析读取)
+_analytics_db: ContextVar[Optional[str]] = ContextVar('analytics_db', default=None)
+# 当前上下文是否已发生写入
+_pinned: ContextVar[bool] = ContextVar('db_pinned_to_primary', default=False)
+
+
+def replica_alias() -> Optional[str]:
+    """已配置的只读副本别名,未配置时为 None"""
+    alias = settings.DATABASE_REPLICA_ALIAS
+    return alias if alias and alias in settings.DATABASES else None
+
+
+def is_pinned() -> bool:
+    return _pinned.get()
+
+
+def pin_to_primary() -> None:
+    """把当前上下文的后续分析读取固定到主库"""
+    _pinned.set(True)
+
+
+def analytics_db(outline: Optional[TeacherOutline] = None) -> str:
+    """
+    分析类只读查询应使用的数据库别名
+
+    可直接用于惰性求值的 queryset(如流式导出在视图返回后才执行查询):
+        queryset.using(analytics_db())
+
+    Args:
+        outline: 传入时检查副本中该大纲的聚合版本是否已追上主库
+    """
+    alias = replica_alias()
+    if alias is None or _pinned.get():
+        return DEFAULT_DB_ALIAS
+
+    if outline is not None:
+        replica_version = TeacherOutline.objects.using(alias).filter(
+            id=outline.id
+        ).values_list('aggregate_version', flat=True).first()
+        if replica_version is None or replica_version < outline.aggregate_version:
+            logger.info(f"↩️ Replica behind for outline {outline.id}, reading from primary")
+            return DEFAULT_DB_ALIAS
+    return alias
+
+
+@contextmanager
+def analytics_reads(outline: Optional[TeacherOutline] = None) -> Iterator[str]:
+    """在上下文内把模型读取路由到副本(写入仍走主库,且写入后的读取回到主库)"""
+    token = _analytics_db.set(analytics_db(outline))
+    try:
+        yield _analytics_db.get()
+    finally:
+        _analytics_db.reset(token)
+
+
+@contextmanager
+def routing_scope(pinned: bool = False) -> Iterator[None]:
+    """
+    单个请求的路由状态作用域
+
+    contextvar 在同一线程内会跨请求保留,每个请求开始时需要重置。
+    """
+    analytics_token = _analytics_db.set(None)
+    pinned_token = _pinned.set(pinned)
+    try:
+        yield
+    finally:
+        _pinned.reset(pinned_token)
+        _analytics_db.reset(analytics_token)
+
+
+class AnalyticsReplicaRouter:
+    """分析读取走副本、其余读写走主库的数据库路由"""
+
+    def db_for_read(self, model, **hints):
+        alias = _analytics_db.get()
+        if alias is None:
+            return None
+        return DEFAULT_DB_ALIAS if _pinned.get() else alias
+
+    def db_for_write(self, model, **hints):
+        if replica_alias() is not None:
+            _pinned.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, replica_alias()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
@@ -0,0 +1,135 @@
+"""
+答题数据导出
+Streaming CSV / NDJSON export of AttemptAnswer rows
+
+行数据通过 ``.iterator(chunk_size=...)`` 逐块读取,并由 StreamingHttpResponse
+逐行输出,内存占用与导出行数无关。
+"""
+import csv
+import json
+from typing import Any, Dict, Iterator, Optional
+
+from django.db.models import QuerySet
+
+from .models import AttemptAnswer
+
+# 每次从数据库游标读取的行数
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_FIELDS = [
+    'answer_id',
+    'attempt_id',
+    'outline_id',
+    'student_id',
+    'student_name',
+    'class_name',
+    'question_id',
+    'question_order',
+    'question_type',
+    'student_answer',
+    'is_correct',
+    'time_spent_sec',
+    'answered_at',
+    'attempt_started_at',
+    'attempt_completed_at',
+    'attempt_is_completed',
+    'attempt_total_score',
+]
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def answers_for_outline(outline_id: int) -> QuerySet:
+    """某大纲下的全部作答记录"""
+    return _export_queryset().filter(attempt__outline_id=outline_id)
+
+
+def answers_for_class(class_name: str) -> QuerySet:
+    """某班级学生的全部作答记录"""
+    return _export_queryset().filter(attempt__student__class_name=class_name)
+
+
+def _export_queryset() -> QuerySet:
+    # 按主键顺序导出,避免默认 ordering 引入的 question__order 排序
+    return (
+        AttemptAnswer.objects
+        .select_related('attempt__student', 'question')
+        .only(
+            'id', 'student_answer', 'is_correct', 'time_spent_sec', 'answered_at',
+            'attempt__id', 'attempt__outline_id', 'attempt__started_at',
+            'attempt__completed_at', 'attempt__is_completed', 'attempt__total_score',
+            'attempt__student__student_id', 'attempt__student__name',
+            'attempt__student__class_name',
+            'question__id', 'question__order', 'question__question_type',
+        )
+        .order_by('attempt_id', 'id')
+    )
+
+
+def _isoformat(value) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+def answer_to_row(answer: AttemptAnswer) -> Dict[str, Any]:
+    """将单条作答记录展开为扁平的导出行"""
+    attempt = answer.attempt
+    student = attempt.student
+    question = answer.question
+    return {
+        'answer_id': answer.id,
+        'attempt_id': attempt.id,
+        'outline_id': attempt.outline_id,
+        'student_id': student.student_id,
+        'student_name': student.name,
+        'class_name': student.class_name,
+        'question_id': question.id,
+        'question_order': question.order,
+        'question_type': question.question_type,
+        'student_answer': answer.student_answer,
+        'is_correct': answer.is_correct,
+        'time_spent_sec': answer.time_spent_sec,
+        'answered_at': _isoformat(answer.answered_at),
+        'attempt_started_at': _isoformat(attempt.started_at),
+        'attempt_completed_at': _isoformat(attempt.completed_at),
+        'attempt_is_completed': attempt.is_completed,
+        'attempt_total_score': attempt.total_score,
+    }
+
+
+def iter_rows(queryset: QuerySet, chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[Dict[str, Any]]:
+    """以固定块大小遍历查询结果,不缓存整个结果集"""
+    for answer in queryset.iterator(chunk_size=chunk_size):
+        yield answer_to_row(answer)
+
+
+class _Echo:
+    """csv.writer 的伪文件对象:write() 直接返回写入的内容"""
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def stream_csv(queryset: QuerySet, chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[str]:
+    """逐行生成 CSV(带 BOM,方便 Excel 识别 UTF-8 中文)"""
+    writer = csv.DictWriter(_Echo(), fieldnames=EXPORT_FIELDS)
+    yield '\ufeff' + writer.writeheader()
+    for row in iter_rows(queryset, chunk_size):
+        yield writer.writerow(row)
+
+
+def stream_ndjson(queryset: QuerySet, chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[str]:
+    """逐行生成 NDJSON"""
+    for row in iter_rows(queryset, chunk_size):
+        yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+def stream_rows(queryset: QuerySet, fmt: str, chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[str]:
+    """按格式选择行生成器"""
+    if fmt == 'csv':
+        return stream_csv(queryset, chunk_size)
+    if fmt == 'ndjson':
+        return stream_ndjson(queryset, chunk_size)
+    raise ValueError(f"Unsupported export format: {fmt}")
@@ -0,0 +1,74 @@
+"""
+轻量序列化层
+Lightweight serializers for hot read endpoints
+
+直接基于 ``.values()`` 生成字典,跳过 ModelSerializer 的逐字段开销;
+输出结构与 serializers.py 中对应的 ModelSerializer 完全一致。
+"""
+from typing import Any, Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import AttemptAnswer, QuizQuestion, TeacherOutline
+
+# 与 TeacherOutlineSerializer / QuizQuestionSerializer 的 fields 保持一致
+OUTLINE_FIELDS = ['id', 'title', 'content', 'duration_min', 'difficulty',
+                  'created_at', 'updated_at']
+QUESTION_FIELDS = ['id', 'outline', 'question_text', 'question_type', 'options',
+                   'correct_answer', 'explanation', 'difficulty', 'order', 'created_at']
+
+
+def format_datetime(value) -> Optional[str]:
+    """与 DRF DateTimeField.to_representation 相同的 ISO 8601 格式"""
+    if not value:
+        return None
+    if settings.USE_TZ:
+        value = value.astimezone(timezone.get_current_timezone())
+    value = value.isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+def _format_rows(rows: Iterable[Dict[str, Any]], datetime_fields: List[str]) -> List[Dict[str, Any]]:
+    result = []
+    for row in rows:
+        for name in datetime_fields:
+            row[name] = format_datetime(row[name])
+        result.append(row)
+    return result
+
+
+def outline_rows(queryset=None) -> List[Dict[str, Any]]:
+    """等价于 TeacherOutlineSerializer(queryset, many=True).data"""
+    queryset = TeacherOutline.objects.all() if queryset is None else queryset
+    return _format_rows(queryset.values(*OUTLINE_FIELDS), ['created_at', 'updated_at'])
+
+
+def outline_detail(outline_id: int) -> Optional[Dict[str, Any]]:
+    """单个大纲;不存在时返回 None"""
+    rows = outline_rows(TeacherOutline.objects.filter(id=outline_id))
+    return rows[0] if rows else None
+
+
+def question_rows(outline_id: int) -> List[Dict[str, Any]]:
+    """等价于 QuizQuestionSerializer(questions, many=True).data"""
+    rows = QuizQuestion.objects.filter(outline_id=outline_id).values(*QUESTION_FIELDS)
+    return _format_rows(rows, ['created_at'])
+
+
+def feedback_items(attempt_ids: List[int]) -> List[Dict[str, Any]]:
+    """
+    个体反馈中的逐题明细 {qid, correct, time_sec}
+    一次查询取回,顺序与按会话逐个遍历 answers 相同
+    """
+    rows = AttemptAnswer.objects.filter(
+        attempt_id__in=attempt_ids
+    ).order_by(
+        '-attempt__started_at', 'attempt_id', 'question__order'
+    ).values_list('question__order', 'is_correct', 'time_spent_sec')
+    return [
+        {'qid': f"Q{order}", 'correct': 1 if is_correct else 0, 'time_sec': time_sec}
+        for order, is_correct, time_sec in rows
+    ]
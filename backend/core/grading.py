@@ -0,0 +1,228 @@
+"""
+简答题批量批改
+Batched LLM grading of short answers across a class
+
+开启 SHORT_ANSWER_BATCH_GRADING 后,submit_answer 中与参考答案不完全一致的简答题
+记为 grading_status='pending' 立即返回,不逐条调用 LLM。待批改的答案在以下时机批改:
+- 某题出现待批改答案后 SHORT_ANSWER_GRADING_WINDOW_MS 毫秒(进程内定时器,
+  同一窗口内全班提交的答案一起批改)
+- 完成答题时(complete_attempt),先批改该会话涉及的题目,再计分
+
+同一题目的答案按规范化文本去重(大小写、标点、空白不同视为同一答案),
+每次 LLM 调用批改 SHORT_ANSWER_GRADING_BATCH_SIZE 条不同答案,
+结果在一个事务内 bulk_update 写回,并补记知识状态(见 core.knowledge)。
+一个班 40 名学生回答同一道简答题,调用次数由 40 次降为 1~4 次。
+"""
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from .knowledge import AnswerObservation, record_answers
+from .live import live_hub
+from .minhash import tokenize
+from .models import AttemptAnswer, QuizQuestion
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_answer(text: str) -> str:
+    """去重用的答案文本:小写、去掉标点与多余空白"""
+    return ' '.join(tokenize(text or ''))
+
+
+@dataclass
+class GradingReport:
+    """一次批改的统计"""
+    answers: int = 0      # 写回的作答记录数
+    distinct: int = 0     # 去重后送去批改的答案数
+    completions: int = 0  # LLM 调用次数
+    failed: int = 0       # 批改失败、仍待批改的答案数
+
+
+def grade_pending(
+    question_ids: Optional[Iterable[int]] = None,
+    attempt_id: Optional[int] = None,
+    fallback: bool = False,
+    agent=None
+) -> GradingReport:
+    """
+    批改待批改的简答题
+
+    Args:
+        question_ids: 只批改这些题目(为空时批改全部待批改答案)
+        attempt_id: 批改该会话仍有待批改答案的题目(包括全班其他学生对这些题目的答案)
+        fallback: LLM 调用出错时按字符串比较定稿;为 False 时保留待批改,下次重试
+        agent: TutorAgent(默认新建)
+
+    Returns:
+        GradingReport
+    """
+    report = GradingReport()
+    pending = AttemptAnswer.objects.filter(grading_status='pending').order_by()
+    if attempt_id is not None:
+        pending = pending.filter(question_id__in=AttemptAnswer.objects.filter(
+            attempt_id=attempt_id, grading_status='pending'
+        ).order_by().values('question_id'))
+    if question_ids is not None:
+        pending = pending.filter(question_id__in=list(question_ids))
+
+    # {question_id: {规范化答案: (原始答案, [answer_id])}}
+    groups: Dict[int, Dict[str, Tuple[str, List[int]]]] = {}
+    for answer_id, question_id, text in pending.values_list('id', 'question_id', 'student_answer'):
+        key = normalize_answer(text)
+        entry = groups.setdefault(question_id, {}).setdefault(key, (text or '', []))
+        entry[1].append(answer_id)
+    if not groups:
+        return report
+
+    if agent is None:
+        from .services.tutor import TutorAgent
+        agent = TutorAgent()
+    questions = QuizQuestion.objects.in_bulk(list(groups))
+    batch_size = max(settings.SHORT_ANSWER_GRADING_BATCH_SIZE, 1)
+
+    results: Dict[int, dict] = {}
+    for question_id, distinct in groups.items():
+        question = questions.get(question_id)
+        if question is None:
+            continue
+        entries = list(distinct.values())
+        report.distinct += len(entries)
+        for start in range(0, len(entries), batch_size):
+            chunk = entries[start:start + batch_size]
+            texts = [text for text, _ in chunk]
+            try:
+                grades = agent.grade_short_answers(question, texts)
+                report.completions += 1
+            except Exception as e:
+                if not fallback:
+                    report.failed += sum(len(ids) for _, ids in chunk)
+                    logger.warning(f"⚠️ Batch grading failed for question {question_id}, will retry: {e}")
+                    continue
+                logger.warning(f"⚠️ Batch grading failed for question {question_id}, comparing strings: {e}")
+                grades = [agent.check_answer(question, text) for text in texts]
+            for (_, answer_ids), grade in zip(chunk, grades):
+                for answer_id in answer_ids:
+                    results[answer_id] = grade
+
+    report.answers = _write_grades(results)
+    logger.info(
+        f"🧮 Batch graded {report.answers} answers ({report.distinct} distinct) "
+        f"with {report.completions} completions"
+    )
+    return report
+
+
+def _write_grades(results: Dict[int, dict]) -> int:
+    """
+    写回批改结果;已被其他批改写回的答案跳过,不会重复计入知识状态
+
+    答案所属会话已完成(完成时该答案仍待批改、按错误计分)时,重新计分并使大纲缓存失效。
+    """
+    from .aggregates import rescore_completed_attempts  # aggregates 依赖本模块,延迟导入
+
+    if not results:
+        return 0
+    with transaction.atomic():
+        claimed = list(
+            AttemptAnswer.objects
+            .select_for_update(of=('self',))
+            .filter(id__in=list(results), grading_status='pending')
+            .order_by()
+            .values_list(
+                'id', 'question_id', 'attempt__student_id', 'attempt__outline_id', 'question__order', 'attempt_id'
+            )
+        )
+        if not claimed:
+            return 0
+        AttemptAnswer.objects.bulk_update(
+            [
+                AttemptAnswer(
+                    id=answer_id,
+                    is_correct=results[answer_id]['is_correct'],
+                    feedback=results[answer_id]['feedback'],
+                    grading_status='graded'
+                )
+                for answer_id, *_ in claimed
+            ],
+            ['is_correct', 'feedback', 'grading_status']
+        )
+        # 待批改的答案写入时没有计入知识状态,批改后补记
+        record_answers(
+            AnswerObservation(student_id, outline_id, order, results[answer_id]['is_correct'], question_id)
+            for answer_id, question_id, student_id, outline_id, order, _ in claimed
+        )
+        rescore_completed_attempts({attempt_id for *_, attempt_id in claimed})
+        transaction.on_commit(lambda: [
+            live_hub.record_answer(outline_id, results[answer_id]['is_correct'])
+            for answer_id, _, _, outline_id, _, _ in claimed
+        ])
+    return len(claimed)
+
+
+class GradingWindow:
+    """
+    批改窗口:某题出现待批改答案后等待一个窗口,再一起批改窗口内所有题目的答案
+
+    窗口从第一条答案开始计时、不随新答案顺延,批改延迟不超过窗口长度。
+    """
+
+    def __init__(self, window_sec: float):
+        self.window_sec = window_sec
+        self._questions: Set[int] = set()
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+
+    def add(self, question_id: int) -> None:
+        with self._lock:
+            self._questions.add(question_id)
+            if self._timer is None:
+                self._timer = threading.Timer(self.window_sec, self._run)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _run(self) -> None:
+        with self._lock:
+            question_ids, self._questions = self._questions, set()
+            self._timer = None
+        try:
+            close_old_connections()
+            grade_pending(question_ids=question_ids)
+        except Exception as e:
+            # 仍待批改的答案在完成答题时批改
+            logger.error(f"❌ Grading window failed for questions {sorted(question_ids)}: {e}")
+        finally:
+            close_old_connections()
+
+
+_window: Optional[GradingWindow] = None
+_window_lock = threading.Lock()
+
+
+def get_grading_window() -> GradingWindow:
+    global _window
+    if _window is None:
+        with _window_lock:
+            if _window is None:
+                _window = GradingWindow(settings.SHORT_ANSWER_GRADING_WINDOW_MS / 1000)
+    return _window
+
+
+def schedule_grading(question_ids: Iterable[int]) -> None:
+    """事务提交后把题目加入批改窗口;SHORT_ANSWER_GRADING_WINDOW_MS 为 0 时只在完成答题时批改"""
+    if not settings.SHORT_ANSWER_BATCH_GRADING or settings.SHORT_ANSWER_GRADING_WINDOW_MS <= 0:
+        return
+    question_ids = set(question_ids)
+    if not question_ids:
+        return
+
+    def add():
+        window = get_grading_window()
+        for question_id in question_ids:
+            window.add(question_id)
+
+    transaction.on_commit(add)
@@ -0,0 +1,159 @@
+"""
+幂等请求支持
+Idempotency-Key handling for retry-prone POST endpoints
+
+客户端在请求头中携带 Idempotency-Key 时:
+- 首个请求正常执行,其响应与请求指纹一起保存 IDEMPOTENCY_TTL_SEC 秒
+- 相同 key、相同请求体的重试直接重放保存的响应,不再重复写库或调用 LLM
+- 首个请求仍在处理中时,重试得到 409 + Retry-After;处理超过 IDEMPOTENCY_CLAIM_TIMEOUT_SEC
+  仍无响应(进程崩溃等)的记录视为已放弃,相同请求的重试重新占用并执行
+- 相同 key 但请求不同,返回 422
+"""
+import hashlib
+import logging
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyRecord
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+
+def request_fingerprint(request) -> str:
+    """方法 + 路径 + 原始请求体的 SHA-256"""
+    digest = hashlib.sha256()
+    digest.update(request.method.encode())
+    digest.update(b'\n')
+    digest.update(request.get_full_path().encode())
+    digest.update(b'\n')
+    digest.update(request.body)
+    return digest.hexdigest()
+
+
+def _create_record(key: str, fingerprint: str, path: str):
+    try:
+        with transaction.atomic():
+            return IdempotencyRecord.objects.create(
+                key=key,
+                fingerprint=fingerprint,
+                request_path=path,
+                expires_at=timezone.now() + timedelta(seconds=settings.IDEMPOTENCY_TTL_SEC)
+            )
+    except IntegrityError:
+        return None
+
+
+def _claim(key: str, fingerprint: str, path: str):
+    """
+    占用幂等键
+
+    Returns:
+        (record, created) — created 为 True 表示当前请求负责执行
+    """
+    record = _create_record(key, fingerprint, path)
+    if record is not None:
+        return record, True
+
+    existing = IdempotencyRecord.objects.filter(key=key).first()
+    if existing is not None and existing.expires_at > timezone.now():
+        if _is_abandoned(existing) and existing.fingerprint == fingerprint:
+            return _reclaim(existing)
+        return existing, False
+
+    # 旧记录已过期:删除后重新占用一次
+    IdempotencyRecord.objects.filter(key=key, expires_at__lte=timezone.now()).delete()
+    record = _create_record(key, fingerprint, path)
+    if record is not None:
+        return record, True
+    return IdempotencyRecord.objects.get(key=key), False
+
+
+def _is_abandoned(record) -> bool:
+    stale_before = timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_CLAIM_TIMEOUT_SEC)
+    return record.response_status is None and record.claimed_at <= stale_before
+
+
+def _reclaim(record):
+    """重新占用已放弃的记录;按原 claimed_at 条件更新,并发重试中只有一个成功"""
+    now = timezone.now()
+    claimed = IdempotencyRecord.objects.filter(
+        pk=record.pk, response_status__isnull=True, claimed_at=record.claimed_at
+    ).update(claimed_at=now, expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_TTL_SEC))
+    if not claimed:
+        return IdempotencyRecord.objects.get(pk=record.pk), False
+    logger.warning(f"⚠️ Reclaiming abandoned idempotency key {record.key[:8]}...")
+    record.refresh_from_db()
+    return record, True
+
+
+def idempotent(view_func):
+    """
+    幂等装饰器,置于 @api_view 之下使用:
+
+        @api_view(['POST'])
+        @idempotent
+        def submit_answer(request): ...
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return view_func(request, *args, **kwargs)
+        if len(key) > 255:
+            return Response(
+                {'error': f'{IDEMPOTENCY_HEADER} must be at most 255 characters'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        fingerprint = request_fingerprint(request)
+        record, created = _claim(key, fingerprint, request.path)
+
+        if not created:
+            if record.fingerprint != fingerprint:
+                return Response(
+                    {'error': f'{IDEMPOTENCY_HEADER} was already used for a different request'},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY
+                )
+            if record.response_status is None:
+                response = Response(
+                    {'error': 'A request with this idempotency key is still being processed'},
+                    status=status.HTTP_409_CONFLICT
+                )
+                response['Retry-After'] = '1'
+                return response
+            logger.info(f"🔁 Replaying stored response for idempotency key {key[:8]}...")
+            response = Response(record.response_body, status=record.response_status)
+            response['Idempotent-Replayed'] = 'true'
+            return response
+
+        try:
+            response = view_func(request, *args, **kwargs)
+        except Exception:
+            record.delete()
+            raise
+
+        if response.status_code >= 500 or response.status_code == 429 or not hasattr(response, 'data'):
+            # 服务端错误与限流响应不缓存,允许客户端重试
+            record.delete()
+            return response
+
+        record.response_status = response.status_code
+        record.response_body = response.data
+        record.save(update_fields=['response_status', 'response_body'])
+        return response
+
+    return wrapper
+
+
+def purge_expired_records() -> int:
+    """删除过期的幂等记录,返回删除条数"""
+    deleted, _ = IdempotencyRecord.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
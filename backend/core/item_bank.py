@@ -0,0 +1,198 @@
+"""
+自适应选题:题目难度校准与按难度排序的内存索引
+Rasch/Elo item calibration and sub-millisecond adaptive item selection
+
+题目难度 b 与学生能力 θ 在同一 logit 量纲上,答对概率 P = 1 / (1 + e^(b - θ))。
+每条作答记录写入时(见 core.knowledge.record_answers)按 Elo 规则同时更新两者:
+
+    θ += K(n_θ) (y - P),  b -= K(n_b) (y - P),  K(n) = ADAPTIVE_ELO_K / (1 + ADAPTIVE_ELO_DECAY · n)
+
+K 随作答次数递减,新题与新学生收敛快,已校准的参数不会被个别作答大幅改变。
+未校准的题目按 difficulty 标签取先验(easy -1, medium 0, hard 1)。
+
+选题时取未作答题目中难度最接近 θ 的一道(Rasch 模型下信息量最大)。
+每个大纲的候选题按难度排序保存在进程内(bisect 查找,不访问数据库),
+本进程的作答提交后就地更新;其他进程的校准结果在 ADAPTIVE_INDEX_TTL_SEC 后重新加载。
+能力估计的标准误低于 ADAPTIVE_TARGET_SE(或达到题量上限)时结束,
+与固定顺序作答全部题目相比,用更少的题得到可靠的估计。
+"""
+import math
+import threading
+import time
+from bisect import bisect_left, insort
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+
+from .models import QuizQuestion
+
+DIFFICULTY_PRIORS = {'easy': -1.0, 'medium': 0.0, 'hard': 1.0}
+
+
+def item_difficulty(calibrated: Optional[float], label: str) -> float:
+    """题目当前难度:已校准的值,或按难度标签取先验"""
+    return calibrated if calibrated is not None else DIFFICULTY_PRIORS.get(label, 0.0)
+
+
+def rasch_probability(ability: float, difficulty: float) -> float:
+    """能力为 ability 的学生答对难度为 difficulty 的题目的概率"""
+    return 1.0 / (1.0 + math.exp(difficulty - ability))
+
+
+def elo_k(answers: int) -> float:
+    """已有 answers 次作答的参数本次更新的步长"""
+    return settings.ADAPTIVE_ELO_K / (1.0 + settings.ADAPTIVE_ELO_DECAY * answers)
+
+
+def standard_error(ability: float, difficulties: Iterable[float]) -> float:
+    """作答这些题目后能力估计的标准误(Fisher 信息之和加先验信息)"""
+    information = settings.ADAPTIVE_PRIOR_INFORMATION
+    for difficulty in difficulties:
+        p = rasch_probability(ability, difficulty)
+        information += p * (1 - p)
+    return 1.0 / math.sqrt(information)
+
+
+class OutlineItems:
+    """一个大纲的候选题,按难度升序"""
+
+    def __init__(self, items: Iterable[Tuple[int, float]]):
+        self.loaded_at = time.monotonic()
+        self._difficulty: Dict[int, float] = {}
+        self._sorted: List[Tuple[float, int]] = []
+        for question_id, difficulty in items:
+            self._difficulty[question_id] = difficulty
+            self._sorted.append((difficulty, question_id))
+        self._sorted.sort()
+
+    def __len__(self) -> int:
+        return len(self._sorted)
+
+    def difficulty(self, question_id: int) -> Optional[float]:
+        return self._difficulty.get(question_id)
+
+    def update(self, question_id: int, difficulty: float) -> None:
+        old = self._difficulty.get(question_id)
+        if old is None:
+            return
+        del self._sorted[bisect_left(self._sorted, (old, question_id))]
+        insort(self._sorted, (difficulty, question_id))
+        self._difficulty[question_id] = difficulty
+
+    def nearest(self, target: float, exclude: Iterable[int] = ()) -> Optional[Tuple[int, float]]:
+        """未排除的题目中难度最接近 target 的 (question_id, difficulty)"""
+        exclude = set(exclude)
+        right = bisect_left(self._sorted, (target, -1))
+        left = right - 1
+        # 从 target 位置向两侧扩展,跳过已作答的题目
+        while left >= 0 or right < len(self._sorted):
+            candidates = []
+            if left >= 0:
+                candidates.append((target - self._sorted[left][0], left))
+            if right < len(self._sorted):
+                candidates.append((self._sorted[right][0] - target, right))
+            _, position = min(candidates)
+            difficulty, question_id = self._sorted[position]
+            if position == left:
+                left -= 1
+            else:
+                right += 1
+            if question_id not in exclude:
+                return question_id, difficulty
+        return None
+
+
+class ItemIndex:
+    """各大纲候选题的进程内索引(见 get_item_index)"""
+
+    def __init__(self):
+        self._outlines: Dict[int, OutlineItems] = {}
+        self._lock = threading.Lock()
+
+    def items(self, outline_id: int) -> OutlineItems:
+        """大纲的候选题;未加载或超过 ADAPTIVE_INDEX_TTL_SEC 时从数据库加载(1 次查询)"""
+        with self._lock:
+            items = self._outlines.get(outline_id)
+        if items is not None and time.monotonic() - items.loaded_at < settings.ADAPTIVE_INDEX_TTL_SEC:
+            return items
+        rows = QuizQuestion.objects.filter(outline_id=outline_id).order_by().values_list(
+            'id', 'calibrated_difficulty', 'difficulty'
+        )
+        items = OutlineItems((question_id, item_difficulty(calibrated, label)) for question_id, calibrated, label in rows)
+        with self._lock:
+            self._outlines[outline_id] = items
+        return items
+
+    def update(self, outline_id: int, question_id: int, difficulty: float) -> None:
+        """校准结果提交后就地更新(大纲未加载时忽略,下次加载即为新值)"""
+        with self._lock:
+            items = self._outlines.get(outline_id)
+            if items is not None:
+                items.update(question_id, difficulty)
+
+    def invalidate(self, outline_id: int) -> None:
+        """大纲题目增删后调用"""
+        with self._lock:
+            self._outlines.pop(outline_id, None)
+
+
+_item_index: Optional[ItemIndex] = None
+_item_index_lock = threading.Lock()
+
+
+def get_item_index() -> ItemIndex:
+    global _item_index
+    if _item_index is None:
+        with _item_index_lock:
+            if _item_index is None:
+                _item_index = ItemIndex()
+    return _item_index
+
+
+@dataclass
+class Selection:
+    """一次选题结果;done 为真时 question_id 为空"""
+    question_id: Optional[int]
+    difficulty: Optional[float]
+    ability: float
+    standard_error: float
+    answered: int
+    done: bool
+    reason: str = ''
+
+    def as_dict(self) -> Dict[str, object]:
+        return {
+            'question_id': self.question_id,
+            'difficulty': round(self.difficulty, 3) if self.difficulty is not None else None,
+            'ability': round(self.ability, 3),
+            'standard_error': round(self.standard_error, 3),
+            'answered': self.answered,
+            'done': self.done,
+            'reason': self.reason,
+        }
+
+
+def select_next(outline_id: int, ability: float, answered_ids: List[int]) -> Selection:
+    """
+    选出下一道题
+
+    结束条件:作答数达到 ADAPTIVE_MAX_QUESTIONS;或已作答 ADAPTIVE_MIN_QUESTIONS 道以上
+    且标准误不超过 ADAPTIVE_TARGET_SE;或题目已用完。
+    """
+    items = get_item_index().items(outline_id)
+    difficulties = [d for d in (items.difficulty(qid) for qid in answered_ids) if d is not None]
+    se = standard_error(ability, difficulties)
+    answered = len(answered_ids)
+
+    def finish(reason: str) -> Selection:
+        return Selection(None, None, ability, se, answered, True, reason)
+
+    if answered >= settings.ADAPTIVE_MAX_QUESTIONS:
+        return finish('max_questions')
+    if answered >= settings.ADAPTIVE_MIN_QUESTIONS and se <= settings.ADAPTIVE_TARGET_SE:
+        return finish('target_se')
+    match = items.nearest(ability, exclude=answered_ids)
+    if match is None:
+        return finish('exhausted')
+    return Selection(match[0], match[1], ability, se, answered, False)
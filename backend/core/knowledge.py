@@ -0,0 +1,252 @@
+"""
+学生知识状态(贝叶斯知识追踪)
+Incremental Bayesian knowledge tracing per student and knowledge point
+
+知识点取自大纲最新 UnifiedLessonPlan.sequence。题目按顺序轮流对应知识点
+(第 i 题对应 sequence[(i - 1) % K],与 TutorAgent.link_objectives 的分配方式一致)。
+
+每条作答记录写入时(见 core.signals 与写后缓冲),对应知识点的掌握度按 BKT 更新一次:
+
+    答对: P(L|obs) = P(L)(1-S) / (P(L)(1-S) + (1-P(L))G)
+    答错: P(L|obs) = P(L)S / (P(L)S + (1-P(L))(1-G))
+    学习: P(L') = P(L|obs) + (1 - P(L|obs))T
+
+同一次更新中按 Elo 规则更新学生能力 KnowledgeState.ability 与题目难度
+QuizQuestion.calibrated_difficulty,供自适应选题使用(见 core.item_bank)。
+
+状态存于 KnowledgeState:每个 (学生, 大纲) 一行,K 个 float32 掌握度与 uint32 作答次数。
+更新只改一个元素,与作答历史长度无关;反馈与班级报告直接读取该数组。
+计划重新生成且知识点数量变化时,状态重置为先验。
+已有作答数据可用 rebuild_knowledge_state 命令重放生成。
+"""
+import logging
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils import timezone
+
+from .item_bank import elo_k, get_item_index, item_difficulty, rasch_probability
+from .models import KnowledgeState, QuizQuestion, UnifiedLessonPlan
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class BKTParams:
+    """BKT 参数:先验掌握、学习、失误、猜对概率"""
+    p_init: float
+    p_transit: float
+    p_slip: float
+    p_guess: float
+
+    @classmethod
+    def from_settings(cls) -> 'BKTParams':
+        return cls(**settings.KNOWLEDGE_BKT_PARAMS)
+
+
+@dataclass
+class AnswerObservation:
+    """一次作答:学生主键、大纲、题目顺序与对错;question_id 为空时不校准难度"""
+    student_id: int
+    outline_id: int
+    question_order: int
+    is_correct: bool
+    question_id: Optional[int] = None
+
+
+def update_mastery(p_known: float, correct: bool, params: BKTParams) -> float:
+    """观察一次作答后的掌握概率"""
+    if correct:
+        evidence = p_known * (1 - params.p_slip)
+        posterior = evidence / (evidence + (1 - p_known) * params.p_guess)
+    else:
+        evidence = p_known * params.p_slip
+        posterior = evidence / (evidence + (1 - p_known) * (1 - params.p_guess))
+    return posterior + (1 - posterior) * params.p_transit
+
+
+def knowledge_point(question_order: int, size: int) -> int:
+    """题目对应的知识点下标"""
+    return (max(question_order, 1) - 1) % size
+
+
+def latest_sequences(outline_ids: Iterable[int], using: Optional[str] = None) -> Dict[int, Tuple[int, List[str]]]:
+    """各大纲最新教学计划的 (plan_id, sequence);没有计划或 sequence 为空的大纲不在结果中"""
+    plans = (
+        UnifiedLessonPlan.objects.db_manager(using)
+        .filter(outline_id__in=set(outline_ids))
+        .order_by('outline_id', '-created_at', '-id')
+        .values_list('outline_id', 'id', 'sequence')
+    )
+    latest: Dict[int, Tuple[int, List[str]]] = {}
+    for outline_id, plan_id, sequence in plans:
+        if outline_id not in latest and sequence:
+            latest[outline_id] = (plan_id, [str(point) for point in sequence])
+    return latest
+
+
+def state_arrays(state: KnowledgeState, size: int, params: Optional[BKTParams] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """状态的 (掌握度, 作答次数) 可写副本;长度与 size 不符时返回先验"""
+    mastery = np.frombuffer(bytes(state.mastery or b''), dtype=np.float32)
+    observations = np.frombuffer(bytes(state.observations or b''), dtype=np.uint32)
+    if mastery.size != size or observations.size != size:
+        params = params or BKTParams.from_settings()
+        return np.full(size, params.p_init, dtype=np.float32), np.zeros(size, dtype=np.uint32)
+    return mastery.copy(), observations.copy()
+
+
+def record_answers(observations: Iterable[AnswerObservation], using: str = DEFAULT_DB_ALIAS) -> int:
+    """
+    按作答更新知识状态与题目难度
+
+    每条作答更新对应知识点的掌握度(BKT),并按 Elo 规则同时更新学生能力与题目难度
+    (见 core.item_bank)。一批作答共 5 次查询:最新计划、已有状态、题目参数、
+    状态写回、题目写回(新建的状态另有 1 次 bulk_create)。
+    应在写入作答记录的同一事务中调用,使读-改-写与作答记录一起提交;
+    using 为作答记录所在的数据库,读写都在该库进行。
+
+    Returns:
+        更新的状态行数
+    """
+    observations = list(observations)
+    if not observations or not settings.KNOWLEDGE_TRACING_ENABLED:
+        return 0
+    sequences = latest_sequences((obs.outline_id for obs in observations), using=using)
+
+    params = BKTParams.from_settings()
+    states: Dict[Tuple[int, int], KnowledgeState] = {
+        (state.student_id, state.outline_id): state
+        for state in KnowledgeState.objects.using(using).filter(
+            outline_id__in={obs.outline_id for obs in observations},
+            student_id__in={obs.student_id for obs in observations}
+        ).only(
+            'id', 'student_id', 'outline_id', 'lesson_plan_id', 'mastery', 'observations',
+            'ability', 'ability_answers'
+        )
+    }
+    items: Dict[int, QuizQuestion] = QuizQuestion.objects.using(using).only(
+        'id', 'outline_id', 'difficulty', 'calibrated_difficulty', 'calibration_answers'
+    ).in_bulk({obs.question_id for obs in observations if obs.question_id is not None})
+
+    arrays: Dict[Tuple[int, int], Optional[Tuple[np.ndarray, np.ndarray]]] = {}
+    for obs in observations:
+        key = (obs.student_id, obs.outline_id)
+        state = states.get(key)
+        if state is None:
+            state = states[key] = KnowledgeState(
+                student_id=obs.student_id, outline_id=obs.outline_id, mastery=b'', observations=b''
+            )
+        if key not in arrays:
+            arrays[key] = None
+            if obs.outline_id in sequences:
+                plan_id, sequence = sequences[obs.outline_id]
+                state.lesson_plan_id = plan_id
+                arrays[key] = state_arrays(state, len(sequence), params)
+
+        if arrays[key] is not None:
+            mastery, counts = arrays[key]
+            point = knowledge_point(obs.question_order, len(mastery))
+            mastery[point] = update_mastery(float(mastery[point]), obs.is_correct, params)
+            counts[point] += 1
+
+        item = items.get(obs.question_id)
+        if item is not None:
+            difficulty = item_difficulty(item.calibrated_difficulty, item.difficulty)
+            surprise = (1.0 if obs.is_correct else 0.0) - rasch_probability(state.ability, difficulty)
+            state.ability += elo_k(state.ability_answers) * surprise
+            state.ability_answers += 1
+            item.calibrated_difficulty = difficulty - elo_k(item.calibration_answers) * surprise
+            item.calibration_answers += 1
+
+    created, updated = [], []
+    now = timezone.now()
+    for key, state in states.items():
+        if key not in arrays:
+            continue
+        if arrays[key] is not None:
+            state.mastery = arrays[key][0].tobytes()
+            state.observations = arrays[key][1].tobytes()
+        # bulk_update 不会触发 auto_now
+        state.updated_at = now
+        (updated if state.pk else created).append(state)
+    if created:
+        KnowledgeState.objects.using(using).bulk_create(created)
+    if updated:
+        KnowledgeState.objects.using(using).bulk_update(
+            updated, ['lesson_plan', 'mastery', 'observations', 'ability', 'ability_answers', 'updated_at']
+        )
+
+    calibrated = [item for item in items.values() if item.calibration_answers]
+    if calibrated:
+        QuizQuestion.objects.using(using).bulk_update(calibrated, ['calibrated_difficulty', 'calibration_answers'])
+        # 进程内选题索引只反映主库中的题目
+        if using == DEFAULT_DB_ALIAS:
+            index = get_item_index()
+            transaction.on_commit(lambda: [
+                index.update(item.outline_id, item.id, item.calibrated_difficulty) for item in calibrated
+            ], using=using)
+    return len(arrays)
+
+
+def mastery_report(state: Optional[KnowledgeState], sequence: List[str]) -> List[dict]:
+    """[{point, mastery, answered}],按 sequence 顺序;没有状态时为先验"""
+    if state is None:
+        mastery = np.full(len(sequence), BKTParams.from_settings().p_init, dtype=np.float32)
+        counts = np.zeros(len(sequence), dtype=np.uint32)
+    else:
+        mastery, counts = state_arrays(state, len(sequence))
+    return [
+        {'point': point, 'mastery': round(float(mastery[i]), 3), 'answered': int(counts[i])}
+        for i, point in enumerate(sequence)
+    ]
+
+
+def weak_points(report: List[dict]) -> List[str]:
+    """已作答且掌握度低于 KNOWLEDGE_MASTERY_THRESHOLD 的知识点"""
+    return [
+        item['point'] for item in report
+        if item['answered'] and item['mastery'] < settings.KNOWLEDGE_MASTERY_THRESHOLD
+    ]
+
+
+def student_mastery(student_id: int, outline_id: int) -> List[dict]:
+    """
+    学生在大纲各知识点上的掌握度(mastery_report);大纲没有计划时为空列表
+
+    知识点按状态最后一次更新时的计划解释(与数组长度一致),1 次查询;
+    学生尚无状态时按最新计划返回先验。
+    """
+    state = (
+        KnowledgeState.objects
+        .filter(student_id=student_id, outline_id=outline_id, lesson_plan__isnull=False)
+        .select_related('lesson_plan')
+        .only('mastery', 'observations', 'lesson_plan__sequence')
+        .first()
+    )
+    if state is not None and state.lesson_plan.sequence:
+        return mastery_report(state, [str(point) for point in state.lesson_plan.sequence])
+    latest = latest_sequences([outline_id]).get(outline_id)
+    return mastery_report(None, latest[1]) if latest else []
+
+
+def class_mastery(outline_id: int) -> Tuple[List[str], Dict[str, List[dict]]]:
+    """
+    全班知识状态:(知识点序列, {学号: mastery_report})
+
+    2 次查询(最新计划、每个学生一行的掌握度数组),不扫描作答记录。
+    """
+    latest = latest_sequences([outline_id]).get(outline_id)
+    if latest is None:
+        return [], {}
+    _, sequence = latest
+    rows = KnowledgeState.objects.filter(outline_id=outline_id).values_list(
+        'student__student_id', 'mastery', 'observations'
+    )
+    reports = {
+        student_id: mastery_report(KnowledgeState(mastery=mastery, observations=counts), sequence)
+        for student_id, mastery, counts in rows
+    }
+    return sequence, reports
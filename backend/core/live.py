@@ -0,0 +1,231 @@
+"""
+课堂实时看板
+Live classroom dashboard hub (Server-Sent Events)
+
+submit_answer 等写路径把轻量统计增量记录到进程内的 hub;
+SSE 连接按固定最小间隔读取快照,多次变更会被合并为一次推送,
+推送频率与答题并发量无关。
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Count, Q
+
+from .models import Attempt, AttemptAnswer
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class OutlineLiveStats:
+    """单个大纲的实时统计"""
+    answers: int = 0
+    correct: int = 0
+    finished: int = 0
+    version: int = 0
+    seeded_at: float = field(default_factory=time.monotonic)
+    subscribers: int = 0
+    # 基线加载完成后置位;加载期间的其他订阅者在此等待
+    ready: threading.Event = field(default_factory=threading.Event, repr=False, compare=False)
+
+    def as_dict(self) -> Dict[str, float]:
+        accuracy = self.correct / self.answers if self.answers > 0 else 0.0
+        return {
+            'answers': self.answers,
+            'correct': self.correct,
+            'accuracy': round(accuracy, 4),
+            'finished': self.finished,
+        }
+
+
+class ClassroomLiveHub:
+    """
+    进程内实时统计中心
+
+    只跟踪有订阅者的大纲;首次订阅时从数据库加载基线,
+    之后由写路径增量更新,并定期重新加载以纠正多进程部署下的偏差。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[int, OutlineLiveStats] = {}
+
+    def subscribe(self, outline_id: int) -> None:
+        """
+        登记订阅者,必要时加载基线统计(同步,含数据库查询)
+
+        先在锁内登记占位统计,再加载基线:加载期间写路径记录的增量累加在占位上,
+        加载完成后与基线合并,不会丢失。提交时间恰好落在查询之前的少量增量可能被重复计入,
+        由定期 reseed 纠正。
+        """
+        with self._lock:
+            stats = self._stats.get(outline_id)
+            loading = stats is None
+            if loading:
+                stats = self._stats[outline_id] = OutlineLiveStats()
+            stats.subscribers += 1
+        if not loading:
+            stats.ready.wait()
+            return
+
+        try:
+            seeded = self._load_from_db(outline_id)
+        except Exception:
+            with self._lock:
+                stats.subscribers -= 1
+                # 其他等待中的订阅者在下一个推送间隔重新加载
+                stats.seeded_at = float('-inf')
+                if stats.subscribers <= 0 and self._stats.get(outline_id) is stats:
+                    del self._stats[outline_id]
+            stats.ready.set()
+            raise
+        with self._lock:
+            stats.answers += seeded.answers
+            stats.correct += seeded.correct
+            stats.finished += seeded.finished
+            stats.seeded_at = seeded.seeded_at
+        stats.ready.set()
+
+    def unsubscribe(self, outline_id: int) -> None:
+        with self._lock:
+            stats = self._stats.get(outline_id)
+            if stats is None:
+                return
+            stats.subscribers -= 1
+            if stats.subscribers <= 0:
+                del self._stats[outline_id]
+
+    def record_answer(self, outline_id: int, is_correct: bool) -> None:
+        """记录一次作答;无人订阅时为空操作"""
+        with self._lock:
+            stats = self._stats.get(outline_id)
+            if stats is None:
+                return
+            stats.answers += 1
+            if is_correct:
+                stats.correct += 1
+            stats.version += 1
+
+    def record_finished(self, outline_id: int) -> None:
+        """记录一名学生完成答题"""
+        with self._lock:
+            stats = self._stats.get(outline_id)
+            if stats is None:
+                return
+            stats.finished += 1
+            stats.version += 1
+
+    def snapshot(self, outline_id: int) -> Optional[OutlineLiveStats]:
+        """返回统计副本(version 用于判断是否有新变化)"""
+        with self._lock:
+            stats = self._stats.get(outline_id)
+            if stats is None:
+                return None
+            return OutlineLiveStats(
+                answers=stats.answers,
+                correct=stats.correct,
+                finished=stats.finished,
+                version=stats.version,
+                seeded_at=stats.seeded_at,
+            )
+
+    def reseed(self, outline_id: int) -> None:
+        """从数据库重新加载统计,纠正其他进程写入造成的偏差"""
+        fresh = self._load_from_db(outline_id)
+        with self._lock:
+            stats = self._stats.get(outline_id)
+            if stats is None:
+                return
+            changed = (
+                (stats.answers, stats.correct, stats.finished)
+                != (fresh.answers, fresh.correct, fresh.finished)
+            )
+            stats.answers = fresh.answers
+            stats.correct = fresh.correct
+            stats.finished = fresh.finished
+            stats.seeded_at = fresh.seeded_at
+            if changed:
+                stats.version += 1
+
+    def _load_from_db(self, outline_id: int) -> OutlineLiveStats:
+        answer_stats = AttemptAnswer.objects.filter(
+            attempt__outline_id=outline_id
+        ).aggregate(
+            answers=Count('id'),
+            correct=Count('id', filter=Q(is_correct=True))
+        )
+        finished = Attempt.objects.filter(
+            outline_id=outline_id,
+            is_completed=True
+        ).values('student').distinct().count()
+        return OutlineLiveStats(
+            answers=answer_stats['answers'],
+            correct=answer_stats['correct'],
+            finished=finished,
+        )
+
+
+# 全局 hub 实例
+live_hub = ClassroomLiveHub()
+
+
+def _format_event(event: str, data: Dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def stream_outline_stats(outline_id: int, hub: ClassroomLiveHub = live_hub) -> AsyncIterator[str]:
+    """
+    SSE 事件流
+
+    - 连接建立后立即推送一次 snapshot
+    - 之后每 LIVE_MIN_INTERVAL_SEC 至多推送一次 stats(含与上次推送的差值)
+    - 空闲时按 LIVE_HEARTBEAT_SEC 发送注释行保活
+    """
+    min_interval = settings.LIVE_MIN_INTERVAL_SEC
+    heartbeat = settings.LIVE_HEARTBEAT_SEC
+    reseed_every = settings.LIVE_RESEED_SEC
+
+    await sync_to_async(hub.subscribe)(outline_id)
+    try:
+        current = hub.snapshot(outline_id)
+        last_sent = current.as_dict()
+        last_version = current.version
+        last_write = time.monotonic()
+        yield f"retry: {int(min_interval * 1000)}\n\n"
+        yield _format_event('snapshot', last_sent)
+
+        while True:
+            await asyncio.sleep(min_interval)
+            now = time.monotonic()
+            current = hub.snapshot(outline_id)
+            if current is not None and now - current.seeded_at >= reseed_every:
+                await sync_to_async(hub.reseed)(outline_id)
+                current = hub.snapshot(outline_id)
+            if current is None:
+                break
+
+            if current.version != last_version:
+                stats = current.as_dict()
+                delta = {
+                    key: stats[key] - last_sent[key]
+                    for key in ('answers', 'correct', 'finished')
+                }
+                yield _format_event('stats', {**stats, 'delta': delta})
+                last_sent = stats
+                last_version = current.version
+                last_write = now
+            elif now - last_write >= heartbeat:
+                yield ": keep-alive\n\n"
+                last_write = now
+    except asyncio.CancelledError:
+        logger.debug(f"Live stream for outline {outline_id} closed by client")
+        raise
+    finally:
+        hub.unsubscribe(outline_id)
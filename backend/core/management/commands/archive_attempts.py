@@ -0,0 +1,48 @@
+"""
+把超过保留期的已完成会话归档到冷存储并从热表删除
+
+    python manage.py archive_attempts --days 365
+    python manage.py archive_attempts --outline 12 --dry-run
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.archive import archive_outline
+from core.models import Attempt
+
+
+class Command(BaseCommand):
+    help = 'Archive completed attempts older than the retention window into compressed files'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.ARCHIVE_RETENTION_DAYS,
+            help='保留天数,早于此的已完成会话会被归档'
+        )
+        parser.add_argument('--outline', type=int, help='只归档该大纲')
+        parser.add_argument('--batch-size', type=int, default=1000, help='每批归档的会话数')
+        parser.add_argument('--dry-run', action='store_true', help='只统计,不写文件也不删除')
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(days=options['days'])
+        outline_ids = [options['outline']] if options['outline'] else list(
+            Attempt.objects.filter(is_completed=True, completed_at__lt=before)
+            .order_by().values_list('outline_id', flat=True).distinct()
+        )
+
+        total = 0
+        for outline_id in outline_ids:
+            archived = archive_outline(
+                outline_id, before,
+                batch_size=options['batch_size'],
+                dry_run=options['dry_run']
+            )
+            for term, rows in archived.items():
+                total += rows
+                self.stdout.write(f"outline {outline_id} / {term}: {rows} answers")
+
+        verb = 'Would archive' if options['dry_run'] else 'Archived'
+        self.stdout.write(self.style.SUCCESS(f"{verb} {total} answers from {len(outline_ids)} outlines"))
@@ -0,0 +1,35 @@
+"""
+运行性能基准并以 JSON 输出结果
+
+    python manage.py benchmark serialization --questions 1000 --students 5000
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmarks import BENCHMARKS
+
+
+class Command(BaseCommand):
+    help = 'Run a benchmark and print the results as JSON'
+
+    def add_arguments(self, parser):
+        subparsers = parser.add_subparsers(dest='benchmark', required=True)
+        for name, module in BENCHMARKS.items():
+            subparser = subparsers.add_parser(name, help=(module.__doc__ or '').strip().splitlines()[0])
+            subparser.add_argument('--repeat', type=int, default=5, help='重复次数')
+            subparser.add_argument('--output', help='结果写入的 JSON 文件')
+            module.add_arguments(subparser)
+
+    def handle(self, *args, **options):
+        name = options.pop('benchmark')
+        if name not in BENCHMARKS:
+            raise CommandError(f'Unknown benchmark: {name}')
+        output = options.pop('output', None)
+
+        results = {'benchmark': name, 'results': BENCHMARKS[name].run(**options)}
+        text = json.dumps(results, ensure_ascii=False, indent=2)
+        if output:
+            with open(output, 'w', encoding='utf-8') as f:
+                f.write(text + '\n')
+        self.stdout.write(text)
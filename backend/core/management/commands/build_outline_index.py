@@ -0,0 +1,30 @@
+"""
+为尚无(或已过期)嵌入向量的大纲生成向量,供相似大纲检索使用
+
+    python manage.py build_outline_index [--limit 1000]
+"""
+from django.core.management.base import BaseCommand
+
+from core.models import TeacherOutline
+from core.outline_index import get_outline_index
+
+
+class Command(BaseCommand):
+    help = 'Embed outlines that have no up-to-date embedding for near-duplicate lookup'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, help='最多处理的大纲数')
+
+    def handle(self, *args, **options):
+        index = get_outline_index()
+        outlines = TeacherOutline.objects.exclude(
+            embedding__model=index.model, embedding__dim=index.dim
+        ).order_by('id').only('id', 'content')
+        if options['limit']:
+            outlines = outlines[:options['limit']]
+
+        embedded = 0
+        for outline in outlines.iterator():
+            index.embed(outline)
+            embedded += 1
+        self.stdout.write(self.style.SUCCESS(f'Embedded {embedded} outlines ({len(index.index)} indexed)'))
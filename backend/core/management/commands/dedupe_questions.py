@@ -0,0 +1,66 @@
+"""
+题库近似重复报告:按 MinHash/LSH 找出同一大纲内(或整个题库中)的近似重复题目,只报告不删除
+
+    python manage.py dedupe_questions [--outline 3] [--across-outlines] [--threshold 0.7]
+"""
+from itertools import groupby
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.minhash import duplicate_groups
+from core.models import QuizQuestion
+
+
+class Command(BaseCommand):
+    help = 'Report near-duplicate quiz questions per outline (or across the whole bank) using MinHash/LSH'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--outline', type=int, help='只检查该大纲的题目')
+        parser.add_argument('--across-outlines', action='store_true', help='跨大纲检查整个题库')
+        parser.add_argument('--threshold', type=float, help='估计相似度阈值,默认 QUESTION_DEDUP_THRESHOLD')
+        parser.add_argument('--show', type=int, default=20, help='最多列出的重复组数')
+
+    def handle(self, *args, **options):
+        threshold = settings.QUESTION_DEDUP_THRESHOLD if options['threshold'] is None else options['threshold']
+        if not 0 <= threshold <= 1:
+            raise CommandError(f'--threshold must be between 0 and 1, got {threshold}')
+        questions = QuizQuestion.objects.order_by('outline_id', 'id')
+        if options['outline']:
+            questions = questions.filter(outline_id=options['outline'])
+        rows = questions.values_list('outline_id', 'id', 'question_text').iterator(chunk_size=2000)
+
+        texts = {}
+        total = 0
+
+        def keyed(items):
+            nonlocal total
+            for _, question_id, text in items:
+                texts[question_id] = text
+                total += 1
+                yield question_id, text
+
+        if options['across_outlines']:
+            groups = duplicate_groups(keyed(rows), threshold)
+        else:
+            groups, kept = [], set()
+            for _, outline_rows in groupby(rows, key=lambda row: row[0]):
+                found = duplicate_groups(keyed(outline_rows), threshold)
+                groups.extend(found)
+                # 只保留重复组里的题目文本,避免大题库占用内存
+                kept |= {question_id for group in found for question_id, _ in group}
+                texts = {question_id: text for question_id, text in texts.items() if question_id in kept}
+
+        duplicates = sum(len(group) - 1 for group in groups)
+        for group in groups[:options['show']]:
+            (first_id, _), *rest = group
+            self.stdout.write(f'#{first_id} {texts[first_id][:60]}')
+            for question_id, score in rest:
+                self.stdout.write(f'    ≈ #{question_id} ({score:.2f}) {texts[question_id][:60]}')
+        if len(groups) > options['show']:
+            self.stdout.write(f'... {len(groups) - options["show"]} more groups')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{duplicates} near-duplicate questions in {len(groups)} groups '
+            f'out of {total} questions (threshold {threshold})'
+        ))
@@ -0,0 +1,16 @@
+"""
+清理过期的幂等请求记录
+
+    python manage.py purge_idempotency_keys
+"""
+from django.core.management.base import BaseCommand
+
+from core.idempotency import purge_expired_records
+
+
+class Command(BaseCommand):
+    help = 'Delete expired idempotency records'
+
+    def handle(self, *args, **options):
+        deleted = purge_expired_records()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired idempotency records'))
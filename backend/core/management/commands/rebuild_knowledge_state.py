@@ -0,0 +1,52 @@
+"""
+按作答历史重放生成知识状态与题目难度校准(开启知识追踪前的数据、批量导入的作答或修改参数后使用)
+
+    python manage.py rebuild_knowledge_state [--outline 3] [--batch-size 5000]
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.knowledge import AnswerObservation, record_answers
+from core.item_bank import get_item_index
+from core.models import AttemptAnswer, KnowledgeState, QuizQuestion, TeacherOutline
+
+
+class Command(BaseCommand):
+    help = 'Replay answer history in order to rebuild knowledge (BKT) state, abilities and item difficulties'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--outline', type=int, help='只重建该大纲')
+        parser.add_argument('--batch-size', type=int, default=5000, help='每批重放的作答数')
+
+    def handle(self, *args, **options):
+        outline_ids = TeacherOutline.objects.order_by('id').values_list('id', flat=True)
+        if options['outline']:
+            outline_ids = outline_ids.filter(id=options['outline'])
+
+        replayed = 0
+        for outline_id in outline_ids:
+            answers = (
+                AttemptAnswer.objects
+                .filter(attempt__outline_id=outline_id)
+                .order_by('answered_at', 'id')
+                .values_list('attempt__student_id', 'question__order', 'is_correct', 'question_id')
+            )
+            # 每个大纲在一个事务中重建:重放完成前读者看到的仍是旧状态
+            with transaction.atomic():
+                KnowledgeState.objects.filter(outline_id=outline_id).delete()
+                QuizQuestion.objects.filter(outline_id=outline_id).update(
+                    calibrated_difficulty=None, calibration_answers=0
+                )
+                batch = []
+                rows = answers.iterator(chunk_size=options['batch_size'])
+                for student_id, question_order, is_correct, question_id in rows:
+                    batch.append(AnswerObservation(student_id, outline_id, question_order, is_correct, question_id))
+                    if len(batch) >= options['batch_size']:
+                        record_answers(batch)
+                        replayed += len(batch)
+                        batch = []
+                record_answers(batch)
+                replayed += len(batch)
+            get_item_index().invalidate(outline_id)
+
+        self.stdout.write(self.style.SUCCESS(f'Replayed {replayed} answers into knowledge state'))
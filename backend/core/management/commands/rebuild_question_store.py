@@ -0,0 +1,36 @@
+"""
+重建题库嵌入向量存储:为全部题目重新生成向量并原子替换存储文件(同时回收作废的行)
+
+    python manage.py rebuild_question_store [--batch-size 500]
+"""
+from django.core.management.base import BaseCommand
+
+from core.models import QuizQuestion
+from core.question_store import embed_texts, get_question_store, question_text
+
+
+class Command(BaseCommand):
+    help = 'Re-embed every quiz question and atomically rebuild the memory-mapped embedding store'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='每批写入的向量数')
+
+    def handle(self, *args, **options):
+        store = get_question_store()
+        questions = QuizQuestion.objects.order_by('id').only('id', 'question_text')
+        total = store.rebuild(self.embedded(questions, options['batch_size']), batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt question store at {store.directory} with {total} vectors'))
+
+    def embedded(self, questions, batch_size):
+        """(question_id, vector),每批题目一次嵌入请求"""
+        batch = []
+        for question in questions.iterator(chunk_size=batch_size):
+            batch.append(question)
+            if len(batch) >= batch_size:
+                yield from self.embed_batch(batch)
+                batch = []
+        yield from self.embed_batch(batch)
+
+    def embed_batch(self, batch):
+        vectors = embed_texts([question_text(question) for question in batch])
+        return ((question.id, vector) for question, vector in zip(batch, vectors))
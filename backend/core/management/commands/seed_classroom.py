@@ -0,0 +1,50 @@
+"""
+生成合成课堂数据(大纲、题库、学生、答题会话、作答记录)
+
+    python manage.py seed_classroom --students 100000 --outlines 20 --questions 20 --attempts-per-student 5
+    python manage.py seed_classroom --delete
+"""
+import json
+
+from django.core.management.base import BaseCommand
+
+from core.benchmarks.seed import delete_seeded, seed_classroom
+
+
+class Command(BaseCommand):
+    help = 'Seed synthetic classroom data for benchmarks and load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--outlines', type=int, default=5, help='大纲数量')
+        parser.add_argument('--questions', type=int, default=20, help='每个大纲的题目数')
+        parser.add_argument('--students', type=int, default=1000, help='学生数量')
+        parser.add_argument('--attempts-per-student', type=int, default=1, help='每个学生的答题会话数')
+        parser.add_argument('--completed-ratio', type=float, default=0.9, help='已完成会话比例')
+        parser.add_argument('--class-size', type=int, default=40, help='每班学生数')
+        parser.add_argument('--batch-size', type=int, default=2000, help='每批写入的学生数')
+        parser.add_argument('--prefix', default='seed', help='学号与大纲标题前缀')
+        parser.add_argument('--seed', type=int, default=0, help='随机种子')
+        parser.add_argument('--delete', action='store_true', help='删除该前缀的已生成数据后退出')
+
+    def handle(self, *args, **options):
+        if options['delete']:
+            deleted = delete_seeded(options['prefix'])
+            self.stdout.write(self.style.SUCCESS(f"Deleted {deleted}"))
+            return
+
+        def progress(done, total):
+            self.stderr.write(f"seeded {done}/{total} students")
+
+        summary = seed_classroom(
+            outlines=options['outlines'],
+            questions=options['questions'],
+            students=options['students'],
+            attempts_per_student=options['attempts_per_student'],
+            completed_ratio=options['completed_ratio'],
+            class_size=options['class_size'],
+            batch_size=options['batch_size'],
+            prefix=options['prefix'],
+            seed=options['seed'],
+            progress=progress
+        )
+        self.stdout.write(json.dumps(summary, ensure_ascii=False, indent=2))
@@ -0,0 +1,29 @@
+"""
+把主库完整复制到只读副本(SQLite 在线备份),用于本地或单机部署的读写分离
+
+    DATABASE_REPLICA_NAME=replica.sqlite3 python manage.py sync_replica
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core.db_router import replica_alias
+
+
+class Command(BaseCommand):
+    help = 'Copy the primary SQLite database into the analytics replica'
+
+    def handle(self, *args, **options):
+        alias = replica_alias()
+        if alias is None:
+            raise CommandError('No replica configured (set DATABASE_REPLICA_NAME)')
+
+        source, target = connections[DEFAULT_DB_ALIAS], connections[alias]
+        if source.vendor != 'sqlite' or target.vendor != 'sqlite':
+            raise CommandError('sync_replica only supports SQLite; use native replication for other backends')
+
+        source.ensure_connection()
+        target.ensure_connection()
+        source.connection.backup(target.connection)
+        self.stdout.write(self.style.SUCCESS(
+            f"Copied {source.settings_dict['NAME']} -> {target.settings_dict['NAME']}"
+        ))
@@ -0,0 +1,200 @@
+"""
+Core Middleware
+"""
+import json
+import logging
+import random
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .db_router import PIN_COOKIE, is_pinned, replica_alias, routing_scope
+from .openai_utils import track_llm_calls
+
+logger = logging.getLogger('core.perf')
+
+
+class QueryTimer:
+    """数据库查询次数与耗时"""
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+
+
+_query_timer: ContextVar[Optional[QueryTimer]] = ContextVar('query_timer', default=None)
+
+
+def _time_query(execute, sql, params, many, context):
+    timer = _query_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timer.count += 1
+        timer.total_ms += (time.perf_counter() - started) * 1000
+
+
+def install_query_timer(sender, connection, **kwargs):
+    """
+    connection_created 信号处理:为每个新连接安装计时 execute_wrapper
+
+    数据库连接是线程私有的,而 ASGI 下同步视图运行在 sync_to_async 线程中,
+    因此在连接上常驻一个 wrapper,由 contextvar 决定是否计时(随上下文传入线程)。
+    """
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+@contextmanager
+def track_queries() -> Iterator[QueryTimer]:
+    """在上下文内统计数据库查询"""
+    timer = QueryTimer()
+    token = _query_timer.set(timer)
+    try:
+        yield timer
+    finally:
+        _query_timer.reset(token)
+
+
+class PerformanceProfilingMiddleware:
+    """
+    请求级性能剖析
+
+    对 core API 请求记录:
+    - 总耗时
+    - 数据库查询次数 / 耗时
+    - LLM 调用次数 / 耗时
+
+    结果写入 Server-Timing 响应头;超过阈值的请求输出结构化慢请求日志。
+    PERF_SAMPLE_RATE < 1 时只剖析部分请求,未采样的请求不做任何额外工作。
+    流式响应(导出、SSE)只统计到视图返回为止。
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not self._should_profile(request):
+            return self.get_response(request)
+
+        with ExitStack() as stack:
+            query_timer, llm_stats = self._start(stack)
+            started = time.perf_counter()
+            response = self.get_response(request)
+        return self._finish(request, response, started, query_timer, llm_stats)
+
+    async def __acall__(self, request):
+        if not self._should_profile(request):
+            return await self.get_response(request)
+
+        with ExitStack() as stack:
+            query_timer, llm_stats = self._start(stack)
+            started = time.perf_counter()
+            response = await self.get_response(request)
+        return self._finish(request, response, started, query_timer, llm_stats)
+
+    def _should_profile(self, request) -> bool:
+        if not settings.PERF_PROFILING_ENABLED:
+            return False
+        if not request.path.startswith(settings.PERF_PATH_PREFIX):
+            return False
+        sample_rate = settings.PERF_SAMPLE_RATE
+        return sample_rate >= 1.0 or random.random() < sample_rate
+
+    def _start(self, stack: ExitStack):
+        query_timer = stack.enter_context(track_queries())
+        llm_stats = stack.enter_context(track_llm_calls())
+        return query_timer, llm_stats
+
+    def _finish(self, request, response, started, query_timer, llm_stats):
+        total_ms = (time.perf_counter() - started) * 1000
+        response['Server-Timing'] = ', '.join([
+            f'total;dur={total_ms:.1f}',
+            f'db;dur={query_timer.total_ms:.1f};desc="{query_timer.count} queries"',
+            f'llm;dur={llm_stats.total_ms:.1f};desc="{llm_stats.count} calls, '
+            f'{llm_stats.cached_tokens}/{llm_stats.prompt_tokens} cached tokens"',
+        ])
+
+        if self._is_slow(total_ms, query_timer):
+            record = {
+                'method': request.method,
+                'path': request.path,
+                'view': getattr(request.resolver_match, 'view_name', None),
+                'status': response.status_code,
+                'total_ms': round(total_ms, 1),
+                'db_queries': query_timer.count,
+                'db_ms': round(query_timer.total_ms, 1),
+                'llm_calls': llm_stats.count,
+                'llm_ms': round(llm_stats.total_ms, 1),
+                'llm_tokens': llm_stats.total_tokens,
+                'llm_cached_tokens': llm_stats.cached_tokens,
+            }
+            logger.warning(f"🐢 Slow request {json.dumps(record)}", extra={'perf': record})
+
+        return response
+
+    def _is_slow(self, total_ms, query_timer) -> bool:
+        return (
+            total_ms >= settings.PERF_SLOW_REQUEST_MS
+            or query_timer.count >= settings.PERF_SLOW_DB_QUERIES
+            or query_timer.total_ms >= settings.PERF_SLOW_DB_MS
+        )
+
+
+class ReplicaPinningMiddleware:
+    """
+    读写分离的请求作用域(见 core.db_router)
+
+    - 每个请求开始时重置路由状态;带有固定 cookie 的请求整体走主库
+    - 请求内发生写入或使用非安全方法时,在响应中设置 DATABASE_REPLICA_PIN_SEC 秒的
+      固定 cookie,使该客户端随后的分析读取能看到自己刚写入的数据
+    未配置副本时不做任何额外工作。
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if replica_alias() is None:
+            return self.get_response(request)
+
+        with routing_scope(pinned=PIN_COOKIE in request.COOKIES):
+            response = self.get_response(request)
+            wrote = is_pinned()
+        return self._finish(request, response, wrote)
+
+    async def __acall__(self, request):
+        if replica_alias() is None:
+            return await self.get_response(request)
+
+        with routing_scope(pinned=PIN_COOKIE in request.COOKIES):
+            response = await self.get_response(request)
+            wrote = is_pinned()
+        return self._finish(request, response, wrote)
+
+    def _finish(self, request, response, wrote):
+        pin_sec = settings.DATABASE_REPLICA_PIN_SEC
+        if pin_sec > 0 and (wrote or request.method not in ('GET', 'HEAD', 'OPTIONS')):
+            response.set_cookie(PIN_COOKIE, '1', max_age=pin_sec, httponly=True, samesite='Lax')
+        return response
@@ -0,0 +1,55 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:25
+
+import django.core.serializers.json
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def remove_duplicate_answers(apps, schema_editor):
+    """同一会话同一题目只保留最早的一条作答记录(重试产生的重复行)"""
+    AttemptAnswer = apps.get_model('core', 'AttemptAnswer')
+    answers = AttemptAnswer.objects.using(schema_editor.connection.alias)
+    duplicates = (
+        answers
+        .values('attempt_id', 'question_id')
+        .annotate(first_id=Min('id'), total=Count('id'))
+        .filter(total__gt=1)
+    )
+    for row in duplicates.iterator():
+        answers.filter(
+            attempt_id=row['attempt_id'],
+            question_id=row['question_id']
+        ).exclude(id=row['first_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255, unique=True, verbose_name='幂等键')),
+                ('fingerprint', models.CharField(max_length=64, verbose_name='请求指纹')),
+                ('request_path', models.CharField(max_length=255, verbose_name='请求路径')),
+                ('response_status', models.IntegerField(blank=True, null=True, verbose_name='响应状态码')),
+                ('response_body', models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True, verbose_name='响应内容')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='过期时间')),
+            ],
+            options={
+                'verbose_name': '幂等请求记录',
+                'verbose_name_plural': '幂等请求记录',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.RunPython(remove_duplicate_answers, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='attemptanswer',
+            constraint=models.UniqueConstraint(fields=('attempt', 'question'), name='uniq_attempt_answer_question'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:28
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_idempotency_and_unique_answers'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='attempt',
+            name='outline',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='attempts', to='core.teacheroutline', verbose_name='对应大纲'),
+        ),
+        migrations.AlterField(
+            model_name='attempt',
+            name='student',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='attempts', to='core.student', verbose_name='学生'),
+        ),
+        migrations.AlterField(
+            model_name='attemptanswer',
+            name='attempt',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='answers', to='core.attempt', verbose_name='所属会话'),
+        ),
+        migrations.AddIndex(
+            model_name='attempt',
+            index=models.Index(fields=['outline', 'is_completed'], name='attempt_outline_done_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='attempt',
+            index=models.Index(fields=['student', 'outline', 'is_completed'], name='attempt_stu_outline_done_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quizquestion',
+            index=models.Index(fields=['outline', 'order'], name='question_outline_order_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_answer_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='teacheroutline',
+            name='aggregate_version',
+            field=models.PositiveIntegerField(default=0, verbose_name='聚合数据版本'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_outline_aggregate_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutlineEmbedding',
+            fields=[
+                ('outline', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='embedding', serialize=False, to='core.teacheroutline', verbose_name='对应大纲')),
+                ('model', models.CharField(max_length=100, verbose_name='嵌入模型')),
+                ('dim', models.PositiveIntegerField(verbose_name='向量维度')),
+                ('content_hash', models.CharField(max_length=64, verbose_name='正文摘要')),
+                ('vector', models.BinaryField(verbose_name='向量')),
+                ('updated_at', models.DateTimeField(auto_now=True, db_index=True, verbose_name='更新时间')),
+            ],
+            options={
+                'verbose_name': '大纲嵌入向量',
+                'verbose_name_plural': '大纲嵌入向量',
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-19 06:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_outline_embedding'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KnowledgeState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mastery', models.BinaryField(verbose_name='掌握度')),
+                ('observations', models.BinaryField(verbose_name='作答次数')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+                ('lesson_plan', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.unifiedlessonplan', verbose_name='知识点来源计划')),
+                ('outline', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='knowledge_states', to='core.teacheroutline', verbose_name='所属大纲')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='knowledge_states', to='core.student', verbose_name='学生')),
+            ],
+            options={
+                'verbose_name': '知识状态',
+                'verbose_name_plural': '知识状态',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='knowledgestate',
+            constraint=models.UniqueConstraint(fields=('student', 'outline'), name='uniq_knowledge_state_student_outline'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-19 06:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_knowledge_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attempt',
+            name='mode',
+            field=models.CharField(choices=[('fixed', 'Fixed order'), ('adaptive', 'Adaptive')], default='fixed', max_length=20, verbose_name='出题模式'),
+        ),
+        migrations.AddField(
+            model_name='knowledgestate',
+            name='ability',
+            field=models.FloatField(default=0.0, verbose_name='能力估计'),
+        ),
+        migrations.AddField(
+            model_name='knowledgestate',
+            name='ability_answers',
+            field=models.PositiveIntegerField(default=0, verbose_name='能力估计作答数'),
+        ),
+        migrations.AddField(
+            model_name='quizquestion',
+            name='calibrated_difficulty',
+            field=models.FloatField(blank=True, null=True, verbose_name='校准难度'),
+        ),
+        migrations.AddField(
+            model_name='quizquestion',
+            name='calibration_answers',
+            field=models.PositiveIntegerField(default=0, verbose_name='校准作答数'),
+        ),
+    ]
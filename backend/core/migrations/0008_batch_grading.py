@@ -0,0 +1,22 @@
+# Generated by Django 4.2.7 on 2026-10-19 06:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_adaptive_selection'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attemptanswer',
+            name='grading_status',
+            field=models.CharField(choices=[('graded', 'Graded'), ('pending', 'Pending')], default='graded', max_length=20, verbose_name='批改状态'),
+        ),
+        migrations.AddIndex(
+            model_name='attemptanswer',
+            index=models.Index(condition=models.Q(('grading_status', 'pending')), fields=['question'], name='answer_pending_grading_idx'),
+        ),
+    ]
@@ -0,0 +1,163 @@
+"""
+MinHash / LSH 近似去重
+Near-duplicate text detection with MinHash signatures and banded LSH
+
+题目文本先规范化(小写、去标点与空白),再切成 token:中日韩文字逐字成 token,
+连续的字母数字成一个 token;相邻 SHINGLE_SIZE 个 token 组成一个 shingle。
+两段文本 shingle 集合的 Jaccard 相似度由 MinHash 签名中相等位置的比例估计。
+
+LSH 把签名切成 bands 段,任一段完全相同即成为候选:插入与查询都只查 bands 个
+哈希桶,与已有题目数量无关;候选再用签名估计的相似度确认。
+默认 64 个哈希、16 段(每段 4 行),相似度约 0.5 以上的文本大概率进入候选。
+"""
+import re
+import threading
+import zlib
+from typing import Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+SHINGLE_SIZE = 3
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+# 中日韩文字逐字切分,其余按连续字母数字切分;标点、空白被丢弃
+_CJK = '㐀-䶿一-鿿豈-﫿぀-ヿ가-힯'
+_TOKEN_RE = re.compile(rf'[{_CJK}]|[^\W_{_CJK}]+')
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> Set[str]:
+    """文本的 token k-gram 集合;不足 size 个 token 时整段作为一个 shingle"""
+    tokens = tokenize(text)
+    if len(tokens) <= size:
+        return {' '.join(tokens)} if tokens else set()
+    return {' '.join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+
+
+class MinHasher:
+    """用 num_perm 个 (a*x + b) mod p 哈希族计算 MinHash 签名"""
+
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        # a、b < 2^31 且 x < 2^32,a*x + b 不会溢出 uint64
+        self._a = rng.randint(1, 1 << 31, size=num_perm).astype(np.uint64)
+        self._b = rng.randint(0, 1 << 31, size=num_perm).astype(np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        """文本的签名(uint32 数组);空文本返回全为最大值的签名"""
+        items = shingles(text)
+        if not items:
+            return np.full(self.num_perm, _MAX_HASH, dtype=np.uint32)
+        hashes = np.fromiter(
+            (zlib.crc32(item.encode('utf-8')) for item in items), dtype=np.uint64, count=len(items)
+        )
+        permuted = (self._a[:, None] * hashes[None, :] + self._b[:, None]) % _MERSENNE_PRIME
+        return (permuted & _MAX_HASH).min(axis=1).astype(np.uint32)
+
+
+def similarity(left: np.ndarray, right: np.ndarray) -> float:
+    """两个签名估计的 Jaccard 相似度"""
+    return float(np.count_nonzero(left == right)) / len(left)
+
+
+class LSHIndex:
+    """
+    MinHash 签名的分段 LSH 索引(线程安全)
+
+        index = LSHIndex(MinHasher())
+        index.add(question_id, text)
+        index.find(text, threshold=0.8)  # (id, 相似度) 或 None
+    """
+
+    def __init__(self, hasher: Optional[MinHasher] = None, bands: int = 16):
+        self.hasher = hasher or MinHasher()
+        if self.hasher.num_perm % bands:
+            raise ValueError(f"num_perm ({self.hasher.num_perm}) must be divisible by bands ({bands})")
+        self.bands = bands
+        self._rows = self.hasher.num_perm // bands
+        self._buckets: List[Dict[bytes, Set[Hashable]]] = [{} for _ in range(bands)]
+        self._signatures: Dict[Hashable, np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._signatures
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [signature[i * self._rows:(i + 1) * self._rows].tobytes() for i in range(self.bands)]
+
+    def add(self, key: Hashable, text: str) -> np.ndarray:
+        signature = self.hasher.signature(text)
+        self.add_signature(key, signature)
+        return signature
+
+    def add_signature(self, key: Hashable, signature: np.ndarray) -> None:
+        with self._lock:
+            self._remove_locked(key)
+            self._signatures[key] = signature
+            for band, band_key in zip(self._buckets, self._band_keys(signature)):
+                band.setdefault(band_key, set()).add(key)
+
+    def remove(self, key: Hashable) -> bool:
+        with self._lock:
+            return self._remove_locked(key)
+
+    def _remove_locked(self, key: Hashable) -> bool:
+        signature = self._signatures.pop(key, None)
+        if signature is None:
+            return False
+        for band, band_key in zip(self._buckets, self._band_keys(signature)):
+            bucket = band.get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del band[band_key]
+        return True
+
+    def candidates(self, signature: np.ndarray) -> List[Tuple[Hashable, float]]:
+        """与签名至少有一段相同的条目及其估计相似度,按相似度降序"""
+        with self._lock:
+            keys: Set[Hashable] = set()
+            for band, band_key in zip(self._buckets, self._band_keys(signature)):
+                keys |= band.get(band_key, set())
+            scored = [(key, similarity(signature, self._signatures[key])) for key in keys]
+        return sorted(scored, key=lambda item: -item[1])
+
+    def find(self, text: str, threshold: float) -> Optional[Tuple[Hashable, float]]:
+        """相似度不低于 threshold 的最相似条目;没有时返回 None"""
+        return self.find_signature(self.hasher.signature(text), threshold)
+
+    def find_signature(self, signature: np.ndarray, threshold: float) -> Optional[Tuple[Hashable, float]]:
+        matches = self.candidates(signature)
+        return matches[0] if matches and matches[0][1] >= threshold else None
+
+
+def duplicate_groups(
+    items: Iterable[Tuple[Hashable, str]],
+    threshold: float,
+    hasher: Optional[MinHasher] = None,
+    bands: int = 16
+) -> List[List[Tuple[Hashable, float]]]:
+    """
+    把 (key, text) 按近似重复分组:每组第一项为最先出现的条目(相似度 1.0),
+    其余为与它相似度不低于 threshold 的后续条目;只返回含重复的组
+    """
+    index = LSHIndex(hasher, bands=bands)
+    groups: Dict[Hashable, List[Tuple[Hashable, float]]] = {}
+    for key, text in items:
+        signature = index.hasher.signature(text)
+        match = index.find_signature(signature, threshold)
+        if match is None:
+            index.add_signature(key, signature)
+            groups[key] = [(key, 1.0)]
+        else:
+            groups[match[0]].append((key, match[1]))
+    return [group for group in groups.values() if len(group) > 1]
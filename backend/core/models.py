@@ -4,6 +4,8 @@ Core Data Models for AI Education System
 """
 from django.db import models
 from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
 
 
 class TeacherOutline(models.Model):
@@ -33,6 +35,8 @@ class TeacherOutline(models.Model):
         blank=True,
         verbose_name="创建教师"
     )
+    # 答题数据版本:每有会话完成即 +1,下游缓存以此为键精确失效
+    aggregate_version = models.PositiveIntegerField(default=0, verbose_name="聚合数据版本")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
     
@@ -101,6 +105,9 @@ class QuizQuestion(models.Model):
     correct_answer = models.TextField(verbose_name="正确答案")
     explanation = models.TextField(blank=True, verbose_name="解析")
     difficulty = models.CharField(max_length=20, default='medium', verbose_name="难度")
+    # Rasch 难度(logit),由作答结果按 Elo 规则增量校准;为空时按 difficulty 取先验(见 core.item_bank)
+    calibrated_difficulty = models.FloatField(null=True, blank=True, verbose_name="校准难度")
+    calibration_answers = models.PositiveIntegerField(default=0, verbose_name="校准作答数")
     order = models.IntegerField(default=0, verbose_name="顺序")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
     
@@ -108,6 +115,9 @@ class QuizQuestion(models.Model):
         verbose_name = "题目"
         verbose_name_plural = "题目"
         ordering = ['outline', 'order']
+        indexes = [
+            models.Index(fields=['outline', 'order'], name='question_outline_order_idx'),
+        ]
     
     def __str__(self):
         return f"Q{self.order}: {self.question_text[:50]}"
@@ -138,27 +148,46 @@ class Attempt(models.Model):
     答题会话
     Student's quiz attempt session
     """
+    MODE_CHOICES = [
+        ('fixed', 'Fixed order'),
+        ('adaptive', 'Adaptive'),
+    ]
+    
+    # 外键单列索引由 Meta.indexes 中的复合索引前缀覆盖
     student = models.ForeignKey(
         Student,
         on_delete=models.CASCADE,
         related_name='attempts',
+        db_index=False,
         verbose_name="学生"
     )
     outline = models.ForeignKey(
         TeacherOutline,
         on_delete=models.CASCADE,
         related_name='attempts',
+        db_index=False,
         verbose_name="对应大纲"
     )
     started_at = models.DateTimeField(auto_now_add=True, verbose_name="开始时间")
     completed_at = models.DateTimeField(null=True, blank=True, verbose_name="完成时间")
     total_score = models.FloatField(default=0.0, verbose_name="总分")
     is_completed = models.BooleanField(default=False, verbose_name="是否完成")
+    # adaptive:按能力估计逐题选题(见 core.item_bank);fixed:按题目顺序作答
+    mode = models.CharField(max_length=20, choices=MODE_CHOICES, default='fixed', verbose_name="出题模式")
     
     class Meta:
         verbose_name = "答题会话"
         verbose_name_plural = "答题会话"
         ordering = ['-started_at']
+        indexes = [
+            # 班级聚合 / 导出: filter(outline, is_completed)
+            models.Index(fields=['outline', 'is_completed'], name='attempt_outline_done_idx'),
+            # 个体反馈: filter(student, outline, is_completed)
+            models.Index(
+                fields=['student', 'outline', 'is_completed'],
+                name='attempt_stu_outline_done_idx'
+            ),
+        ]
     
     def __str__(self):
         return f"{self.student.student_id} - {self.outline.title}"
@@ -173,6 +202,8 @@ class AttemptAnswer(models.Model):
         Attempt,
         on_delete=models.CASCADE,
         related_name='answers',
+        # 由 (attempt, question) 唯一约束的索引覆盖,不再单独建索引
+        db_index=False,
         verbose_name="所属会话"
     )
     question = models.ForeignKey(
@@ -185,11 +216,36 @@ class AttemptAnswer(models.Model):
     time_spent_sec = models.FloatField(default=0.0, verbose_name="用时(秒)")
     feedback = models.TextField(blank=True, verbose_name="反馈")
     answered_at = models.DateTimeField(auto_now_add=True, verbose_name="作答时间")
+    GRADING_STATUS_CHOICES = [
+        ('graded', 'Graded'),
+        ('pending', 'Pending'),
+    ]
+    # pending:简答题等待批量批改(见 core.grading),此时 is_correct 尚无意义
+    grading_status = models.CharField(
+        max_length=20,
+        choices=GRADING_STATUS_CHOICES,
+        default='graded',
+        verbose_name="批改状态"
+    )
     
     class Meta:
         verbose_name = "答题记录"
         verbose_name_plural = "答题记录"
         ordering = ['attempt', 'question__order']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['attempt', 'question'],
+                name='uniq_attempt_answer_question'
+            ),
+        ]
+        indexes = [
+            # 批量批改: filter(grading_status='pending', question__in=...),只索引待批改的行
+            models.Index(
+                fields=['question'],
+                condition=models.Q(grading_status='pending'),
+                name='answer_pending_grading_idx'
+            ),
+        ]
     
     def __str__(self):
         return f"{self.attempt.student.student_id} - Q{self.question.order}"
@@ -235,3 +291,111 @@ class PersonalizationDelta(models.Model):
     def __str__(self):
         status = "已发布" if self.is_published else "待审核"
         return f"{self.outline.title} - {status}"
+
+
+class IdempotencyRecord(models.Model):
+    """
+    幂等请求记录
+    Stored result of a request sent with an Idempotency-Key header
+    
+    response_status 为空表示首个请求仍在处理中,claimed_at 为其开始处理的时间
+    """
+    key = models.CharField(max_length=255, unique=True, verbose_name="幂等键")
+    fingerprint = models.CharField(max_length=64, verbose_name="请求指纹")
+    request_path = models.CharField(max_length=255, verbose_name="请求路径")
+    response_status = models.IntegerField(null=True, blank=True, verbose_name="响应状态码")
+    response_body = models.JSONField(
+        null=True,
+        blank=True,
+        encoder=DjangoJSONEncoder,
+        verbose_name="响应内容"
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
+    claimed_at = models.DateTimeField(default=timezone.now, verbose_name="占用时间")
+    expires_at = models.DateTimeField(db_index=True, verbose_name="过期时间")
+    
+    class Meta:
+        verbose_name = "幂等请求记录"
+        verbose_name_plural = "幂等请求记录"
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.key} - {self.request_path}"
+
+
+class OutlineEmbedding(models.Model):
+    """
+    大纲正文的嵌入向量
+    Embedding of TeacherOutline.content for near-duplicate lookup (core.outline_index)
+    
+    vector 为 float32 原始字节;正文修改后记录被删除,下次检索时重新生成
+    """
+    outline = models.OneToOneField(
+        TeacherOutline,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='embedding',
+        verbose_name="对应大纲"
+    )
+    model = models.CharField(max_length=100, verbose_name="嵌入模型")
+    dim = models.PositiveIntegerField(verbose_name="向量维度")
+    content_hash = models.CharField(max_length=64, verbose_name="正文摘要")
+    vector = models.BinaryField(verbose_name="向量")
+    updated_at = models.DateTimeField(auto_now=True, db_index=True, verbose_name="更新时间")
+    
+    class Meta:
+        verbose_name = "大纲嵌入向量"
+        verbose_name_plural = "大纲嵌入向量"
+    
+    def __str__(self):
+        return f"{self.outline_id} - {self.model}"
+
+
+class KnowledgeState(models.Model):
+    """
+    学生在大纲各知识点上的掌握度(贝叶斯知识追踪)
+    Per-student BKT state over UnifiedLessonPlan.sequence (core.knowledge)
+    
+    mastery 为 float32 数组(每个知识点一个 P(已掌握)),observations 为 uint32 作答次数,
+    均以原始字节保存;每条作答记录只更新其中一个元素,读取时不再扫描作答历史
+    """
+    student = models.ForeignKey(
+        Student,
+        on_delete=models.CASCADE,
+        related_name='knowledge_states',
+        verbose_name="学生"
+    )
+    outline = models.ForeignKey(
+        TeacherOutline,
+        on_delete=models.CASCADE,
+        related_name='knowledge_states',
+        verbose_name="所属大纲"
+    )
+    lesson_plan = models.ForeignKey(
+        UnifiedLessonPlan,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name="知识点来源计划"
+    )
+    mastery = models.BinaryField(verbose_name="掌握度")
+    observations = models.BinaryField(verbose_name="作答次数")
+    # Rasch 能力(logit),与 QuizQuestion.calibrated_difficulty 同一量纲
+    ability = models.FloatField(default=0.0, verbose_name="能力估计")
+    ability_answers = models.PositiveIntegerField(default=0, verbose_name="能力估计作答数")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
+    
+    class Meta:
+        verbose_name = "知识状态"
+        verbose_name_plural = "知识状态"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['student', 'outline'],
+                name='uniq_knowledge_state_student_outline'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.student_id} - {self.outline_id}"
+
@@ -1,17 +1,84 @@
 """
 OpenAI API 统一封装
 Unified OpenAI API wrapper with retry logic and logging
+
+openai SDK(及其 httpx 依赖)在首次调用 LLM 时才导入,全局客户端线程安全地懒加载:
+加载 URLconf、运行 manage.py 命令和纯数据库的接口(如批改选择题)都不会导入 SDK,
+也不要求配置 OPENAI_API_KEY。需要避免首个请求承担初始化开销时,调用 warm_up()。
+
+ModelRouter 按任务类型从 settings.LLM_ROUTES 选择模型,输出不合规时才升级到更强的模型。
 """
 import os
 import logging
+import threading
 import time
-from typing import Dict, List, Optional, Any
-from openai import OpenAI
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional
+
+if TYPE_CHECKING:
+    from openai import OpenAI
 
 # 配置日志(脱敏)
 logger = logging.getLogger(__name__)
 
 
+@dataclass
+class LLMCallStats:
+    """当前上下文(如一次 HTTP 请求)内的 LLM 调用统计"""
+    count: int = 0
+    total_ms: float = 0.0
+    total_tokens: int = 0
+    prompt_tokens: int = 0
+    # 服务商前缀缓存命中的 prompt token 数
+    cached_tokens: int = 0
+
+    def record(self, elapsed_ms: float, tokens: int = 0, prompt_tokens: int = 0, cached_tokens: int = 0) -> None:
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.total_tokens += tokens
+        self.prompt_tokens += prompt_tokens
+        self.cached_tokens += cached_tokens
+
+    @property
+    def cache_hit_rate(self) -> float:
+        return self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
+
+_llm_call_stats: ContextVar[Optional[LLMCallStats]] = ContextVar('llm_call_stats', default=None)
+
+
+@contextmanager
+def track_llm_calls() -> Iterator[LLMCallStats]:
+    """
+    在上下文内统计 OpenAIClient 的调用次数与耗时
+    
+    用法:
+        with track_llm_calls() as stats:
+            agent.generate_lesson_plan(outline)
+        print(stats.count, stats.total_ms)
+    """
+    stats = LLMCallStats()
+    token = _llm_call_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _llm_call_stats.reset(token)
+
+
+def _record_llm_call(started: float, tokens: int = 0, prompt_tokens: int = 0, cached_tokens: int = 0) -> None:
+    stats = _llm_call_stats.get()
+    if stats is not None:
+        stats.record((time.perf_counter() - started) * 1000, tokens, prompt_tokens, cached_tokens)
+
+
+def _cached_tokens(usage: Any) -> int:
+    """usage.prompt_tokens_details.cached_tokens(旧版 SDK / 其他服务商可能没有该字段)"""
+    details = getattr(usage, 'prompt_tokens_details', None)
+    return getattr(details, 'cached_tokens', None) or 0
+
+
 class OpenAIClient:
     """
     OpenAI 客户端封装
@@ -26,10 +93,21 @@ class OpenAIClient:
         if not self.api_key:
             raise ValueError("OPENAI_API_KEY not found in environment variables")
         
-        self.client = OpenAI(api_key=self.api_key)
+        self._sdk_client: Optional['OpenAI'] = None
+        self._sdk_lock = threading.Lock()
         self.max_retries = 1  # 规范要求:失败重试 1 次
         self.default_model = "gpt-4o-mini"  # 默认模型,可通过参数覆盖
     
+    @property
+    def client(self) -> 'OpenAI':
+        """openai SDK 客户端,首次使用时才导入 SDK 并创建"""
+        if self._sdk_client is None:
+            with self._sdk_lock:
+                if self._sdk_client is None:
+                    from openai import OpenAI
+                    self._sdk_client = OpenAI(api_key=self.api_key)
+        return self._sdk_client
+    
     def chat_completion(
         self,
         messages: List[Dict[str, str]],
@@ -52,6 +130,7 @@ class OpenAIClient:
             API 响应字典
         """
         model = model or self.default_model
+        started = time.perf_counter()
         
         for attempt in range(self.max_retries + 1):
             try:
@@ -67,18 +146,24 @@ class OpenAIClient:
                 )
                 
                 # 提取响应内容
+                usage = {
+                    'prompt_tokens': response.usage.prompt_tokens,
+                    'completion_tokens': response.usage.completion_tokens,
+                    'total_tokens': response.usage.total_tokens,
+                    'cached_tokens': _cached_tokens(response.usage)
+                }
                 result = {
                     'content': response.choices[0].message.content,
                     'model': response.model,
-                    'usage': {
-                        'prompt_tokens': response.usage.prompt_tokens,
-                        'completion_tokens': response.usage.completion_tokens,
-                        'total_tokens': response.usage.total_tokens
-                    },
+                    'usage': usage,
                     'finish_reason': response.choices[0].finish_reason
                 }
                 
-                logger.info(f"✅ API call successful. Tokens used: {result['usage']['total_tokens']}")
+                logger.info(
+                    f"✅ API call successful. Tokens used: {usage['total_tokens']} "
+                    f"(prompt {usage['prompt_tokens']}, cached {usage['cached_tokens']})"
+                )
+                _record_llm_call(started, usage['total_tokens'], usage['prompt_tokens'], usage['cached_tokens'])
                 return result
                 
             except Exception as e:
@@ -90,42 +175,290 @@ class OpenAIClient:
                     time.sleep(wait_time)
                 else:
                     logger.error("❌ Max retries reached. Giving up.")
+                    _record_llm_call(started)
                     raise
     
-    def create_embedding(self, text: str, model: str = "text-embedding-ada-002") -> List[float]:
+    def create_embedding(
+        self,
+        text: str,
+        model: str = "text-embedding-ada-002",
+        dimensions: Optional[int] = None
+    ) -> List[float]:
         """
         创建文本嵌入向量
         
         Args:
             text: 输入文本
             model: 嵌入模型
+            dimensions: 输出维度(仅 text-embedding-3 系列支持,截短后仍可用于余弦检索)
         
         Returns:
             嵌入向量
         """
+        started = time.perf_counter()
+        params = {'dimensions': dimensions} if dimensions else {}
         try:
             response = self.client.embeddings.create(
                 model=model,
-                input=text
+                input=text,
+                **params
             )
             return response.data[0].embedding
         except Exception as e:
             logger.error(f"❌ Embedding API error: {str(e)}")
             raise
+        finally:
+            _record_llm_call(started)
+    
+    def create_embeddings(
+        self,
+        texts: List[str],
+        model: str = "text-embedding-ada-002",
+        dimensions: Optional[int] = None
+    ) -> List[List[float]]:
+        """
+        一次请求为多段文本创建嵌入向量
+        
+        Returns:
+            与 texts 顺序一致的嵌入向量列表
+        """
+        if not texts:
+            return []
+        started = time.perf_counter()
+        params = {'dimensions': dimensions} if dimensions else {}
+        try:
+            response = self.client.embeddings.create(
+                model=model,
+                input=list(texts),
+                **params
+            )
+            return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+        except Exception as e:
+            logger.error(f"❌ Embedding API error: {str(e)}")
+            raise
+        finally:
+            _record_llm_call(started)
 
 
 # 全局客户端实例
 _client_instance = None
+_client_lock = threading.Lock()
 
 
 def get_openai_client() -> OpenAIClient:
-    """获取全局 OpenAI 客户端实例"""
+    """获取全局 OpenAI 客户端实例(线程安全的懒加载)"""
     global _client_instance
     if _client_instance is None:
-        _client_instance = OpenAIClient()
+        with _client_lock:
+            if _client_instance is None:
+                _client_instance = OpenAIClient()
     return _client_instance
 
 
+class SchemaValidationError(ValueError):
+    """模型输出不符合预期结构;content 为最后一次的原始输出"""
+
+    def __init__(self, message: str, content: str = ''):
+        super().__init__(message)
+        self.content = content
+
+
+@dataclass
+class RouteModelStats:
+    """某任务下单个模型的调用统计"""
+    attempts: int = 0
+    valid: int = 0
+    total_ms: float = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'attempts': self.attempts,
+            'valid': self.valid,
+            'success_rate': round(self.valid / self.attempts, 3) if self.attempts else None,
+            'avg_ms': round(self.total_ms / self.attempts, 1) if self.attempts else None,
+        }
+
+
+@dataclass
+class RouteStats:
+    """某任务的路由统计:请求数、升级次数、所有模型均失败的次数"""
+    requests: int = 0
+    escalations: int = 0
+    exhausted: int = 0
+    models: Dict[str, RouteModelStats] = field(default_factory=dict)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'requests': self.requests,
+            'escalations': self.escalations,
+            'exhausted': self.exhausted,
+            'models': {model: stats.as_dict() for model, stats in self.models.items()},
+        }
+
+
+@dataclass
+class RoutedCompletion:
+    """路由调用结果:最终使用的模型、原始响应与解析后的输出"""
+    task: str
+    model: str
+    response: Dict[str, Any]
+    parsed: Any
+    escalations: int = 0
+
+
+class ModelRouter:
+    """
+    按任务类型(plan / quiz / grading / report)选择模型
+    
+    先调用路由中成本最低的模型,输出未通过 validate 校验(抛出 SchemaValidationError)
+    或调用本身出错(超时、连接失败等)时才升级到下一个模型;所有模型都失败时
+    重新抛出最后一次的错误(SchemaValidationError 或传输异常)。
+    每个任务、每个模型的成功率与延迟记录在 stats() 中,用于按数据调整路由。
+    
+        routed = get_model_router().complete('plan', messages, validate=parse_plan)
+        routed.parsed, routed.model
+    """
+    
+    def __init__(self, routes: Optional[Dict[str, Dict[str, Any]]] = None):
+        self._routes = routes
+        self._stats: Dict[str, RouteStats] = {}
+        self._lock = threading.Lock()
+    
+    @property
+    def routes(self) -> Dict[str, Dict[str, Any]]:
+        if self._routes is not None:
+            return self._routes
+        from django.conf import settings
+        return settings.LLM_ROUTES
+    
+    def route(self, task: str) -> Dict[str, Any]:
+        try:
+            route = self.routes[task]
+        except KeyError:
+            raise ValueError(f"No LLM route configured for task '{task}'") from None
+        if not route.get('models'):
+            raise ValueError(f"LLM route '{task}' has no models")
+        return route
+    
+    def complete(
+        self,
+        task: str,
+        messages: List[Dict[str, str]],
+        validate: Callable[[str], Any],
+        client: Optional[OpenAIClient] = None,
+        **kwargs
+    ) -> RoutedCompletion:
+        route = self.route(task)
+        client = client or get_openai_client()
+        params = {key: route[key] for key in ('temperature', 'max_tokens') if key in route}
+        params.update(kwargs)
+        self._record(task, requests=1)
+        
+        error: Optional[Exception] = None
+        for index, model in enumerate(route['models']):
+            if index:
+                logger.warning(f"⤴️ Escalating '{task}' to {model}: {error}")
+                self._record(task, escalations=1)
+            started = time.perf_counter()
+            try:
+                response = client.chat_completion(messages=messages, model=model, **params)
+            except Exception as e:
+                # 传输错误同样记为该模型的一次失败尝试,再升级到下一个模型
+                self._record(task, model=model, started=started, valid=False)
+                error = e
+                continue
+            try:
+                parsed = validate(response['content'])
+            except SchemaValidationError as e:
+                self._record(task, model=model, started=started, valid=False)
+                error = e
+                error.content = response['content']
+                continue
+            self._record(task, model=model, started=started, valid=True)
+            return RoutedCompletion(task=task, model=model, response=response, parsed=parsed, escalations=index)
+        
+        self._record(task, exhausted=1)
+        logger.error(f"❌ No model in route '{task}' produced valid output")
+        raise error
+    
+    def _record(
+        self,
+        task: str,
+        model: Optional[str] = None,
+        started: Optional[float] = None,
+        valid: bool = False,
+        **counters: int
+    ) -> None:
+        with self._lock:
+            stats = self._stats.setdefault(task, RouteStats())
+            for name, value in counters.items():
+                setattr(stats, name, getattr(stats, name) + value)
+            if model is not None:
+                model_stats = stats.models.setdefault(model, RouteModelStats())
+                model_stats.attempts += 1
+                model_stats.valid += int(valid)
+                model_stats.total_ms += (time.perf_counter() - started) * 1000
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {task: stats.as_dict() for task, stats in self._stats.items()}
+    
+    def reset_stats(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+
+_router_instance: Optional[ModelRouter] = None
+
+
+def get_model_router() -> ModelRouter:
+    """获取全局模型路由(统计按进程累计)"""
+    global _router_instance
+    if _router_instance is None:
+        with _client_lock:
+            if _router_instance is None:
+                _router_instance = ModelRouter()
+    return _router_instance
+
+
+class LazyOpenAIClient:
+    """
+    智能体的 client 属性:每次访问时返回全局客户端,首次访问才创建
+    
+        class TutorAgent:
+            client = LazyOpenAIClient()
+    """
+    
+    def __get__(self, instance, owner) -> OpenAIClient:
+        if instance is None:
+            return self
+        return get_openai_client()
+
+
+def warm_up(background: bool = True) -> Optional[threading.Thread]:
+    """
+    预先导入 SDK 并创建客户端(不发起网络请求)
+    
+    用于 worker 启动后、接收请求前,避免首个 LLM 请求承担初始化开销。
+    未配置 OPENAI_API_KEY 时只记录警告。
+    """
+    def load():
+        started = time.perf_counter()
+        try:
+            get_openai_client().client
+        except Exception as e:
+            logger.warning(f"⚠️ OpenAI client warm-up skipped: {e}")
+            return
+        logger.info(f"🔥 OpenAI client warmed up in {(time.perf_counter() - started) * 1000:.0f} ms")
+    
+    if not background:
+        load()
+        return None
+    thread = threading.Thread(target=load, name='openai-warm-up', daemon=True)
+    thread.start()
+    return thread
+
+
 def test_openai_connection() -> Dict[str, Any]:
     """
     测试 OpenAI 连接
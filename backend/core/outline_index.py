@@ -0,0 +1,159 @@
+"""
+相似大纲检索与教学计划复用
+Near-duplicate outline lookup for lesson-plan reuse
+
+不同教师经常上传几乎相同的大纲。生成教学计划前,先按大纲正文的嵌入向量
+检索相似度不低于 OUTLINE_REUSE_MIN_SIMILARITY 且已有教学计划的大纲,
+由调用方选择克隆其计划而不是重新调用 Teacher Agent。
+
+- 嵌入向量存于 OutlineEmbedding(每个大纲一行)。检索时只为被检索的大纲生成向量
+  (至多 1 次嵌入调用);其他已有教学计划的大纲由 build_outline_index 命令
+  (定期运行)生成向量,之后才会出现在检索结果中
+- 进程内的 VectorIndex 懒加载全部向量,之后每次检索只增量读取新写入的行
+- 大纲正文修改时删除其向量(见 core.signals),下次检索重新生成
+- 复用率 = 克隆次数 / (克隆 + 生成),见 stats()
+"""
+import hashlib
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .models import OutlineEmbedding, TeacherOutline, UnifiedLessonPlan
+from .openai_utils import get_openai_client
+from .vector_index import VectorIndex
+
+logger = logging.getLogger(__name__)
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+@dataclass
+class ReuseCandidate:
+    """可复用的教学计划"""
+    outline_id: int
+    title: str
+    plan_id: int
+    score: float
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'outline_id': self.outline_id,
+            'title': self.title,
+            'plan_id': self.plan_id,
+            'score': round(self.score, 4),
+        }
+
+
+class OutlineIndex:
+    """大纲嵌入向量索引(进程内单例,见 get_outline_index)"""
+
+    def __init__(self):
+        self.model = settings.OUTLINE_EMBEDDING_MODEL
+        self.dim = settings.OUTLINE_EMBEDDING_DIM
+        self.index = VectorIndex(self.dim)
+        self._synced_at = None
+        self._lock = threading.Lock()
+        self._counters = {'generated': 0, 'cloned': 0}
+
+    def sync(self) -> int:
+        """读取上次同步后写入的向量(其他进程生成的也会被读到)"""
+        started = timezone.now()
+        rows = OutlineEmbedding.objects.filter(model=self.model, dim=self.dim)
+        if self._synced_at is not None:
+            rows = rows.filter(updated_at__gte=self._synced_at)
+        loaded = 0
+        for outline_id, vector in rows.values_list('outline_id', 'vector').iterator():
+            self.index.add(outline_id, np.frombuffer(vector, dtype=np.float32))
+            loaded += 1
+        self._synced_at = started
+        return loaded
+
+    def embed(self, outline: TeacherOutline) -> np.ndarray:
+        """大纲正文的嵌入向量:已有且未过期时读库,否则调用嵌入模型并保存"""
+        digest = content_hash(outline.content)
+        row = OutlineEmbedding.objects.filter(
+            outline=outline, model=self.model, dim=self.dim, content_hash=digest
+        ).values_list('vector', flat=True).first()
+        if row is not None:
+            vector = np.frombuffer(row, dtype=np.float32)
+        else:
+            text = outline.content[:settings.OUTLINE_EMBEDDING_MAX_CHARS]
+            vector = np.asarray(
+                get_openai_client().create_embedding(text, model=self.model, dimensions=self.dim),
+                dtype=np.float32
+            )
+            # 主键即大纲 ID:save() 先 UPDATE,不存在时再 INSERT
+            OutlineEmbedding(
+                outline=outline,
+                model=self.model,
+                dim=self.dim,
+                content_hash=digest,
+                vector=vector.tobytes()
+            ).save()
+        self.index.add(outline.id, vector)
+        return vector
+
+    def find_reusable(
+        self,
+        outline: TeacherOutline,
+        k: int = 3,
+        min_score: Optional[float] = None
+    ) -> List[ReuseCandidate]:
+        """与大纲最相似、且已有教学计划的其他大纲(按相似度降序)"""
+        min_score = settings.OUTLINE_REUSE_MIN_SIMILARITY if min_score is None else min_score
+        with self._lock:
+            self.sync()
+        vector = self.embed(outline)
+        # 多取一些,过滤掉没有教学计划或向量已被删除的大纲
+        matches = dict(self.index.search(vector, k=k * 4, exclude=[outline.id], min_score=min_score))
+        if not matches:
+            return []
+
+        plans = (
+            UnifiedLessonPlan.objects
+            .filter(outline_id__in=list(matches), outline__embedding__isnull=False)
+            .order_by('outline_id', '-created_at')
+            .values_list('outline_id', 'id', 'outline__title')
+        )
+        latest: Dict[int, ReuseCandidate] = {}
+        for outline_id, plan_id, title in plans:
+            if outline_id not in latest:
+                latest[outline_id] = ReuseCandidate(outline_id, title, plan_id, matches[outline_id])
+        return sorted(latest.values(), key=lambda candidate: -candidate.score)[:k]
+
+    def remove(self, outline_id: int) -> None:
+        self.index.remove(outline_id)
+
+    def record(self, cloned: bool) -> None:
+        """记录一次教学计划的产生方式(克隆或生成)"""
+        with self._lock:
+            self._counters['cloned' if cloned else 'generated'] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self._counters['cloned'] + self._counters['generated']
+            return dict(
+                self._counters,
+                indexed=len(self.index),
+                reuse_rate=round(self._counters['cloned'] / total, 3) if total else None
+            )
+
+
+_outline_index: Optional[OutlineIndex] = None
+_outline_index_lock = threading.Lock()
+
+
+def get_outline_index() -> OutlineIndex:
+    global _outline_index
+    if _outline_index is None:
+        with _outline_index_lock:
+            if _outline_index is None:
+                _outline_index = OutlineIndex()
+    return _outline_index
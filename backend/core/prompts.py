@@ -0,0 +1,78 @@
+"""
+提示词模板注册表
+Prompt templates with a byte-stable, provider-cacheable prefix
+
+OpenAI 等服务商对请求开头相同的前缀做缓存(prompt caching):前缀命中的部分
+按折扣计费且首 token 延迟更低。为此每个模板分为两部分:
+
+- prefix:系统指令 + 输出 JSON Schema,构造时生成一次,之后每次调用逐字节相同
+  (Schema 以 sort_keys 序列化,不含时间、ID 等变量)
+- user:只包含本次调用的变量内容(大纲标题、正文等),放在前缀之后
+
+智能体在模块加载时通过 register() 注册模板;同名模板注册不同前缀会报错,
+避免无意中改动前缀导致缓存失效。调用结果中的 usage['cached_tokens']
+记录服务商实际命中的 token 数(见 openai_utils.track_llm_calls)。
+"""
+import hashlib
+import json
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+
+@dataclass(frozen=True)
+class PromptTemplate:
+    """提示词模板:静态前缀(system)+ 变量部分(user)"""
+    name: str
+    instructions: str
+    user_template: str
+    schema: Optional[Dict[str, Any]] = None
+    prefix: str = field(init=False, repr=False)
+
+    def __post_init__(self):
+        prefix = self.instructions.strip()
+        if self.schema is not None:
+            schema = json.dumps(self.schema, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+            prefix = f"{prefix}\n\n输出须符合以下 JSON Schema:\n{schema}"
+        object.__setattr__(self, 'prefix', prefix)
+
+    @property
+    def prefix_digest(self) -> str:
+        """前缀摘要,用于日志中比对不同进程 / 版本的前缀是否一致"""
+        return hashlib.sha256(self.prefix.encode('utf-8')).hexdigest()[:12]
+
+    def render_user(self, **variables: Any) -> str:
+        return self.user_template.format(**variables)
+
+    def messages(self, **variables: Any) -> List[Dict[str, str]]:
+        """按 [静态前缀, 变量内容] 顺序组装 chat 消息"""
+        return [
+            {'role': 'system', 'content': self.prefix},
+            {'role': 'user', 'content': self.render_user(**variables)},
+        ]
+
+
+_registry: Dict[str, PromptTemplate] = {}
+_registry_lock = threading.Lock()
+
+
+def register(template: PromptTemplate) -> PromptTemplate:
+    """注册模板;同名模板重复注册时前缀必须一致"""
+    with _registry_lock:
+        existing = _registry.get(template.name)
+        if existing is not None and existing.prefix != template.prefix:
+            raise ValueError(f"Prompt template '{template.name}' already registered with a different prefix")
+        _registry[template.name] = template
+    return template
+
+
+def get_prompt(name: str) -> PromptTemplate:
+    try:
+        return _registry[name]
+    except KeyError:
+        raise KeyError(f"Unknown prompt template '{name}'") from None
+
+
+def registered_prompts() -> Dict[str, PromptTemplate]:
+    with _registry_lock:
+        return dict(_registry)
@@ -0,0 +1,88 @@
+"""
+各大纲已有题目的 MinHash/LSH 索引(出题去重用)
+Per-outline, process-wide LSH index of existing questions
+
+每个大纲首次出题时加载一次全部题目的签名,之后每次出题只增量读取 ID 大于
+已加载最大 ID 的新题目(其他进程写入的也会读到),候选题查重只查 LSH 哈希桶,
+与题库大小无关。本进程内修改、删除题目时由信号同步(见 core.signals);
+其他进程的修改与删除在 QUESTION_DEDUP_INDEX_TTL_SEC 后整体重新加载时生效。
+"""
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+from django.conf import settings
+
+from .minhash import LSHIndex, MinHasher
+from .models import QuizQuestion, TeacherOutline
+
+
+class OutlineQuestions:
+    """一个大纲已有题目的签名"""
+
+    def __init__(self, hasher: MinHasher, created_at: Optional[datetime]):
+        self.index = LSHIndex(hasher)
+        self.created_at = created_at
+        self.loaded_at = time.monotonic()
+        self.max_id = 0
+        self.lock = threading.Lock()
+
+
+class QuestionDedupIndex:
+    """各大纲题目签名的进程内缓存(见 get_dedup_index)"""
+
+    def __init__(self):
+        self.hasher = MinHasher()
+        self._outlines: Dict[int, OutlineQuestions] = {}
+        self._lock = threading.Lock()
+
+    def index(self, outline: TeacherOutline) -> LSHIndex:
+        """
+        大纲已有题目的 LSH 索引(只读使用;键为题目 ID)
+
+        大纲 ID 被复用(大纲删除后新建)时按 created_at 区分,不会沿用旧大纲的签名。
+        """
+        with self._lock:
+            entry = self._outlines.get(outline.id)
+            if (
+                entry is None
+                or entry.created_at != outline.created_at
+                or time.monotonic() - entry.loaded_at >= settings.QUESTION_DEDUP_INDEX_TTL_SEC
+            ):
+                entry = self._outlines[outline.id] = OutlineQuestions(self.hasher, outline.created_at)
+        with entry.lock:
+            rows = (
+                QuizQuestion.objects
+                .filter(outline_id=outline.id, id__gt=entry.max_id)
+                .order_by('id')
+                .values_list('id', 'question_text')
+            )
+            for question_id, text in rows:
+                entry.index.add(question_id, text)
+                entry.max_id = question_id
+        return entry.index
+
+    def update(self, outline_id: int, question_id: int, text: str) -> None:
+        """题目文本修改后替换签名(大纲未加载时忽略)"""
+        entry = self._outlines.get(outline_id)
+        if entry is not None and question_id <= entry.max_id:
+            entry.index.add(question_id, text)
+
+    def remove(self, outline_id: int, question_id: int) -> None:
+        entry = self._outlines.get(outline_id)
+        if entry is not None:
+            entry.index.remove(question_id)
+
+
+_dedup_index: Optional[QuestionDedupIndex] = None
+_dedup_index_lock = threading.Lock()
+
+
+def get_dedup_index() -> QuestionDedupIndex:
+    global _dedup_index
+    if _dedup_index is None:
+        with _dedup_index_lock:
+            if _dedup_index is None:
+                _dedup_index = QuestionDedupIndex()
+    return _dedup_index
@@ -0,0 +1,346 @@
+"""
+题库嵌入向量存储
+Append-only, memory-mapped embedding store for QuizQuestion
+
+目录 QUESTION_EMBEDDING_DIR 下三个文件:
+- vectors.f32: 行主序的 float32 单位向量,每行 dim 个值,只追加
+- ids.i64:     与向量逐行对应的题目 ID(int64);-1 表示该行已作废
+- meta.json:   嵌入模型与维度,与当前配置不一致时需重建
+
+读取通过 np.memmap 映射文件,多个 worker 进程共享操作系统页缓存,不各自加载一份;
+文件变长(其他进程追加)时重新映射即可看到新行。写入时先写向量再写 ID,
+行数以 ID 文件为准,读者不会看到写了一半的行。写入在进程间用文件锁串行化。
+
+题目修改后旧行作废并追加新行,删除题目只作废;rebuild_question_store 命令
+整体重建(写入临时文件后原子替换),同时回收作废的行。
+"""
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from .models import QuizQuestion
+from .openai_utils import get_openai_client
+from .vector_index import normalize
+
+try:
+    import fcntl
+except ImportError:  # Windows:只在进程内加锁
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+VECTORS_FILE = 'vectors.f32'
+IDS_FILE = 'ids.i64'
+META_FILE = 'meta.json'
+LOCK_FILE = '.lock'
+
+TOMBSTONE = -1
+
+
+def question_text(question: QuizQuestion) -> str:
+    """用于生成嵌入向量的题目文本"""
+    return question.question_text
+
+
+class QuestionEmbeddingStore:
+    """单个目录上的嵌入向量存储(见 get_question_store)"""
+
+    def __init__(self, directory: str, dim: int, model: str):
+        self.directory = directory
+        self.dim = dim
+        self.model = model
+        self._row_bytes = dim * np.dtype(np.float32).itemsize
+        self._vectors: np.ndarray = np.zeros((0, dim), dtype=np.float32)
+        self._ids: np.ndarray = np.zeros(0, dtype=np.int64)
+        self._mapped_size: Optional[Tuple[int, int]] = None
+        self._lock = threading.RLock()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    # ---------- 读取 ----------
+
+    def _refresh(self) -> None:
+        """文件大小变化(追加或重建)时重新映射"""
+        try:
+            ids_size = os.path.getsize(self._path(IDS_FILE))
+            vectors_size = os.path.getsize(self._path(VECTORS_FILE))
+        except FileNotFoundError:
+            ids_size = vectors_size = 0
+        if ids_size and self._mapped_size is None:
+            self._check_meta()
+        rows = min(ids_size // 8, vectors_size // self._row_bytes)
+        size = (rows, os.stat(self._path(IDS_FILE)).st_ino if rows else 0)
+        if size == self._mapped_size:
+            return
+        if rows:
+            self._vectors = np.memmap(self._path(VECTORS_FILE), dtype=np.float32, mode='r', shape=(rows, self.dim))
+            self._ids = np.memmap(self._path(IDS_FILE), dtype=np.int64, mode='r', shape=(rows,))
+        else:
+            self._vectors = np.zeros((0, self.dim), dtype=np.float32)
+            self._ids = np.zeros(0, dtype=np.int64)
+        self._mapped_size = size
+
+    def _check_meta(self) -> None:
+        with open(self._path(META_FILE), encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('dim') != self.dim or meta.get('model') != self.model:
+            raise ValueError(
+                f"Question embedding store at {self.directory} was built with "
+                f"{meta.get('model')}/{meta.get('dim')}; run rebuild_question_store"
+            )
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._refresh()
+            return int(np.count_nonzero(self._ids != TOMBSTONE))
+
+    def __contains__(self, question_id: int) -> bool:
+        return self.vector(question_id) is not None
+
+    def vector(self, question_id: int) -> Optional[np.ndarray]:
+        """题目最新的向量(副本);不存在时返回 None"""
+        with self._lock:
+            self._refresh()
+            rows = np.flatnonzero(self._ids == question_id)
+            return np.array(self._vectors[rows[-1]]) if rows.size else None
+
+    def search(
+        self,
+        vector: Sequence[float],
+        k: int = 5,
+        exclude: Iterable[int] = (),
+        min_score: Optional[float] = None
+    ) -> List[Tuple[int, float]]:
+        """余弦相似度最高的 k 道题 (question_id, score),按得分降序"""
+        query = normalize(vector)
+        with self._lock:
+            self._refresh()
+            ids = np.asarray(self._ids)
+            if not ids.size or k <= 0:
+                return []
+            scores = self._vectors @ query
+            invalid = ids == TOMBSTONE
+            exclude = list(exclude)
+            if exclude:
+                invalid |= np.isin(ids, exclude)
+            scores[invalid] = -np.inf
+            wanted = min(k, int(ids.size - np.count_nonzero(invalid)))
+            if wanted <= 0:
+                return []
+            top = np.argpartition(-scores, wanted - 1)[:wanted] if wanted < ids.size else np.arange(ids.size)
+            top = top[np.argsort(-scores[top], kind='stable')][:wanted]
+            results = [(int(ids[row]), float(scores[row])) for row in top]
+        if min_score is not None:
+            results = [(question_id, score) for question_id, score in results if score >= min_score]
+        return results
+
+    # ---------- 写入 ----------
+
+    @contextmanager
+    def _write_lock(self) -> Iterator[None]:
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock, open(self._path(LOCK_FILE), 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _write_meta(self, directory: str) -> None:
+        with open(os.path.join(directory, META_FILE), 'w', encoding='utf-8') as f:
+            json.dump({'model': self.model, 'dim': self.dim}, f)
+
+    def append(self, question_ids: Sequence[int], vectors: Sequence[Sequence[float]]) -> int:
+        """追加向量;同一题目已有的旧行先作废"""
+        if not len(question_ids):
+            return 0
+        matrix = np.vstack([normalize(vector) for vector in vectors]).astype(np.float32)
+        if matrix.shape != (len(question_ids), self.dim):
+            raise ValueError(f"Expected {len(question_ids)} vectors of dim {self.dim}, got {matrix.shape}")
+        with self._write_lock():
+            if not os.path.exists(self._path(META_FILE)):
+                self._write_meta(self.directory)
+            self._check_meta()
+            self._tombstone_locked(question_ids)
+            rows = os.path.getsize(self._path(IDS_FILE)) // 8 if os.path.exists(self._path(IDS_FILE)) else 0
+            with open(self._path(VECTORS_FILE), 'ab') as f:
+                # 截掉上次中断写入留下的半行,使向量与 ID 逐行对齐
+                f.truncate(rows * self._row_bytes)
+                f.write(matrix.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            with open(self._path(IDS_FILE), 'ab') as f:
+                f.write(np.asarray(question_ids, dtype=np.int64).tobytes())
+                f.flush()
+        return len(question_ids)
+
+    def remove(self, question_ids: Sequence[int]) -> int:
+        """作废题目对应的行"""
+        with self._write_lock():
+            return self._tombstone_locked(question_ids)
+
+    def _tombstone_locked(self, question_ids: Sequence[int]) -> int:
+        path = self._path(IDS_FILE)
+        if not question_ids or not os.path.exists(path) or not os.path.getsize(path):
+            return 0
+        ids = np.memmap(path, dtype=np.int64, mode='r+')
+        rows = np.flatnonzero(np.isin(ids, np.asarray(question_ids, dtype=np.int64)))
+        if rows.size:
+            ids[rows] = TOMBSTONE
+            ids.flush()
+        del ids
+        return int(rows.size)
+
+    def rebuild(self, items: Iterable[Tuple[int, Sequence[float]]], batch_size: int = 1000) -> int:
+        """用 (question_id, vector) 重建整个存储:写入临时文件后原子替换"""
+        os.makedirs(self.directory, exist_ok=True)
+        suffix = f'.tmp-{os.getpid()}'
+        total = 0
+        with self._write_lock():
+            with open(self._path(VECTORS_FILE + suffix), 'wb') as vectors_file, \
+                    open(self._path(IDS_FILE + suffix), 'wb') as ids_file:
+                batch_ids: List[int] = []
+                batch_vectors: List[np.ndarray] = []
+                for question_id, vector in items:
+                    batch_ids.append(question_id)
+                    batch_vectors.append(normalize(vector))
+                    if len(batch_ids) >= batch_size:
+                        total += self._write_batch(vectors_file, ids_file, batch_ids, batch_vectors)
+                        batch_ids, batch_vectors = [], []
+                total += self._write_batch(vectors_file, ids_file, batch_ids, batch_vectors)
+            self._write_meta(self.directory)
+            # 两次替换之间重新映射的读者可能短暂读到新旧不一致的行,ID 文件替换后即恢复
+            os.replace(self._path(VECTORS_FILE + suffix), self._path(VECTORS_FILE))
+            os.replace(self._path(IDS_FILE + suffix), self._path(IDS_FILE))
+        return total
+
+    def _write_batch(self, vectors_file, ids_file, batch_ids, batch_vectors) -> int:
+        if not batch_ids:
+            return 0
+        vectors_file.write(np.vstack(batch_vectors).astype(np.float32).tobytes())
+        ids_file.write(np.asarray(batch_ids, dtype=np.int64).tobytes())
+        return len(batch_ids)
+
+
+_stores: Dict[str, QuestionEmbeddingStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_question_store() -> QuestionEmbeddingStore:
+    """按当前配置获取存储(每个目录一个实例)"""
+    key = f"{settings.QUESTION_EMBEDDING_DIR}|{settings.QUESTION_EMBEDDING_MODEL}|{settings.QUESTION_EMBEDDING_DIM}"
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = QuestionEmbeddingStore(
+                settings.QUESTION_EMBEDDING_DIR,
+                settings.QUESTION_EMBEDDING_DIM,
+                settings.QUESTION_EMBEDDING_MODEL
+            )
+    return store
+
+
+# 单次嵌入请求最多包含的文本数
+EMBEDDING_BATCH_SIZE = 256
+
+
+def embed_text(text: str) -> np.ndarray:
+    return embed_texts([text])[0]
+
+
+def embed_texts(texts: Sequence[str]) -> List[np.ndarray]:
+    """按 EMBEDDING_BATCH_SIZE 分批,每批一次嵌入请求"""
+    client = get_openai_client()
+    vectors: List[np.ndarray] = []
+    for start in range(0, len(texts), EMBEDDING_BATCH_SIZE):
+        batch = client.create_embeddings(
+            list(texts[start:start + EMBEDDING_BATCH_SIZE]),
+            model=settings.QUESTION_EMBEDDING_MODEL,
+            dimensions=settings.QUESTION_EMBEDDING_DIM
+        )
+        vectors.extend(np.asarray(vector, dtype=np.float32) for vector in batch)
+    return vectors
+
+
+def index_questions(questions: Sequence[QuizQuestion]) -> int:
+    """
+    为题目生成向量并追加到存储
+
+    从题库复制的题目(带 _source_question_id,见 TutorAgent._reuse_questions)直接沿用
+    源题目的向量,其余题目合并为一次嵌入请求。
+    """
+    if not questions:
+        return 0
+    store = get_question_store()
+    vectors: Dict[int, np.ndarray] = {}
+    for question in questions:
+        source_id = getattr(question, '_source_question_id', None)
+        vector = store.vector(source_id) if source_id is not None else None
+        if vector is not None:
+            vectors[question.id] = vector
+    missing = [question for question in questions if question.id not in vectors]
+    for question, vector in zip(missing, embed_texts([question_text(question) for question in missing])):
+        vectors[question.id] = vector
+    return store.append([question.id for question in questions], [vectors[question.id] for question in questions])
+
+
+_index_executor: Optional[ThreadPoolExecutor] = None
+_index_executor_lock = threading.Lock()
+
+
+def _get_index_executor() -> ThreadPoolExecutor:
+    # 单个工作线程:嵌入请求不占用请求线程,追加写入按提交顺序进行
+    global _index_executor
+    if _index_executor is None:
+        with _index_executor_lock:
+            if _index_executor is None:
+                _index_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='question-index')
+    return _index_executor
+
+
+def index_on_commit(questions: Sequence[QuizQuestion]) -> None:
+    """
+    事务提交后在后台线程索引题目;bulk_create 不发送 post_save 信号,批量创建后需显式调用
+    """
+    if not settings.QUESTION_EMBEDDINGS_ENABLED or not questions:
+        return
+    questions = list(questions)
+
+    def index():
+        # 事务已提交:嵌入服务出错只记日志,不影响请求;缺失的向量由 rebuild_question_store 补齐
+        try:
+            index_questions(questions)
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to index {len(questions)} questions: {e}")
+
+    transaction.on_commit(lambda: _get_index_executor().submit(index))
+
+
+def wait_for_indexing(timeout: Optional[float] = None) -> None:
+    """等待已提交的后台索引任务完成(用于命令与测试)"""
+    _get_index_executor().submit(lambda: None).result(timeout)
+
+
+def similar_questions(
+    vector: Sequence[float],
+    k: int = 5,
+    exclude: Iterable[int] = (),
+    min_score: Optional[float] = None
+) -> List[Tuple[QuizQuestion, float]]:
+    """按向量检索相似题目,返回 (题目, 相似度);已删除的题目被跳过"""
+    matches = get_question_store().search(vector, k=k, exclude=exclude, min_score=min_score)
+    if not matches:
+        return []
+    questions = QuizQuestion.objects.in_bulk([question_id for question_id, _ in matches])
+    return [(questions[question_id], score) for question_id, score in matches if question_id in questions]
@@ -5,5 +5,6 @@ Services Package
 from .teacher import TeacherAgent
 from .tutor import TutorAgent
 from .classroom import ClassroomAgent
+from .pipeline import OnboardingPipeline, onboard_outline
 
-__all__ = ['TeacherAgent', 'TutorAgent', 'ClassroomAgent']
+__all__ = ['TeacherAgent', 'TutorAgent', 'ClassroomAgent', 'OnboardingPipeline', 'onboard_outline']
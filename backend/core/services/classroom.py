@@ -4,13 +4,18 @@ Classroom Agent Service
 """
 import logging
 from typing import Dict, List, Any, Optional
-from django.db.models import Avg, Count, Q
-from ..openai_utils import get_openai_client
+from django.conf import settings
+from django.db.models import Avg, Count, Q, Sum
+from .. import knowledge
+from ..openai_utils import LazyOpenAIClient, get_model_router
+from ..aggregates import cached_for_outline
+from ..archive import archived_terms, iter_archived_rows
 from ..models import (
     TeacherOutline, 
     UnifiedLessonPlan,
     PersonalizationDelta,
     Attempt,
+    AttemptAnswer,
     Student
 )
 
@@ -28,15 +33,17 @@ class ClassroomAgent:
     - 输出学生分组与个性化方案
     """
     
+    client = LazyOpenAIClient()
+    
     def __init__(self):
-        self.client = get_openai_client()
-        self.model = "gpt-4o-mini"
-        self.temperature = 0.7
+        # 调用 LLM 时按 settings.LLM_ROUTES['report'] 选择模型
+        self.router = get_model_router()
     
     def aggregate_class_data(
         self,
         outline: TeacherOutline,
-        lesson_plan: Optional[UnifiedLessonPlan] = None
+        lesson_plan: Optional[UnifiedLessonPlan] = None,
+        include_archived: bool = False
     ) -> PersonalizationDelta:
         """
         聚合班级数据,生成个性化方案
@@ -44,6 +51,7 @@ class ClassroomAgent:
         Args:
             outline: 教学大纲
             lesson_plan: 统一教学计划(基线)
+            include_archived: 是否同时读取冷存储中的归档会话
         
         Returns:
             个性化增量对象
@@ -54,17 +62,33 @@ class ClassroomAgent:
         completed_attempts = Attempt.objects.filter(
             outline=outline,
             is_completed=True
-        ).select_related('student').prefetch_related('answers')
+        )
+        
+        has_archive = include_archived and bool(archived_terms(outline.id))
         
-        if not completed_attempts.exists():
+        if not has_archive and not completed_attempts.exists():
             logger.warning("⚠️ No completed attempts found")
             return self._create_empty_delta(outline, lesson_plan)
         
-        # 计算班级统计
-        class_summary = self._calculate_class_summary(completed_attempts)
+        def compute_reports():
+            archived_rows = list(iter_archived_rows(outline.id)) if has_archive else []
+            class_summary = self._calculate_class_summary(completed_attempts, archived_rows)
+            student_reports = self._generate_student_reports(completed_attempts, archived_rows)
+            return class_summary, student_reports
         
-        # 生成学生个性化报告
-        student_reports = self._generate_student_reports(completed_attempts)
+        # 计算班级统计与学生个性化报告(按大纲聚合版本缓存,有新完成的会话时重新计算)
+        class_summary, student_reports = cached_for_outline(
+            outline, 'class_report', compute_reports,
+            'archived' if has_archive else 'hot'
+        )
+        
+        # 知识状态随每次作答更新,不随聚合版本变化:每次直接读取(2 次查询,不重放作答记录)
+        sequence, mastery = knowledge.class_mastery(outline.id)
+        class_summary = dict(class_summary, knowledge_points=self._summarize_mastery(sequence, mastery))
+        student_reports = [
+            dict(report, weak_points=knowledge.weak_points(mastery.get(report['student_id'], [])))
+            for report in student_reports
+        ]
         
         # 生成个性化增量方案
         plan_delta = self._generate_plan_delta(class_summary, lesson_plan)
@@ -108,21 +132,28 @@ class ClassroomAgent:
         logger.info(f"✅ Personalization plan published (ID: {personalization_id})")
         return personalization
     
-    def _calculate_class_summary(self, attempts) -> Dict[str, Any]:
-        """计算班级统计数据"""
-        total_students = attempts.values('student').distinct().count()
-        
-        # 计算平均正确率和用时
-        correct_answers = 0
-        total_answers = 0
-        total_time = 0.0
-        
-        for attempt in attempts:
-            for answer in attempt.answers.all():
-                total_answers += 1
-                if answer.is_correct:
-                    correct_answers += 1
-                total_time += answer.time_spent_sec
+    def _calculate_class_summary(self, attempts, archived_rows=()) -> Dict[str, Any]:
+        """计算班级统计数据(archived_rows 为冷存储中的归档作答行)"""
+        students = set(attempts.order_by().values_list('student__student_id', flat=True).distinct())
+        
+        # 计算平均正确率和用时(在数据库中聚合,不加载作答记录)
+        totals = AttemptAnswer.objects.filter(attempt__in=attempts).aggregate(
+            total=Count('id'),
+            correct=Count('id', filter=Q(is_correct=True)),
+            time=Sum('time_spent_sec')
+        )
+        correct_answers = totals['correct']
+        total_answers = totals['total']
+        total_time = totals['time'] or 0.0
+        
+        for row in archived_rows:
+            students.add(row['student_id'])
+            total_answers += 1
+            if row['is_correct']:
+                correct_answers += 1
+            total_time += row['time_spent_sec']
+        
+        total_students = len(students)
         
         accuracy_avg = correct_answers / total_answers if total_answers > 0 else 0.0
         time_avg_sec = total_time / total_answers if total_answers > 0 else 0.0
@@ -134,26 +165,66 @@ class ClassroomAgent:
             'total_answers': total_answers
         }
     
-    def _generate_student_reports(self, attempts) -> List[Dict[str, Any]]:
-        """生成学生个性化报告"""
+    def _generate_student_reports(self, attempts, archived_rows=()) -> List[Dict[str, Any]]:
+        """生成学生个性化报告(归档会话排在热数据之后)"""
         reports = []
         
-        for attempt in attempts:
-            student = attempt.student
-            correct_count = attempt.answers.filter(is_correct=True).count()
-            total_count = attempt.answers.count()
+        # 每个会话的答对数 / 作答数在一条查询中统计
+        rows = attempts.annotate(
+            correct_count=Count('answers', filter=Q(answers__is_correct=True)),
+            total_count=Count('answers')
+        ).values_list('student__student_id', 'student__name', 'correct_count', 'total_count')
+        
+        for student_id, name, correct_count, total_count in rows:
             accuracy = correct_count / total_count if total_count > 0 else 0.0
             
             # TODO: 在里程碑 6 使用 LLM 生成更详细的报告
             reports.append({
-                'student_id': student.student_id,
-                'name': student.name,
+                'student_id': student_id,
+                'name': name,
+                'accuracy': round(accuracy, 2),
+                'status': self._classify_student(accuracy)
+            })
+        
+        archived_attempts: Dict[int, Dict[str, Any]] = {}
+        for row in archived_rows:
+            entry = archived_attempts.setdefault(row['attempt_id'], {
+                'student_id': row['student_id'],
+                'name': row['student_name'],
+                'correct': 0,
+                'total': 0
+            })
+            entry['total'] += 1
+            entry['correct'] += 1 if row['is_correct'] else 0
+        
+        for entry in archived_attempts.values():
+            accuracy = entry['correct'] / entry['total']
+            reports.append({
+                'student_id': entry['student_id'],
+                'name': entry['name'],
                 'accuracy': round(accuracy, 2),
                 'status': self._classify_student(accuracy)
             })
         
         return reports
     
+    def _summarize_mastery(
+        self,
+        sequence: List[str],
+        mastery: Dict[str, List[Dict[str, Any]]]
+    ) -> List[Dict[str, Any]]:
+        """各知识点的全班平均掌握度与薄弱学生数(只统计作答过该知识点的学生)"""
+        summary = []
+        for i, point in enumerate(sequence):
+            values = [report[i]['mastery'] for report in mastery.values() if report[i]['answered']]
+            summary.append({
+                'point': point,
+                'mastery_avg': round(sum(values) / len(values), 3) if values else None,
+                'students': len(values),
+                'weak_students': sum(1 for value in values if value < settings.KNOWLEDGE_MASTERY_THRESHOLD)
+            })
+        return summary
+    
     def _generate_plan_delta(
         self,
         class_summary: Dict[str, Any],
@@ -185,6 +256,15 @@ class ClassroomAgent:
                 'minutes': 5
             })
         
+        # 全班掌握度偏低的知识点安排复习
+        for point in class_summary.get('knowledge_points', []):
+            if point['mastery_avg'] is not None and point['mastery_avg'] < settings.KNOWLEDGE_MASTERY_THRESHOLD:
+                delta['additional_activities'].append({
+                    'action': '复习知识点',
+                    'point': point['point'],
+                    'mastery_avg': point['mastery_avg']
+                })
+        
         return delta
     
     def _classify_student(self, accuracy: float) -> str:
@@ -0,0 +1,151 @@
+"""
+长大纲切分与分块计划合并
+Token estimation, section-aware chunking and partial-plan merging
+
+大纲超出 OUTLINE_CHUNK_TOKENS 时,Teacher Agent 按章节把正文切成若干块,
+各块并发生成计划片段(map),再在本地合并为一份统一教学计划(reduce),
+总耗时取决于最慢的一块而不是块数。
+
+token 数按字符粗略估算(中日韩字符约 1 token,其余约 4 字符 1 token),
+只用于决定是否切分与每块大小,不要求精确。
+"""
+import math
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List
+
+# 中日韩文字与全角标点
+_CJK_RE = re.compile(r'[　-〿㐀-䶿一-鿿豈-﫿＀-￯]')
+
+# 章节标题:Markdown 标题、"第一章 / 第3节 / 第二单元"、"一、"、"1." / "1、"
+_HEADING_RE = re.compile(
+    r'^\s*(?:#{1,6}\s+\S'
+    r'|第[一二三四五六七八九十百零\d]+[章节部分课单元讲]'
+    r'|[一二三四五六七八九十]+[、.．]'
+    r'|\d+(?:[、．]|\.\s))'
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """估算文本的 token 数"""
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+@dataclass
+class OutlineChunk:
+    """切分后的一块大纲正文"""
+    index: int
+    title: str
+    text: str
+    tokens: int
+
+
+def split_sections(content: str) -> List[str]:
+    """按章节标题切分正文;标题行归属其后的内容"""
+    sections: List[List[str]] = [[]]
+    for line in content.splitlines():
+        if _HEADING_RE.match(line) and any(part.strip() for part in sections[-1]):
+            sections.append([])
+        sections[-1].append(line)
+    return ['\n'.join(lines).strip() for lines in sections if any(line.strip() for line in lines)]
+
+
+def _split_oversized(text: str, max_tokens: int) -> List[str]:
+    """超长章节依次按段落、行、字符切开,使每段不超过 max_tokens"""
+    for separator in (r'\n\s*\n', r'\n'):
+        parts = [part.strip() for part in re.split(separator, text) if part.strip()]
+        if len(parts) > 1:
+            pieces: List[str] = []
+            for part in parts:
+                pieces.extend(_split_oversized(part, max_tokens) if estimate_tokens(part) > max_tokens else [part])
+            return pieces
+    # 单行仍超长:按字符硬切(中文约 1 字符 1 token,取保守值)
+    return [text[start:start + max_tokens] for start in range(0, len(text), max_tokens)]
+
+
+def split_outline(content: str, max_tokens: int) -> List[OutlineChunk]:
+    """
+    把大纲正文切成不超过 max_tokens 的块
+
+    尽量在章节边界处切分,相邻的短章节合并到同一块;正文不超过预算时返回单块。
+    """
+    if estimate_tokens(content) <= max_tokens:
+        return [OutlineChunk(index=0, title=_title_of(content), text=content, tokens=estimate_tokens(content))]
+
+    pieces: List[str] = []
+    for section in split_sections(content):
+        if estimate_tokens(section) > max_tokens:
+            pieces.extend(_split_oversized(section, max_tokens))
+        else:
+            pieces.append(section)
+
+    chunks: List[OutlineChunk] = []
+    current: List[str] = []
+    current_tokens = 0
+    for piece in pieces:
+        tokens = estimate_tokens(piece)
+        # 块之间以空行连接,按 1 token 计
+        if current and current_tokens + tokens + 1 > max_tokens:
+            chunks.append(_make_chunk(len(chunks), current))
+            current, current_tokens = [], 0
+        current.append(piece)
+        current_tokens += tokens + (1 if current_tokens else 0)
+    if current:
+        chunks.append(_make_chunk(len(chunks), current))
+    return chunks
+
+
+def _make_chunk(index: int, pieces: List[str]) -> OutlineChunk:
+    text = '\n\n'.join(pieces)
+    return OutlineChunk(index=index, title=_title_of(text), text=text, tokens=estimate_tokens(text))
+
+
+def _title_of(text: str) -> str:
+    first_line = next((line.strip() for line in text.splitlines() if line.strip()), '')
+    return first_line.lstrip('#').strip()[:50]
+
+
+def allocate_minutes(chunks: List[OutlineChunk], duration_min: int) -> List[int]:
+    """按各块的 token 占比分配课时(每块至少 1 分钟)"""
+    total = sum(chunk.tokens for chunk in chunks) or 1
+    return [max(1, round(duration_min * chunk.tokens / total)) for chunk in chunks]
+
+
+def _unique(items: Iterable[Any]) -> List[Any]:
+    seen, result = set(), []
+    for item in items:
+        key = item if isinstance(item, str) else repr(item)
+        if key not in seen:
+            seen.add(key)
+            result.append(item)
+    return result
+
+
+def merge_partial_plans(partials: List[Dict[str, Any]], duration_min: int) -> Dict[str, Any]:
+    """
+    按块的顺序合并计划片段
+
+    教学目标与知识点序列去重保序;活动重新编号(A1, A2, ...),
+    总时长超过课时时按比例缩放;检查点依次拼接。
+    """
+    activities = []
+    for partial in partials:
+        for activity in partial.get('activities', []):
+            activity = dict(activity) if isinstance(activity, dict) else {'title': str(activity)}
+            activity['id'] = f"A{len(activities) + 1}"
+            activities.append(activity)
+
+    minutes = [activity.get('minutes') for activity in activities]
+    total = sum(m for m in minutes if isinstance(m, (int, float)))
+    if duration_min and total > duration_min:
+        for activity in activities:
+            if isinstance(activity.get('minutes'), (int, float)):
+                activity['minutes'] = max(1, math.floor(activity['minutes'] * duration_min / total))
+
+    return {
+        'objectives': _unique(item for partial in partials for item in partial.get('objectives', [])),
+        'sequence': _unique(item for partial in partials for item in partial.get('sequence', [])),
+        'activities': activities,
+        'checks': [check for partial in partials for check in partial.get('checks', [])],
+    }
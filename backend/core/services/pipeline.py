@@ -0,0 +1,230 @@
+"""
+大纲上线流水线
+Concurrent multi-agent pipeline for outline onboarding
+
+把多个智能体步骤组织为一个小型 DAG 并发执行:
+
+    plan (Teacher Agent) ──┐
+                           ├──> align (题目关联教学目标)
+    quiz (Tutor Agent) ────┘
+
+plan 与 quiz 并行,总耗时约为 max(plan, quiz) 而不是两者之和;
+教学目标可用后,align 步骤把题目按目标分组写入教学计划的检查点。
+大纲已有教学计划时,quiz 直接以现有目标为条件出题。
+传入已保存的教学计划(如上次运行中 plan 成功、后续步骤失败后重试)时,
+plan 步骤直接复用该计划,不会重复生成。
+"""
+import contextvars
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.db import connections
+
+from ..models import QuizQuestion, TeacherOutline, UnifiedLessonPlan
+from .teacher import TeacherAgent
+from .tutor import TutorAgent
+
+logger = logging.getLogger(__name__)
+
+OK = 'ok'
+FAILED = 'failed'
+SKIPPED = 'skipped'
+
+
+@dataclass
+class Step:
+    """DAG 中的一个步骤:run 接收已完成步骤的结果 {name: value}"""
+    name: str
+    run: Callable[[Dict[str, Any]], Any]
+    after: Tuple[str, ...] = ()
+
+
+@dataclass
+class StepResult:
+    name: str
+    status: str
+    started_ms: float = 0.0
+    duration_ms: float = 0.0
+    value: Any = None
+    error: Optional[str] = None
+    exception: Optional[Exception] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        data = {
+            'status': self.status,
+            'started_ms': round(self.started_ms, 1),
+            'duration_ms': round(self.duration_ms, 1),
+        }
+        if self.error is not None:
+            data['error'] = self.error
+        return data
+
+
+def run_steps(steps: Sequence[Step], max_workers: int = 4) -> Dict[str, StepResult]:
+    """
+    按依赖关系执行步骤,依赖满足的步骤并发运行
+
+    某步骤失败时,依赖它的步骤标记为 skipped,其余步骤照常执行。
+    max_workers <= 1 时在当前线程按拓扑顺序依次执行。
+    """
+    started = time.perf_counter()
+    pending = {step.name: step for step in steps}
+    results: Dict[str, StepResult] = {}
+
+    def values() -> Dict[str, Any]:
+        return {name: result.value for name, result in results.items() if result.status == OK}
+
+    def execute(step: Step, inputs: Dict[str, Any], in_worker: bool) -> StepResult:
+        step_started = time.perf_counter()
+        result = StepResult(name=step.name, status=OK, started_ms=(step_started - started) * 1000)
+        try:
+            result.value = step.run(inputs)
+        except Exception as e:
+            logger.error(f"❌ Pipeline step '{step.name}' failed: {e}")
+            result.status, result.error, result.exception = FAILED, str(e), e
+        finally:
+            result.duration_ms = (time.perf_counter() - step_started) * 1000
+            if in_worker:
+                # 数据库连接是线程私有的,工作线程结束步骤时关闭
+                connections.close_all()
+        return result
+
+    def ready_steps() -> List[Step]:
+        ready = []
+        for step in list(pending.values()):
+            if any(results.get(dep) is not None and results[dep].status != OK for dep in step.after):
+                results[step.name] = StepResult(name=step.name, status=SKIPPED)
+                del pending[step.name]
+            elif all(dep in results for dep in step.after):
+                ready.append(step)
+        return ready
+
+    if max_workers <= 1:
+        while pending:
+            ready = ready_steps()
+            if not ready and pending:
+                raise ValueError(f"Unsatisfiable step dependencies: {sorted(pending)}")
+            for step in ready:
+                del pending[step.name]
+                results[step.name] = execute(step, values(), in_worker=False)
+        return results
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='pipeline') as executor:
+        running = {}
+        while pending or running:
+            for step in ready_steps():
+                del pending[step.name]
+                # 复制上下文,使请求级的 LLM / 查询统计包含工作线程中的调用
+                context = contextvars.copy_context()
+                future = executor.submit(context.run, execute, step, values(), True)
+                running[future] = step.name
+            if not running:
+                if pending:
+                    raise ValueError(f"Unsatisfiable step dependencies: {sorted(pending)}")
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[running.pop(future)] = future.result()
+    return results
+
+
+@dataclass
+class OnboardingResult:
+    """大纲上线结果"""
+    outline: TeacherOutline
+    steps: Dict[str, StepResult]
+    total_ms: float
+    lesson_plan: Optional[UnifiedLessonPlan] = None
+    questions: List[QuizQuestion] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return all(step.status == OK for step in self.steps.values())
+
+    @property
+    def partial(self) -> bool:
+        """部分步骤失败,但已有步骤的结果写入数据库"""
+        return not self.ok and any(step.status == OK for step in self.steps.values())
+
+    def timings(self) -> Dict[str, Any]:
+        return {
+            'total_ms': round(self.total_ms, 1),
+            # 各步骤顺序执行时的耗时,用于对比并发收益
+            'sequential_ms': round(sum(step.duration_ms for step in self.steps.values()), 1),
+            'steps': {name: step.as_dict() for name, step in self.steps.items()},
+        }
+
+
+class OnboardingPipeline:
+    """
+    大纲上线流水线:生成统一教学计划与题目,并把题目关联到教学目标
+
+    用法:
+        result = OnboardingPipeline().run(outline, num_questions=5)
+        result.lesson_plan, result.questions, result.timings()
+    """
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers if max_workers is not None else settings.PIPELINE_MAX_WORKERS
+        self.teacher = TeacherAgent()
+        self.tutor = TutorAgent()
+
+    def run(
+        self,
+        outline: TeacherOutline,
+        num_questions: int = 5,
+        difficulty: Optional[str] = None,
+        lesson_plan: Optional[UnifiedLessonPlan] = None
+    ) -> OnboardingResult:
+        """
+        Args:
+            lesson_plan: 复用的已有教学计划(为空时生成新计划)
+        """
+        logger.info(f"🚀 Onboarding outline '{outline.title}'")
+        started = time.perf_counter()
+
+        existing_plan = lesson_plan or outline.lesson_plans.order_by('-created_at').first()
+        objectives = existing_plan.objectives if existing_plan is not None else None
+
+        if lesson_plan is not None:
+            plan = Step('plan', lambda done: lesson_plan)
+        else:
+            plan = Step('plan', lambda done: self.teacher.generate_lesson_plan(outline))
+        steps = [
+            plan,
+            Step('quiz', lambda done: self.tutor.generate_quiz(
+                outline, num_questions=num_questions, difficulty=difficulty, objectives=objectives
+            )),
+            Step('align', lambda done: self.tutor.link_objectives(done['plan'], done['quiz']), after=('plan', 'quiz')),
+        ]
+        results = run_steps(steps, self.max_workers)
+
+        result = OnboardingResult(
+            outline=outline,
+            steps=results,
+            total_ms=(time.perf_counter() - started) * 1000,
+            lesson_plan=results['plan'].value,
+            questions=results['quiz'].value or []
+        )
+        timings = result.timings()
+        logger.info(
+            f"✅ Onboarding finished in {timings['total_ms']} ms "
+            f"(sequential {timings['sequential_ms']} ms)"
+        )
+        return result
+
+
+def onboard_outline(
+    outline: TeacherOutline,
+    num_questions: int = 5,
+    difficulty: Optional[str] = None,
+    lesson_plan: Optional[UnifiedLessonPlan] = None
+) -> OnboardingResult:
+    """为大纲并发生成教学计划与题目"""
+    return OnboardingPipeline().run(
+        outline, num_questions=num_questions, difficulty=difficulty, lesson_plan=lesson_plan
+    )
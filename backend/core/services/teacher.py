@@ -2,13 +2,79 @@
 Teacher Agent Service
 负责生成统一教学计划(Unified Lesson Plan)
 """
+import json
 import logging
+import re
 from typing import Dict, List, Any, Optional
-from ..openai_utils import get_openai_client
+
+from django.conf import settings
+
+from ..admission import AdmissionRejected, fan_out_slot
+from ..openai_utils import LazyOpenAIClient, SchemaValidationError, get_model_router
 from ..models import TeacherOutline, UnifiedLessonPlan
+from ..prompts import PromptTemplate, register
+from .outline_chunks import OutlineChunk, allocate_minutes, merge_partial_plans, split_outline
 
 logger = logging.getLogger(__name__)
 
+# 系统指令与输出 Schema 构成静态前缀,大纲内容放在其后,以便命中服务商的前缀缓存
+LESSON_PLAN_PROMPT = register(PromptTemplate(
+    name='teacher.lesson_plan',
+    instructions="""你是一位资深教学设计专家,擅长根据教学大纲制定结构化的教学计划。
+
+你的任务是分析教学大纲,生成包含以下内容的统一教学计划:
+1. objectives: 教学目标列表(3-5个明确目标)
+2. sequence: 知识点序列(按教学顺序)
+3. activities: 教学活动列表(包含活动ID、标题、时长)
+4. checks: 检查点列表(用于评估学习进度)
+
+请以 JSON 格式输出,确保结构清晰、逻辑连贯。""",
+    schema={
+        'type': 'object',
+        'required': ['objectives', 'sequence', 'activities', 'checks'],
+        'properties': {
+            'objectives': {'type': 'array', 'items': {'type': 'string'}},
+            'sequence': {'type': 'array', 'items': {'type': 'string'}},
+            'activities': {
+                'type': 'array',
+                'items': {
+                    'type': 'object',
+                    'required': ['id', 'title', 'minutes'],
+                    'properties': {
+                        'id': {'type': 'string'},
+                        'title': {'type': 'string'},
+                        'minutes': {'type': 'integer'},
+                    },
+                },
+            },
+            'checks': {'type': 'array', 'items': {'type': 'object'}},
+        },
+    },
+    user_template="""教学大纲信息:
+- 标题: {title}
+- 难度: {difficulty}
+- 课时长度: {duration_min} 分钟
+- 大纲内容:
+{content}
+
+请为此大纲生成统一教学计划(JSON 格式)。"""
+))
+
+# 长大纲分块时每块使用的模板:前缀与整篇模板相同,分块请求同样命中前缀缓存
+SECTION_PLAN_PROMPT = register(PromptTemplate(
+    name='teacher.lesson_plan_section',
+    instructions=LESSON_PLAN_PROMPT.instructions,
+    schema=LESSON_PLAN_PROMPT.schema,
+    user_template="""教学大纲信息(第 {part}/{parts} 部分):
+- 标题: {title}
+- 难度: {difficulty}
+- 本部分课时: 约 {minutes} 分钟
+- 本部分内容:
+{content}
+
+请只为这一部分生成教学计划片段(JSON 格式),其余部分会单独生成后合并。"""
+))
+
 
 class TeacherAgent:
     """
@@ -22,10 +88,11 @@ class TeacherAgent:
     - 设置检查点(checks)
     """
     
+    client = LazyOpenAIClient()
+    
     def __init__(self):
-        self.client = get_openai_client()
-        self.model = "gpt-4o-mini"
-        self.temperature = 0.7
+        # 模型与温度按任务类型从 settings.LLM_ROUTES['plan'] 选择
+        self.router = get_model_router()
     
     def generate_lesson_plan(
         self, 
@@ -42,29 +109,46 @@ class TeacherAgent:
         Returns:
             生成的教学计划对象
         """
+        lesson_plan = self.draft_lesson_plan(outline, version)
+        lesson_plan.save()
+        
+        logger.info(f"✅ Lesson plan created successfully (ID: {lesson_plan.id})")
+        return lesson_plan
+    
+    def clone_lesson_plan(
+        self,
+        source: UnifiedLessonPlan,
+        outline: TeacherOutline
+    ) -> UnifiedLessonPlan:
+        """把相似大纲已有的教学计划复制到本大纲(不调用 LLM)"""
+        lesson_plan = UnifiedLessonPlan.objects.create(
+            outline=outline,
+            version=source.version,
+            objectives=source.objectives,
+            sequence=source.sequence,
+            activities=source.activities,
+            checks=source.checks
+        )
+        logger.info(f"📋 Cloned lesson plan {source.id} -> outline {outline.id} (ID: {lesson_plan.id})")
+        return lesson_plan
+    
+    def draft_lesson_plan(
+        self,
+        outline: TeacherOutline,
+        version: str = "v1.0"
+    ) -> UnifiedLessonPlan:
+        """调用 LLM 生成教学计划但不保存(供预生成使用,被认领时再写入)"""
         logger.info(f"🎓 Teacher Agent: Generating lesson plan for '{outline.title}'")
         
-        # 构建 Prompt
-        system_prompt = self._build_system_prompt()
-        user_prompt = self._build_user_prompt(outline)
+        chunks = split_outline(outline.content, settings.OUTLINE_CHUNK_TOKENS)
         
         try:
-            # 调用 OpenAI API
-            response = self.client.chat_completion(
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                model=self.model,
-                temperature=self.temperature,
-                max_tokens=2000
-            )
-            
-            # 解析响应并保存(TODO: 在里程碑 6 实现完整逻辑)
-            plan_data = self._parse_response(response['content'])
+            if len(chunks) > 1:
+                plan_data = self._map_reduce_plan(outline, chunks)
+            else:
+                plan_data = self._complete_plan(self._build_user_prompt(outline))
             
-            # 创建教学计划对象
-            lesson_plan = UnifiedLessonPlan.objects.create(
+            return UnifiedLessonPlan(
                 outline=outline,
                 version=version,
                 objectives=plan_data.get('objectives', []),
@@ -73,35 +157,106 @@ class TeacherAgent:
                 checks=plan_data.get('checks', [])
             )
             
-            logger.info(f"✅ Lesson plan created successfully (ID: {lesson_plan.id})")
-            return lesson_plan
-            
         except Exception as e:
             logger.error(f"❌ Failed to generate lesson plan: {str(e)}")
             raise
     
+    def _complete_plan(self, user_prompt: str) -> Dict[str, Any]:
+        """调用 OpenAI API:先用低成本模型,输出不符合 Schema 时升级"""
+        try:
+            routed = self.router.complete(
+                'plan',
+                messages=[
+                    {"role": "system", "content": self._build_system_prompt()},
+                    {"role": "user", "content": user_prompt}
+                ],
+                validate=self._validate_plan,
+                client=self.client
+            )
+            return routed.parsed
+        except SchemaValidationError as e:
+            # 所有模型都未给出合规输出时沿用兜底结构
+            return self._parse_response(e.content)
+    
+    def _map_reduce_plan(self, outline: TeacherOutline, chunks: List[OutlineChunk]) -> Dict[str, Any]:
+        """
+        长大纲:各块并发生成计划片段,再按顺序合并
+        
+        每块的 LLM 调用各占一个准入槽位;某块未获准入时抛出 AdmissionRejected(接口返回 429)。
+        """
+        from .pipeline import OK, Step, run_steps  # pipeline 依赖本模块,延迟导入
+        
+        logger.info(f"✂️ Outline '{outline.title}' split into {len(chunks)} chunks")
+        minutes = allocate_minutes(chunks, outline.duration_min)
+        steps = [
+            Step(
+                f"chunk-{chunk.index}",
+                lambda done, chunk=chunk, chunk_minutes=chunk_minutes: self._complete_section(
+                    self._build_section_prompt(outline, chunk, len(chunks), chunk_minutes)
+                )
+            )
+            for chunk, chunk_minutes in zip(chunks, minutes)
+        ]
+        results = run_steps(steps, settings.OUTLINE_CHUNK_MAX_WORKERS)
+        
+        failed = [result for result in results.values() if result.status != OK]
+        for result in failed:
+            if isinstance(result.exception, AdmissionRejected):
+                raise result.exception
+        if failed:
+            raise RuntimeError(f"Failed to plan outline section '{failed[0].name}': {failed[0].error}")
+        return merge_partial_plans([results[step.name].value for step in steps], outline.duration_min)
+    
+    def _complete_section(self, user_prompt: str) -> Dict[str, Any]:
+        """在准入槽位内生成一块大纲的计划片段"""
+        with fan_out_slot(timeout=settings.LLM_QUEUE_TIMEOUT_SEC):
+            return self._complete_plan(user_prompt)
+    
     def _build_system_prompt(self) -> str:
-        """构建系统提示词"""
-        return """你是一位资深教学设计专家,擅长根据教学大纲制定结构化的教学计划。
-
-你的任务是分析教学大纲,生成包含以下内容的统一教学计划:
-1. objectives: 教学目标列表(3-5个明确目标)
-2. sequence: 知识点序列(按教学顺序)
-3. activities: 教学活动列表(包含活动ID、标题、时长)
-4. checks: 检查点列表(用于评估学习进度)
-
-请以 JSON 格式输出,确保结构清晰、逻辑连贯。"""
+        """构建系统提示词(静态前缀,跨调用逐字节相同)"""
+        return LESSON_PLAN_PROMPT.prefix
     
     def _build_user_prompt(self, outline: TeacherOutline) -> str:
-        """构建用户提示词"""
-        return f"""教学大纲信息:
-- 标题: {outline.title}
-- 难度: {outline.difficulty}
-- 课时长度: {outline.duration_min} 分钟
-- 大纲内容:
-{outline.content}
-
-请为此大纲生成统一教学计划(JSON 格式)。"""
+        """构建用户提示词(只包含大纲变量)"""
+        return LESSON_PLAN_PROMPT.render_user(
+            title=outline.title,
+            difficulty=outline.difficulty,
+            duration_min=outline.duration_min,
+            content=outline.content
+        )
+    
+    def _build_section_prompt(
+        self,
+        outline: TeacherOutline,
+        chunk: OutlineChunk,
+        parts: int,
+        minutes: int
+    ) -> str:
+        """构建分块提示词(与整篇大纲共用同一静态前缀)"""
+        return SECTION_PLAN_PROMPT.render_user(
+            title=outline.title,
+            difficulty=outline.difficulty,
+            part=chunk.index + 1,
+            parts=parts,
+            minutes=minutes,
+            content=chunk.text
+        )
+    
+    def _validate_plan(self, response_text: str) -> Dict[str, Any]:
+        """严格解析教学计划:JSON 无效或缺少必需字段时抛出 SchemaValidationError"""
+        cleaned = re.sub(r'```json\s*|\s*```', '', response_text or '')
+        try:
+            data = json.loads(cleaned.strip())
+        except json.JSONDecodeError as e:
+            raise SchemaValidationError(f"Invalid JSON: {e}", response_text) from e
+        if not isinstance(data, dict):
+            raise SchemaValidationError("Lesson plan must be a JSON object", response_text)
+        missing = [key for key in LESSON_PLAN_PROMPT.schema['required'] if not isinstance(data.get(key), list)]
+        if missing:
+            raise SchemaValidationError(f"Missing or invalid fields: {missing}", response_text)
+        if not data['objectives']:
+            raise SchemaValidationError("Lesson plan has no objectives", response_text)
+        return data
     
     def _parse_response(self, response_text: str) -> Dict[str, Any]:
         """
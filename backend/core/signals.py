@@ -0,0 +1,136 @@
+"""
+Core Signal Receivers
+"""
+import logging
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+logger = logging.getLogger(__name__)
+
+
+def configure_sqlite_connection(sender, connection, **kwargs):
+    """
+    connection_created 信号处理:为 SQLite 连接启用 WAL 与并发写入相关的 pragma
+
+    WAL 模式下读不阻塞写;synchronous=NORMAL 在 WAL 下仍保证崩溃一致性,
+    busy_timeout 让短暂的写锁竞争排队等待而不是立即报 "database is locked"。
+    """
+    if connection.vendor != 'sqlite' or not settings.SQLITE_TUNE_CONNECTIONS:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute(f'PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}')
+        cursor.execute('PRAGMA temp_store=MEMORY')
+        cursor.execute('PRAGMA cache_size=-20000')  # 约 20MB 页缓存
+
+
+def invalidate_outline_embedding(sender, instance, created, raw=False, **kwargs):
+    """TeacherOutline post_save:正文修改后删除过期的嵌入向量,避免按旧正文匹配"""
+    if created or raw:
+        return
+    from .models import OutlineEmbedding
+    from .outline_index import content_hash, get_outline_index
+
+    stale = OutlineEmbedding.objects.filter(outline=instance).exclude(content_hash=content_hash(instance.content))
+    if stale.delete()[0]:
+        get_outline_index().remove(instance.pk)
+
+
+def remove_outline_embedding(sender, instance, **kwargs):
+    """TeacherOutline post_delete:从进程内索引移除(数据库中的向量随大纲级联删除)"""
+    from .outline_index import get_outline_index
+
+    get_outline_index().remove(instance.pk)
+
+
+def record_answer_knowledge(sender, instance, created, raw=False, using=None, **kwargs):
+    """
+    AttemptAnswer post_save:新作答记录更新学生对应知识点的掌握度(见 core.knowledge)
+
+    在写入作答记录的事务内、作答记录所在的数据库中执行;
+    写后缓冲的 bulk_create 不发送信号,由缓冲自行调用。
+    待批改的简答题在批量批改写回时再计入(见 core.grading)。
+    """
+    if not created or raw or not settings.KNOWLEDGE_TRACING_ENABLED:
+        return
+    if instance.grading_status == 'pending':
+        return
+    from .knowledge import AnswerObservation, record_answers
+
+    record_answers([AnswerObservation(
+        student_id=instance.attempt.student_id,
+        outline_id=instance.attempt.outline_id,
+        question_order=instance.question.order,
+        is_correct=instance.is_correct,
+        question_id=instance.question_id
+    )], using=using or DEFAULT_DB_ALIAS)
+
+
+def invalidate_item_index(sender, instance, raw=False, **kwargs):
+    """QuizQuestion post_save / post_delete:题目增删后重新加载该大纲的自适应选题索引"""
+    if raw:
+        return
+    from .item_bank import get_item_index
+
+    get_item_index().invalidate(instance.outline_id)
+
+
+def update_dedup_index(sender, instance, created, raw=False, **kwargs):
+    """QuizQuestion post_save:题目修改后替换出题去重索引中的签名(新题目在下次出题时增量读取)"""
+    if created or raw:
+        return
+    from .question_dedup import get_dedup_index
+
+    get_dedup_index().update(instance.outline_id, instance.pk, instance.question_text)
+
+
+def remove_dedup_index(sender, instance, **kwargs):
+    """QuizQuestion post_delete:从出题去重索引移除"""
+    from .question_dedup import get_dedup_index
+
+    get_dedup_index().remove(instance.outline_id, instance.pk)
+
+
+def index_question_embedding(sender, instance, raw=False, **kwargs):
+    """
+    QuizQuestion post_save:开启 QUESTION_EMBEDDINGS_ENABLED 时,事务提交后写入(或替换)题目向量
+
+    bulk_create 不发送信号,批量生成题目的调用方自行调用 question_store.index_on_commit。
+    """
+    if raw or not settings.QUESTION_EMBEDDINGS_ENABLED:
+        return
+    from .question_store import index_on_commit
+
+    index_on_commit([instance])
+
+
+def remove_question_embedding(sender, instance, **kwargs):
+    """QuizQuestion post_delete:作废题目向量"""
+    if not settings.QUESTION_EMBEDDINGS_ENABLED:
+        return
+    from .question_store import get_question_store
+
+    question_id = instance.pk
+    transaction.on_commit(lambda: get_question_store().remove([question_id]))
+
+
+def schedule_speculative_generation(sender, instance, created, raw=False, **kwargs):
+    """
+    TeacherOutline post_save:开启 SPECULATIVE_GENERATION 时,事务提交后启动预生成
+
+    新建大纲启动新任务;编辑大纲时丢弃内容已过期的草稿并重新生成。
+    """
+    if raw or not settings.SPECULATIVE_GENERATION:
+        return
+    from . import speculative
+
+    transaction.on_commit(lambda: speculative.schedule(instance, only_if_pending=not created))
+
+
+def cancel_speculative_generation(sender, instance, **kwargs):
+    """TeacherOutline post_delete:取消并丢弃该大纲的预生成任务"""
+    from . import speculative
+
+    speculative.cancel(instance.pk)
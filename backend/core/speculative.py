@@ -0,0 +1,239 @@
+"""
+大纲预生成(推测执行)
+Speculative lesson-plan / quiz generation on outline creation
+
+开启 SPECULATIVE_GENERATION 后,大纲保存(事务提交)即在后台线程中
+调用 Teacher / Tutor Agent 生成草稿(不写库)。之后的显式生成请求先尝试认领:
+
+- 草稿已完成:直接保存并返回,不再调用 LLM
+- 仍在生成:等待最多 SPECULATIVE_ATTACH_TIMEOUT_SEC 秒后附着到该结果
+- 已被认领 / 生成失败 / 等待超时:返回 None,调用方照常生成
+
+大纲内容(标题、正文、课时、难度)在使用前被修改或删除时,任务被取消,
+已生成的草稿丢弃。每份草稿只能认领一次;超过 SPECULATIVE_TTL_SEC 未认领的任务被清理。
+任务登记在进程内,多 worker 部署时只有创建大纲的 worker 能认领。
+"""
+import hashlib
+import logging
+import threading
+import time
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor, TimeoutError
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from django.conf import settings
+from django.db import connections
+
+from . import question_store
+from .admission import BULK, get_scheduler
+from .item_bank import get_item_index
+from .models import QuizQuestion, TeacherOutline, UnifiedLessonPlan
+
+logger = logging.getLogger(__name__)
+
+# 预生成任务在准入调度器中使用的用户标识(低优先级,与交互请求公平排队)
+SCHEDULER_USER = 'speculative'
+
+PLAN = 'plan'
+QUIZ = 'quiz'
+
+
+def fingerprint(outline: TeacherOutline) -> str:
+    """影响生成结果的大纲字段摘要"""
+    raw = '\x1f'.join([outline.title, outline.content, str(outline.duration_min), outline.difficulty])
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+@dataclass
+class SpeculativeJob:
+    outline_id: int
+    fingerprint: str
+    num_questions: int
+    difficulty: str
+    futures: Dict[str, Future] = field(default_factory=dict)
+    claimed: set = field(default_factory=set)
+    cancelled: threading.Event = field(default_factory=threading.Event)
+    created_at: float = field(default_factory=time.monotonic)
+
+    def cancel(self) -> None:
+        self.cancelled.set()
+        for future in self.futures.values():
+            future.cancel()
+
+
+_jobs: Dict[int, SpeculativeJob] = {}
+_lock = threading.Lock()
+_executor: Optional[ThreadPoolExecutor] = None
+_counters = {'scheduled': 0, 'claimed': 0, 'discarded': 0}
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.SPECULATIVE_MAX_WORKERS,
+                    thread_name_prefix='speculative'
+                )
+    return _executor
+
+
+def _run(job: SpeculativeJob, draft: Callable[[], object]):
+    """工作线程:生成草稿;任务已取消时不调用或丢弃结果"""
+    if job.cancelled.is_set():
+        return None
+    try:
+        if settings.LLM_ADMISSION_ENABLED:
+            with get_scheduler().slot(SCHEDULER_USER, BULK, timeout=settings.LLM_QUEUE_TIMEOUT_SEC):
+                result = draft()
+        else:
+            result = draft()
+    except Exception as e:
+        logger.warning(f"⚠️ Speculative generation for outline {job.outline_id} failed: {e}")
+        raise
+    finally:
+        # 数据库连接是线程私有的
+        connections.close_all()
+    if job.cancelled.is_set():
+        return None
+    return result
+
+
+def _purge_expired() -> None:
+    """清理超时未认领的任务(调用方持有 _lock)"""
+    deadline = time.monotonic() - settings.SPECULATIVE_TTL_SEC
+    for outline_id in [oid for oid, job in _jobs.items() if job.created_at < deadline]:
+        _jobs.pop(outline_id).cancel()
+        _counters['discarded'] += 1
+
+
+def schedule(outline: TeacherOutline, only_if_pending: bool = False) -> Optional[SpeculativeJob]:
+    """
+    为大纲启动预生成
+
+    大纲内容未变化时沿用已有任务;内容变化时取消旧任务并重新生成。
+    only_if_pending=True 时(大纲被编辑)只替换尚未被完全认领的任务,不新建。
+    """
+    from .services.teacher import TeacherAgent
+    from .services.tutor import TutorAgent
+
+    current = fingerprint(outline)
+    executor = _get_executor()
+    teacher, tutor = TeacherAgent(), TutorAgent()
+    with _lock:
+        _purge_expired()
+        existing = _jobs.get(outline.id)
+        if existing is not None:
+            if existing.fingerprint == current:
+                return existing
+            _jobs.pop(outline.id).cancel()
+            _counters['discarded'] += 1
+            logger.info(f"🗑️ Outline {outline.id} changed, discarding speculative drafts")
+        elif only_if_pending:
+            return None
+
+        job = SpeculativeJob(
+            outline_id=outline.id,
+            fingerprint=current,
+            num_questions=settings.SPECULATIVE_NUM_QUESTIONS,
+            difficulty=outline.difficulty
+        )
+        job.futures[PLAN] = executor.submit(_run, job, lambda: teacher.draft_lesson_plan(outline))
+        job.futures[QUIZ] = executor.submit(
+            _run, job, lambda: tutor.draft_quiz(outline, num_questions=job.num_questions)
+        )
+        _jobs[outline.id] = job
+        _counters['scheduled'] += 1
+
+    logger.info(f"🔮 Speculative generation scheduled for outline {outline.id}")
+    return job
+
+
+def cancel(outline_id: int) -> bool:
+    """取消并丢弃某大纲的预生成任务"""
+    with _lock:
+        job = _jobs.pop(outline_id, None)
+        if job is None:
+            return False
+        _counters['discarded'] += 1
+    job.cancel()
+    return True
+
+
+def _claim(outline: TeacherOutline, kind: str, matches: Callable[[SpeculativeJob], bool] = lambda job: True):
+    """认领草稿:内容一致且未被认领时等待结果;否则返回 None"""
+    with _lock:
+        _purge_expired()
+        job = _jobs.get(outline.id)
+        if job is None or kind in job.claimed or kind not in job.futures:
+            return None
+        if job.fingerprint != fingerprint(outline):
+            # 绕过 save() 的修改(如 queryset.update)不会触发信号,在这里兜底
+            _jobs.pop(outline.id).cancel()
+            _counters['discarded'] += 1
+            return None
+        if not matches(job):
+            return None
+        job.claimed.add(kind)
+        if job.claimed >= set(job.futures):
+            del _jobs[outline.id]
+        future = job.futures[kind]
+
+    try:
+        draft = future.result(timeout=settings.SPECULATIVE_ATTACH_TIMEOUT_SEC)
+    except TimeoutError:
+        logger.warning(f"⏱️ Speculative {kind} for outline {outline.id} not ready, generating inline")
+        return None
+    except (CancelledError, Exception):
+        return None
+    if draft is not None and not job.cancelled.is_set():
+        with _lock:
+            _counters['claimed'] += 1
+    else:
+        draft = None
+    return draft
+
+
+def claim_lesson_plan(outline: TeacherOutline) -> Optional[UnifiedLessonPlan]:
+    """认领预生成的教学计划并保存;不可用时返回 None"""
+    lesson_plan = _claim(outline, PLAN)
+    if lesson_plan is None:
+        return None
+    lesson_plan.outline = outline
+    lesson_plan.save()
+    logger.info(f"♻️ Reused speculative lesson plan for outline {outline.id} (ID: {lesson_plan.id})")
+    return lesson_plan
+
+
+def claim_quiz(
+    outline: TeacherOutline,
+    num_questions: int,
+    difficulty: Optional[str] = None
+) -> Optional[List[QuizQuestion]]:
+    """
+    认领预生成的题目(题量与难度须一致)并保存;不可用时返回 None
+
+    草稿生成时大纲题库可能已变化:保存前与出题一样查重,可能返回较少的题目或空列表。
+    """
+    from .services.tutor import TutorAgent
+
+    questions = _claim(
+        outline, QUIZ,
+        lambda job: job.num_questions == num_questions and (difficulty or outline.difficulty) == job.difficulty
+    )
+    if questions is None:
+        return None
+    for question in questions:
+        question.outline = outline
+    questions = TutorAgent().prepare_questions(outline, questions, num_questions, difficulty)
+    questions = QuizQuestion.objects.bulk_create(questions)
+    question_store.index_on_commit(questions)
+    get_item_index().invalidate(outline.id)
+    logger.info(f"♻️ Reused {len(questions)} speculative questions for outline {outline.id}")
+    return questions
+
+
+def stats() -> Dict[str, int]:
+    with _lock:
+        return dict(_counters, pending=len(_jobs))
@@ -9,6 +9,7 @@ app_name = 'core'
 urlpatterns = [
     # 健康检查
     path('health/', views.health_check, name='health_check'),
+    path('llm/routes/', views.llm_route_stats, name='llm_route_stats'),
     
     # 教学大纲
     path('outline/', views.create_outline, name='create_outline'),
@@ -17,18 +18,30 @@ urlpatterns = [
     
     # Teacher Agent
     path('teacher_agent/plan/<int:outline_id>/', views.generate_lesson_plan, name='generate_lesson_plan'),
+    path('teacher_agent/plan/<int:outline_id>/similar/', views.similar_lesson_plans, name='similar_lesson_plans'),
+    
+    # 大纲上线流水线(Teacher + Tutor 并发)
+    path('pipeline/onboard/<int:outline_id>/', views.onboard_outline, name='onboard_outline'),
     
     # Tutor Agent
     path('tutor/quiz/<int:outline_id>/', views.generate_quiz, name='generate_quiz'),
+    path('tutor/question/<int:question_id>/similar/', views.similar_questions, name='similar_questions'),
     path('submit_answer/', views.submit_answer, name='submit_answer'),
     path('feedback/<int:outline_id>/<str:student_id>/', views.get_feedback, name='get_feedback'),
     
     # Classroom Agent
     path('classroom/aggregate/<int:outline_id>/', views.aggregate_class_data, name='aggregate_class_data'),
+    path('classroom/live/<int:outline_id>/', views.classroom_live, name='classroom_live'),
     path('classroom/publish/<int:outline_id>/', views.publish_plan, name='publish_plan'),
     
     # 学生相关
     path('student/', views.create_student, name='create_student'),
     path('attempt/', views.create_attempt, name='create_attempt'),
+    path('attempt/<int:attempt_id>/complete/', views.complete_attempt_view, name='complete_attempt'),
+    path('attempt/<int:attempt_id>/next_question/', views.next_question, name='next_question'),
+    
+    # 数据导出
+    path('export/outline/<int:outline_id>/<str:fmt>/', views.export_outline_answers, name='export_outline_answers'),
+    path('export/class/<str:class_name>/<str:fmt>/', views.export_class_answers, name='export_class_answers'),
 ]
 
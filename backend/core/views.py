@@ -1,10 +1,19 @@
 """
 Core API Views
 """
+import logging
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import IntegrityError, transaction
+from django.http import HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+from django.utils.http import content_disposition_header
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
-from .models import TeacherOutline, QuizQuestion, Student, Attempt, AttemptAnswer
+from .models import (
+    TeacherOutline, QuizQuestion, Student, Attempt, AttemptAnswer, UnifiedLessonPlan, KnowledgeState
+)
 from .serializers import (
     TeacherOutlineSerializer,
     QuizQuestionSerializer,
@@ -12,7 +21,19 @@ from .serializers import (
     AttemptSerializer,
     AttemptAnswerSerializer
 )
-from .services import TeacherAgent, TutorAgent, ClassroomAgent
+from .services import TeacherAgent, TutorAgent, ClassroomAgent, OnboardingPipeline
+from . import exports, fast_serializers, item_bank, question_store, speculative
+from .idempotency import idempotent
+from .admission import AdmissionRejected, admission_controlled
+from .write_behind import PendingAnswer, flush_pending_answers, get_answer_buffer, write_behind_enabled
+from .aggregates import cached_for_outline, complete_attempt
+from .grading import schedule_grading
+from .live import live_hub, stream_outline_stats
+from .db_router import analytics_db, analytics_reads
+from .openai_utils import get_model_router
+from .outline_index import get_outline_index
+
+logger = logging.getLogger(__name__)
 
 
 @api_view(['GET'])
@@ -28,6 +49,19 @@ def health_check(request):
     }, status=status.HTTP_200_OK)
 
 
+@api_view(['GET'])
+def llm_route_stats(request):
+    """
+    模型路由统计(本进程):各任务、各模型的调用次数、成功率与平均延迟
+    GET /api/llm/routes/
+    """
+    router = get_model_router()
+    return Response({
+        'routes': {task: route['models'] for task, route in router.routes.items()},
+        'stats': router.stats()
+    })
+
+
 # ============ 教学大纲相关 ============
 
 @api_view(['POST'])
@@ -49,16 +83,14 @@ def get_outline(request, outline_id):
     获取教学大纲及相关题目
     GET /api/outline/{outline_id}/
     """
-    try:
-        outline = TeacherOutline.objects.get(id=outline_id)
-        questions = QuizQuestion.objects.filter(outline=outline)
-        
-        return Response({
-            'outline': TeacherOutlineSerializer(outline).data,
-            'questions': QuizQuestionSerializer(questions, many=True).data
-        })
-    except TeacherOutline.DoesNotExist:
+    outline = fast_serializers.outline_detail(outline_id)
+    if outline is None:
         return Response({'error': 'Outline not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    return Response({
+        'outline': outline,
+        'questions': fast_serializers.question_rows(outline_id)
+    })
 
 
 @api_view(['GET'])
@@ -67,66 +99,250 @@ def list_outlines(request):
     获取所有教学大纲列表
     GET /api/outlines/
     """
-    outlines = TeacherOutline.objects.all()
-    serializer = TeacherOutlineSerializer(outlines, many=True)
-    return Response(serializer.data)
+    return Response(fast_serializers.outline_rows())
 
 
 # ============ Teacher Agent 相关 ============
 
 @api_view(['POST'])
+@idempotent
+@admission_controlled
 def generate_lesson_plan(request, outline_id):
     """
     生成统一教学计划 (Teacher Agent)
     POST /api/teacher_agent/plan/{outline_id}/
+    
+    Body(可选):
+        {"clone_from": 12}  复制指定的教学计划(来自 similar 接口的 plan_id)
+        {"reuse": true}     有足够相似的大纲时直接克隆其计划,否则(包括检索出错时)照常生成
     """
     try:
         outline = TeacherOutline.objects.get(id=outline_id)
-        agent = TeacherAgent()
+        index = get_outline_index()
         
-        # 调用 Teacher Agent 生成计划
-        lesson_plan = agent.generate_lesson_plan(outline)
+        source = None
+        if request.data.get('clone_from') is not None:
+            try:
+                clone_from = int(request.data['clone_from'])
+            except (TypeError, ValueError):
+                return Response({'error': 'clone_from must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+            source = UnifiedLessonPlan.objects.filter(id=clone_from).first()
+            if source is None:
+                return Response({'error': 'Lesson plan to clone not found'}, status=status.HTTP_404_NOT_FOUND)
+        elif request.data.get('reuse'):
+            try:
+                candidates = index.find_reusable(outline, k=1)
+            except Exception as e:
+                logger.warning(f"⚠️ Similar outline lookup failed for outline {outline.id}, generating: {e}")
+                candidates = []
+            if candidates:
+                source = UnifiedLessonPlan.objects.filter(id=candidates[0].plan_id).first()
+        
+        reused = False
+        if source is not None:
+            lesson_plan = TeacherAgent().clone_lesson_plan(source, outline)
+        else:
+            # 优先认领大纲保存时预生成的计划,不可用时调用 Teacher Agent 生成
+            lesson_plan = speculative.claim_lesson_plan(outline)
+            reused = lesson_plan is not None
+            if lesson_plan is None:
+                lesson_plan = TeacherAgent().generate_lesson_plan(outline)
+        index.record(cloned=source is not None)
         
         return Response({
             'message': 'Lesson plan generated successfully',
             'plan_id': lesson_plan.id,
-            'version': lesson_plan.version
+            'version': lesson_plan.version,
+            'speculative': reused,
+            'cloned_from': source.id if source is not None else None
         }, status=status.HTTP_201_CREATED)
     except TeacherOutline.DoesNotExist:
         return Response({'error': 'Outline not found'}, status=status.HTTP_404_NOT_FOUND)
+    except AdmissionRejected:
+        # 分块调用未获准入,由 admission_controlled 返回 429
+        raise
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@api_view(['GET'])
+def similar_lesson_plans(request, outline_id):
+    """
+    查找可复用的教学计划:正文相似的其他大纲已生成的计划
+    GET /api/teacher_agent/plan/{outline_id}/similar/?k=3
+    
+    返回的 plan_id 可作为生成接口的 clone_from
+    """
+    try:
+        outline = TeacherOutline.objects.get(id=outline_id)
+    except TeacherOutline.DoesNotExist:
+        return Response({'error': 'Outline not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    index = get_outline_index()
+    try:
+        k = min(max(int(request.query_params.get('k', 3)), 1), 20)
+    except ValueError:
+        return Response({'error': 'k must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        candidates = index.find_reusable(outline, k=k)
+    except Exception as e:
+        logger.error(f"❌ Similar outline lookup failed for outline {outline.id}: {e}")
+        return Response({'error': 'Similar outline lookup unavailable'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    return Response({
+        'candidates': [candidate.as_dict() for candidate in candidates],
+        'min_similarity': settings.OUTLINE_REUSE_MIN_SIMILARITY,
+        'stats': index.stats()
+    })
+
+
+@api_view(['POST'])
+@idempotent
+@admission_controlled
+def onboard_outline(request, outline_id):
+    """
+    大纲上线:并发生成统一教学计划与题目,并把题目关联到教学目标
+    POST /api/pipeline/onboard/{outline_id}/
+    
+    Body(可选): {"num_questions": 5, "difficulty": "medium", "plan_id": 12}
+    
+    部分步骤失败时返回 207,timings.steps 中为各步骤状态;已生成的教学计划已保存,
+    重试时传入返回的 plan_id 复用该计划,不会重复生成。全部步骤失败时返回 500。
+    """
+    try:
+        outline = TeacherOutline.objects.get(id=outline_id)
+    except TeacherOutline.DoesNotExist:
+        return Response({'error': 'Outline not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    lesson_plan = None
+    plan_id = request.data.get('plan_id')
+    if plan_id is not None:
+        try:
+            plan_id = int(plan_id)
+        except (TypeError, ValueError):
+            return Response({'error': 'plan_id must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        lesson_plan = outline.lesson_plans.filter(id=plan_id).first()
+        if lesson_plan is None:
+            return Response({'error': 'Lesson plan not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    result = OnboardingPipeline().run(
+        outline,
+        num_questions=request.data.get('num_questions', 5),
+        difficulty=request.data.get('difficulty'),
+        lesson_plan=lesson_plan
+    )
+    
+    data = {
+        'plan_id': result.lesson_plan.id if result.lesson_plan else None,
+        'version': result.lesson_plan.version if result.lesson_plan else None,
+        'questions': QuizQuestionSerializer(result.questions, many=True).data,
+        'timings': result.timings()
+    }
+    if result.partial:
+        data['error'] = 'Onboarding pipeline partially failed'
+        return Response(data, status=status.HTTP_207_MULTI_STATUS)
+    if not result.ok:
+        data['error'] = 'Onboarding pipeline failed'
+        return Response(data, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    return Response(data, status=status.HTTP_201_CREATED)
+
+
 # ============ Tutor Agent 相关 ============
 
 @api_view(['POST'])
+@idempotent
+@admission_controlled
 def generate_quiz(request, outline_id):
     """
     生成题目 (Tutor Agent)
     POST /api/tutor/quiz/{outline_id}/
+    
+    新题目都与大纲已有题目重复时返回 409;只生成了部分题目时返回 201 并附带 warning。
     """
+    try:
+        num_questions = int(request.data.get('num_questions', 5))
+    except (TypeError, ValueError):
+        num_questions = 0
+    if num_questions < 1:
+        return Response(
+            {'error': 'num_questions must be a positive integer'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
     try:
         outline = TeacherOutline.objects.get(id=outline_id)
-        num_questions = request.data.get('num_questions', 5)
         
-        agent = TutorAgent()
-        questions = agent.generate_quiz(outline, num_questions=num_questions)
+        questions = speculative.claim_quiz(outline, num_questions)
+        reused = questions is not None
+        if questions is None:
+            questions = TutorAgent().generate_quiz(outline, num_questions=num_questions)
         
-        return Response({
+        if not questions:
+            return Response({
+                'error': 'No new questions could be generated: all drafts duplicate existing questions',
+                'requested': num_questions
+            }, status=status.HTTP_409_CONFLICT)
+        data = {
             'message': f'{len(questions)} questions generated',
-            'questions': QuizQuestionSerializer(questions, many=True).data
-        }, status=status.HTTP_201_CREATED)
+            'questions': QuizQuestionSerializer(questions, many=True).data,
+            'speculative': reused
+        }
+        if len(questions) < num_questions:
+            data['warning'] = (
+                f'Only {len(questions)} of {num_questions} questions generated; '
+                f'the rest duplicated existing questions'
+            )
+        return Response(data, status=status.HTTP_201_CREATED)
     except TeacherOutline.DoesNotExist:
         return Response({'error': 'Outline not found'}, status=status.HTTP_404_NOT_FOUND)
 
 
+@api_view(['GET'])
+def similar_questions(request, question_id):
+    """
+    题库中与指定题目相似的题目(按题目文本的嵌入向量)
+    GET /api/tutor/question/{question_id}/similar/?k=5
+    
+    未开启 QUESTION_EMBEDDINGS_ENABLED 时返回 indexed=false 与空列表
+    """
+    try:
+        question = QuizQuestion.objects.get(id=question_id)
+    except QuizQuestion.DoesNotExist:
+        return Response({'error': 'Question not found'}, status=status.HTTP_404_NOT_FOUND)
+    try:
+        k = min(max(int(request.query_params.get('k', 5)), 1), 50)
+    except ValueError:
+        return Response({'error': 'k must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    if not settings.QUESTION_EMBEDDINGS_ENABLED:
+        return Response({'indexed': False, 'questions': []})
+    
+    store = question_store.get_question_store()
+    vector = store.vector(question.id)
+    if vector is None:
+        # 尚未索引(如开启前创建的题目):现在补上
+        question_store.index_questions([question])
+        vector = store.vector(question.id)
+    matches = question_store.similar_questions(vector, k=k, exclude=[question.id])
+    return Response({
+        'indexed': True,
+        'questions': [
+            dict(QuizQuestionSerializer(match).data, score=round(score, 4))
+            for match, score in matches
+        ]
+    })
+
+
 @api_view(['POST'])
+@idempotent
 def submit_answer(request):
     """
     提交学生答案
     POST /api/submit_answer/
     
+    支持 Idempotency-Key 请求头;同一会话同一题目重复提交时返回首次批改结果。
+    开启 ANSWER_WRITE_BEHIND 时批改后立即返回 202,记录由后台批量写入。
+    开启 SHORT_ANSWER_BATCH_GRADING 时简答题可能返回 pending: true,由 LLM 批量批改后写回。
+    
     Body: {
         "attempt_id": 1,
         "question_id": 1,
@@ -142,41 +358,106 @@ def submit_answer(request):
     try:
         attempt = Attempt.objects.get(id=attempt_id)
         question = QuizQuestion.objects.get(id=question_id)
+        if attempt.is_completed:
+            return Response({'error': 'Attempt already completed'}, status=status.HTTP_409_CONFLICT)
         
         # 使用 Tutor Agent 批改
         agent = TutorAgent()
         result = agent.grade_answer(question, student_answer)
+        pending = result['grading_status'] == 'pending'
+        
+        if write_behind_enabled():
+            return _enqueue_answer(attempt, question, student_answer, time_spent_sec, result)
         
         # 保存答题记录
-        answer = AttemptAnswer.objects.create(
-            attempt=attempt,
-            question=question,
-            student_answer=student_answer,
-            is_correct=result['is_correct'],
-            time_spent_sec=time_spent_sec,
-            feedback=result['feedback']
-        )
+        try:
+            with transaction.atomic():
+                AttemptAnswer.objects.create(
+                    attempt=attempt,
+                    question=question,
+                    student_answer=student_answer,
+                    is_correct=result['is_correct'],
+                    time_spent_sec=time_spent_sec,
+                    feedback=result['feedback'],
+                    grading_status=result['grading_status']
+                )
+                if pending:
+                    schedule_grading([question.id])
+        except IntegrityError:
+            # 重复提交(如网络重试):返回已保存的批改结果
+            existing = AttemptAnswer.objects.get(attempt=attempt, question=question)
+            return Response(_answer_result(existing.is_correct, existing.feedback, existing.grading_status),
+                            status=status.HTTP_200_OK)
+        # 待批改的答案在批改写回时计入实时统计
+        if not pending:
+            live_hub.record_answer(attempt.outline_id, result['is_correct'])
         
-        return Response({
-            'is_correct': result['is_correct'],
-            'feedback': result['feedback']
-        }, status=status.HTTP_201_CREATED)
+        return Response(_answer_result(result['is_correct'], result['feedback'], result['grading_status']),
+                        status=status.HTTP_201_CREATED)
     except (Attempt.DoesNotExist, QuizQuestion.DoesNotExist) as e:
         return Response({'error': str(e)}, status=status.HTTP_404_NOT_FOUND)
 
 
+def _answer_result(is_correct, feedback, grading_status):
+    """作答响应;待批改时附带 pending 标记"""
+    data = {'is_correct': is_correct, 'feedback': feedback}
+    if grading_status == 'pending':
+        data['pending'] = True
+    return data
+
+
+def _enqueue_answer(attempt, question, student_answer, time_spent_sec, result):
+    """写后模式:作答记录进入缓冲,由后台线程批量写入"""
+    existing = AttemptAnswer.objects.filter(
+        attempt=attempt, question=question
+    ).values('is_correct', 'feedback', 'grading_status').first()
+    if existing is None:
+        existing = get_answer_buffer().submit(PendingAnswer(
+            attempt_id=attempt.id,
+            question_id=question.id,
+            outline_id=attempt.outline_id,
+            student_answer=student_answer,
+            is_correct=result['is_correct'],
+            time_spent_sec=float(time_spent_sec),
+            feedback=result['feedback'],
+            student_id=attempt.student_id,
+            question_order=question.order,
+            grading_status=result['grading_status']
+        ))
+        if existing is not None:
+            existing = {
+                'is_correct': existing.is_correct,
+                'feedback': existing.feedback,
+                'grading_status': existing.grading_status
+            }
+    if existing is not None:
+        return Response(_answer_result(**existing), status=status.HTTP_200_OK)
+    
+    if result['grading_status'] != 'pending':
+        live_hub.record_answer(attempt.outline_id, result['is_correct'])
+    return Response(_answer_result(result['is_correct'], result['feedback'], result['grading_status']),
+                    status=status.HTTP_202_ACCEPTED)
+
+
 @api_view(['GET'])
 def get_feedback(request, outline_id, student_id):
     """
     获取学生个体反馈
-    GET /api/feedback/{outline_id}/{student_id}/
+    GET /api/feedback/{outline_id}/{student_id}/?include_archived=1
     """
     try:
         outline = TeacherOutline.objects.get(id=outline_id)
         student = Student.objects.get(student_id=student_id)
         
         agent = TutorAgent()
-        feedback = agent.generate_individual_feedback(outline, student)
+        include_archived = request.query_params.get('include_archived') in ('1', 'true')
+        # 反馈只依赖已完成的会话,按大纲聚合版本缓存;未命中时从只读副本计算
+        with analytics_reads(outline):
+            feedback = cached_for_outline(
+                outline, 'feedback',
+                lambda: agent.generate_individual_feedback(outline, student, include_archived),
+                student.student_id, include_archived
+            )
         
         return Response(feedback)
     except (TeacherOutline.DoesNotExist, Student.DoesNotExist) as e:
@@ -186,16 +467,24 @@ def get_feedback(request, outline_id, student_id):
 # ============ Classroom Agent 相关 ============
 
 @api_view(['POST'])
+@admission_controlled
 def aggregate_class_data(request, outline_id):
     """
     聚合班级数据并生成个性化方案 (Classroom Agent)
     POST /api/classroom/aggregate/{outline_id}/
+    
+    Body(可选): {"include_archived": true}
     """
     try:
         outline = TeacherOutline.objects.get(id=outline_id)
         agent = ClassroomAgent()
         
-        personalization = agent.aggregate_class_data(outline)
+        # 统计读取走只读副本,保存个性化方案时写回主库
+        with analytics_reads(outline):
+            personalization = agent.aggregate_class_data(
+                outline,
+                include_archived=bool(request.data.get('include_archived', False))
+            )
         
         return Response({
             'personalization_id': personalization.id,
@@ -207,6 +496,32 @@ def aggregate_class_data(request, outline_id):
         return Response({'error': 'Outline not found'}, status=status.HTTP_404_NOT_FOUND)
 
 
+async def classroom_live(request, outline_id):
+    """
+    班级实时看板推送 (Server-Sent Events)
+    GET /api/classroom/live/{outline_id}/
+    
+    需要通过 ASGI 服务运行(如 uvicorn aiedu.asgi:application)
+    """
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse(
+            {'error': 'Live updates require the ASGI server'},
+            status=status.HTTP_501_NOT_IMPLEMENTED
+        )
+    if not await TeacherOutline.objects.filter(id=outline_id).aexists():
+        return JsonResponse({'error': 'Outline not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    response = StreamingHttpResponse(
+        stream_outline_stats(outline_id),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @api_view(['POST'])
 def publish_plan(request, outline_id):
     """
@@ -251,21 +566,138 @@ def create_attempt(request):
     创建答题会话
     POST /api/attempt/
     
-    Body: {"student_id": "S001", "outline_id": 1}
+    Body: {"student_id": "S001", "outline_id": 1, "mode": "adaptive"}
+    mode 可选 fixed(默认,按题目顺序)/ adaptive(通过 next_question 逐题选题)
     """
     student_id = request.data.get('student_id')
     outline_id = request.data.get('outline_id')
+    mode = request.data.get('mode', 'fixed')
+    if mode not in dict(Attempt.MODE_CHOICES):
+        return Response({'error': f'Unknown mode: {mode}'}, status=status.HTTP_400_BAD_REQUEST)
     
     try:
         student = Student.objects.get(student_id=student_id)
         outline = TeacherOutline.objects.get(id=outline_id)
         
-        attempt = Attempt.objects.create(student=student, outline=outline)
+        attempt = Attempt.objects.create(student=student, outline=outline, mode=mode)
         return Response({
             'attempt_id': attempt.id,
             'student_id': student.student_id,
-            'outline_id': outline.id
+            'outline_id': outline.id,
+            'mode': attempt.mode
         }, status=status.HTTP_201_CREATED)
     except (Student.DoesNotExist, TeacherOutline.DoesNotExist) as e:
         return Response({'error': str(e)}, status=status.HTTP_404_NOT_FOUND)
 
+
+
+@api_view(['GET'])
+def next_question(request, attempt_id):
+    """
+    自适应选题:按学生当前能力估计选出下一道未作答的题目
+    GET /api/attempt/{attempt_id}/next_question/
+    
+    选题在进程内的难度索引上完成(见 core.item_bank);done 为真时应完成会话。
+    只用于以 mode=adaptive 创建的会话。
+    """
+    attempt = Attempt.objects.filter(id=attempt_id).only(
+        'id', 'student_id', 'outline_id', 'is_completed', 'mode'
+    ).first()
+    if attempt is None:
+        return Response({'error': 'Attempt not found'}, status=status.HTTP_404_NOT_FOUND)
+    if attempt.mode != 'adaptive':
+        return Response({'error': 'Attempt is not in adaptive mode'}, status=status.HTTP_409_CONFLICT)
+    if attempt.is_completed:
+        return Response({'error': 'Attempt already completed'}, status=status.HTTP_409_CONFLICT)
+    
+    # 写后模式下先落库本会话的作答,能力估计与已答题目才是最新的
+    flush_pending_answers(attempt.id)
+    answered_ids = list(AttemptAnswer.objects.filter(attempt_id=attempt.id).values_list('question_id', flat=True))
+    ability = KnowledgeState.objects.filter(
+        student_id=attempt.student_id, outline_id=attempt.outline_id
+    ).values_list('ability', flat=True).first() or 0.0
+    
+    selection = item_bank.select_next(attempt.outline_id, ability, answered_ids)
+    question = None
+    if selection.question_id is not None:
+        question = QuizQuestion.objects.filter(id=selection.question_id).first()
+        if question is None:
+            # 题目已被其他进程删除而索引尚未过期:重新加载索引后再选
+            item_bank.get_item_index().invalidate(attempt.outline_id)
+            selection = item_bank.select_next(attempt.outline_id, ability, answered_ids)
+            if selection.question_id is not None:
+                question = QuizQuestion.objects.filter(id=selection.question_id).first()
+    data = dict(selection.as_dict(), attempt_id=attempt.id, question=None)
+    if question is not None:
+        data['question'] = QuizQuestionSerializer(question).data
+    return Response(data)
+
+
+# ============ 数据导出 ============
+
+def _streaming_export(queryset, fmt, filename):
+    """构造流式导出响应"""
+    # 查询在视图返回后才执行,因此直接绑定只读副本而不是依赖路由上下文
+    response = StreamingHttpResponse(
+        exports.stream_rows(queryset.using(analytics_db()), fmt),
+        content_type=exports.EXPORT_FORMATS[fmt]
+    )
+    # 班级名等可能含非 ASCII 字符或引号:按 RFC 6266/5987 编码
+    response['Content-Disposition'] = content_disposition_header(True, f'{filename}.{fmt}')
+    return response
+
+
+@api_view(['GET'])
+def export_outline_answers(request, outline_id, fmt):
+    """
+    导出某大纲的全部作答记录
+    GET /api/export/outline/{outline_id}/{csv|ndjson}/
+    """
+    if fmt not in exports.EXPORT_FORMATS:
+        return Response({'error': f'Unsupported format: {fmt}'}, status=status.HTTP_400_BAD_REQUEST)
+    if not TeacherOutline.objects.filter(id=outline_id).exists():
+        return Response({'error': 'Outline not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    return _streaming_export(
+        exports.answers_for_outline(outline_id), fmt, f'outline_{outline_id}_answers'
+    )
+
+
+@api_view(['GET'])
+def export_class_answers(request, class_name, fmt):
+    """
+    导出某班级学生的全部作答记录
+    GET /api/export/class/{class_name}/{csv|ndjson}/
+    """
+    if fmt not in exports.EXPORT_FORMATS:
+        return Response({'error': f'Unsupported format: {fmt}'}, status=status.HTTP_400_BAD_REQUEST)
+    if not Student.objects.filter(class_name=class_name).exists():
+        return Response({'error': 'Class not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    return _streaming_export(
+        exports.answers_for_class(class_name), fmt, f'class_{class_name}_answers'
+    )
+
+
+@api_view(['POST'])
+@idempotent
+@admission_controlled
+def complete_attempt_view(request, attempt_id):
+    """
+    完成答题会话并计算总分
+    POST /api/attempt/{attempt_id}/complete/
+    
+    重复调用返回已保存的结果;完成时可能触发 LLM 评分,因此与其他 LLM 接口一样受准入控制
+    """
+    attempt = complete_attempt(attempt_id)
+    if attempt is None:
+        return Response({'error': 'Attempt not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    return Response({
+        'attempt_id': attempt.id,
+        'student_id': attempt.student.student_id,
+        'outline_id': attempt.outline_id,
+        'total_score': attempt.total_score,
+        'is_completed': attempt.is_completed,
+        'completed_at': attempt.completed_at
+    })
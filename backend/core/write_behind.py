@@ -0,0 +1,257 @@
+"""
+作答记录写后缓冲
+Write-behind buffer for AttemptAnswer inserts
+
+开启 ANSWER_WRITE_BEHIND 后,submit_answer 批改完成即返回,作答记录进入
+进程内缓冲,由后台线程按批写入:
+- 缓冲达到 ANSWER_WRITE_BEHIND_MAX_BATCH 条,或最早一条等待超过
+  ANSWER_WRITE_BEHIND_MAX_AGE_MS 毫秒时触发写入(持久化延迟上界)
+- 每批在一个事务内 bulk_create,SQLite 写锁由每次请求一次降为每批一次;
+  库中已有的同键记录(重试、重复提交)跳过,不重复计入知识状态
+- 写入失败(如锁超时)的批次保留在缓冲中重试;违反约束的批次改为逐条写入,
+  无法写入的记录记日志后丢弃,不会阻塞其后的记录;进程退出时尽量写完剩余数据
+"""
+import atexit
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+
+from .grading import schedule_grading
+from .knowledge import AnswerObservation, record_answers
+from .models import AttemptAnswer
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PendingAnswer:
+    """已批改、待写入的作答记录"""
+    attempt_id: int
+    question_id: int
+    outline_id: int
+    student_answer: str
+    is_correct: bool
+    time_spent_sec: float
+    feedback: str
+    # 知识追踪所需(见 core.knowledge);为空时不更新知识状态
+    student_id: Optional[int] = None
+    question_order: int = 0
+    # pending:简答题待批量批改(见 core.grading),批改写回时再更新知识状态
+    grading_status: str = 'graded'
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def key(self) -> Tuple[int, int]:
+        return (self.attempt_id, self.question_id)
+
+    def to_model(self) -> AttemptAnswer:
+        return AttemptAnswer(
+            attempt_id=self.attempt_id,
+            question_id=self.question_id,
+            student_answer=self.student_answer,
+            is_correct=self.is_correct,
+            time_spent_sec=self.time_spent_sec,
+            feedback=self.feedback,
+            grading_status=self.grading_status
+        )
+
+
+class AnswerWriteBuffer:
+    """
+    作答记录写后缓冲
+
+    以 (attempt_id, question_id) 为键去重,与数据库唯一约束语义一致。
+    """
+
+    def __init__(self, max_batch_size: int = 200, max_batch_age_sec: float = 0.2):
+        self.max_batch_size = max_batch_size
+        self.max_batch_age_sec = max_batch_age_sec
+
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._pending: Dict[Tuple[int, int], PendingAnswer] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self.flushed_total = 0
+        self.flush_batches = 0
+        self.dropped_total = 0
+
+    def submit(self, answer: PendingAnswer) -> Optional[PendingAnswer]:
+        """
+        加入缓冲
+
+        Returns:
+            若同一会话同一题目已在缓冲中,返回已有记录(本次不入队);否则返回 None
+        """
+        self._ensure_started()
+        with self._cond:
+            existing = self._pending.get(answer.key)
+            if existing is not None:
+                return existing
+            self._pending[answer.key] = answer
+            if len(self._pending) >= self.max_batch_size or len(self._pending) == 1:
+                self._cond.notify()
+        return None
+
+    def pending_count(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    def flush(self, attempt_id: Optional[int] = None) -> int:
+        """
+        立即写入缓冲中的记录(attempt_id 不为空时只写入该会话的记录)
+
+        Returns:
+            写入的条数
+        """
+        with self._flush_lock:
+            with self._cond:
+                if attempt_id is None:
+                    batch = list(self._pending.values())
+                else:
+                    batch = [a for a in self._pending.values() if a.attempt_id == attempt_id]
+            if not batch:
+                return 0
+
+            try:
+                written = self._write(batch)
+            except IntegrityError as e:
+                # 整批失败时逐条写入,找出无法写入的记录(如会话已被删除,外键在提交时检查)
+                logger.warning(f"⚠️ Write-behind batch of {len(batch)} failed, writing one by one: {e}")
+                written = self._write_each(batch)
+
+            with self._cond:
+                for answer in batch:
+                    # 仅移除本批写入的对象,写入期间新入队的同键记录不受影响
+                    if self._pending.get(answer.key) is answer:
+                        del self._pending[answer.key]
+            self.flushed_total += written
+            self.flush_batches += 1
+            return written
+
+    def _write(self, batch: List[PendingAnswer]) -> int:
+        """
+        在一个事务内写入库中尚不存在的记录,返回写入条数
+
+        并发写入同键记录时 bulk_create 抛出 IntegrityError,由 _write_each 逐条重试时跳过。
+        """
+        with transaction.atomic():
+            existing = set(
+                AttemptAnswer.objects.filter(
+                    attempt_id__in={a.attempt_id for a in batch},
+                    question_id__in={a.question_id for a in batch}
+                ).order_by().values_list('attempt_id', 'question_id')
+            )
+            new = [answer for answer in batch if answer.key not in existing]
+            if len(new) < len(batch):
+                logger.info(f"⏭️ Skipping {len(batch) - len(new)} buffered answers already stored")
+            if not new:
+                return 0
+            AttemptAnswer.objects.bulk_create([answer.to_model() for answer in new])
+            # bulk_create 不发送 post_save:在同一事务中只为实际写入的记录更新知识状态
+            record_answers(
+                AnswerObservation(a.student_id, a.outline_id, a.question_order, a.is_correct, a.question_id)
+                for a in new if a.student_id is not None and a.grading_status != 'pending'
+            )
+            schedule_grading(a.question_id for a in new if a.grading_status == 'pending')
+        return len(new)
+
+    def _write_each(self, batch: List[PendingAnswer]) -> int:
+        """
+        逐条写入;违反约束的记录记日志后丢弃,不再阻塞后续记录
+
+        锁超时等其他数据库错误照常抛出,整批留在缓冲中重试(已写入的记录重试时被跳过)。
+        """
+        written = 0
+        for answer in batch:
+            try:
+                written += self._write([answer])
+            except IntegrityError as e:
+                self.dropped_total += 1
+                logger.error(
+                    f"❌ Dropping buffered answer (attempt {answer.attempt_id}, "
+                    f"question {answer.question_id}) that cannot be written: {e}"
+                )
+        return written
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """停止后台线程并写入剩余数据"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"❌ Failed to flush {self.pending_count()} buffered answers on shutdown: {e}")
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run,
+                    name='answer-write-behind',
+                    daemon=True
+                )
+                self._thread.start()
+
+    def _run(self) -> None:
+        backoff = 0.0
+        while True:
+            with self._cond:
+                while not self._pending and not self._stopping:
+                    self._cond.wait()
+                if self._stopping:
+                    return
+                oldest = min(a.enqueued_at for a in self._pending.values())
+                wait = oldest + self.max_batch_age_sec - time.monotonic()
+                if len(self._pending) < self.max_batch_size and wait > 0:
+                    self._cond.wait(max(wait, backoff))
+                    continue
+
+            try:
+                close_old_connections()
+                written = self.flush()
+                logger.debug(f"💾 Flushed {written} buffered answers")
+                backoff = 0.0
+            except Exception as e:
+                backoff = min(max(backoff * 2, 0.05), 2.0)
+                logger.error(f"❌ Write-behind flush failed, retrying in {backoff:.2f}s: {e}")
+                time.sleep(backoff)
+
+
+_buffer: Optional[AnswerWriteBuffer] = None
+_buffer_lock = threading.Lock()
+
+
+def get_answer_buffer() -> AnswerWriteBuffer:
+    """获取全局写后缓冲(按 settings 懒加载,首次写入时才启动后台线程)"""
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = AnswerWriteBuffer(
+                    max_batch_size=settings.ANSWER_WRITE_BEHIND_MAX_BATCH,
+                    max_batch_age_sec=settings.ANSWER_WRITE_BEHIND_MAX_AGE_MS / 1000
+                )
+                atexit.register(_buffer.stop)
+    return _buffer
+
+
+def write_behind_enabled() -> bool:
+    return settings.ANSWER_WRITE_BEHIND
+
+
+def flush_pending_answers(attempt_id: Optional[int] = None) -> int:
+    """读取作答数据前调用,确保缓冲中的记录已落库;未开启写后模式时为空操作"""
+    if _buffer is None:
+        return 0
+    return _buffer.flush(attempt_id)
@@ -6,13 +6,26 @@ export const getOutlines = () => http.get('/outlines/')
 export const getOutline = (id) => http.get(`/outline/${id}/`)
 
 // Teacher Agent
-export const generateLessonPlan = (outlineId) => http.post(`/teacher_agent/plan/${outlineId}/`)
+export const generateLessonPlan = (outlineId, options = {}) =>
+  http.post(`/teacher_agent/plan/${outlineId}/`, options)
+// 相似大纲已有的教学计划, 可用 generateLessonPlan(id, { clone_from: planId }) 复制
+export const getSimilarLessonPlans = (outlineId, k = 3) =>
+  http.get(`/teacher_agent/plan/${outlineId}/similar/`, { params: { k } })
+
+// 大纲上线: 并发生成教学计划与题目
+export const onboardOutline = (outlineId, numQuestions = 5) =>
+  http.post(`/pipeline/onboard/${outlineId}/`, { num_questions: numQuestions })
 
 // Tutor Agent
 export const generateQuiz = (outlineId, numQuestions = 5) => 
   http.post(`/tutor/quiz/${outlineId}/`, { num_questions: numQuestions })
+// 题库中相似的题目 (需后端开启 QUESTION_EMBEDDINGS_ENABLED)
+export const getSimilarQuestions = (questionId, k = 5) =>
+  http.get(`/tutor/question/${questionId}/similar/`, { params: { k } })
 
-export const submitAnswer = (data) => http.post('/submit_answer/', data)
+// idempotencyKey 应在首次提交前生成,并在重试时复用 (如 crypto.randomUUID())
+export const submitAnswer = (data, idempotencyKey) =>
+  http.post('/submit_answer/', data, idempotencyKey ? { headers: { 'Idempotency-Key': idempotencyKey } } : {})
 export const getFeedback = (outlineId, studentId) => 
   http.get(`/feedback/${outlineId}/${studentId}/`)
 
@@ -24,5 +37,20 @@ export const publishPlan = (outlineId, personalizationId) =>
 
 // 学生相关
 export const createStudent = (data) => http.post('/student/', data)
-export const createAttempt = (studentId, outlineId) => 
-  http.post('/attempt/', { student_id: studentId, outline_id: outlineId })
+// mode: 'fixed' (按题目顺序) 或 'adaptive' (用 getNextQuestion 逐题选题)
+export const createAttempt = (studentId, outlineId, mode = 'fixed') => 
+  http.post('/attempt/', { student_id: studentId, outline_id: outlineId, mode })
+// 自适应模式: 返回 { question, ability, standard_error, done }, done 为 true 时调用 completeAttempt
+export const getNextQuestion = (attemptId) => http.get(`/attempt/${attemptId}/next_question/`)
+
+// 数据导出 (csv | ndjson),直接作为下载链接使用
+export const outlineExportUrl = (outlineId, fmt = 'csv') =>
+  `/api/export/outline/${outlineId}/${fmt}/`
+export const classExportUrl = (className, fmt = 'csv') =>
+  `/api/export/class/${encodeURIComponent(className)}/${fmt}/`
+
+// 班级实时看板 (SSE): 返回 EventSource,监听 snapshot / stats 事件
+export const subscribeClassroomLive = (outlineId) =>
+  new EventSource(`/api/classroom/live/${outlineId}/`)
+
+export const completeAttempt = (attemptId) => http.post(`/attempt/${attemptId}/complete/`)